@@ -56,6 +56,44 @@ class FileSelectDialog(QDialog):
         else:
             return None
 
+class HistoryDialog(QDialog):
+    def setup(self):
+        self.setObjectName(_fromUtf8("historyDialog"))
+        self.resize(640, 475)
+        self.vl = QVBoxLayout(self)
+        self.vl.setObjectName(_fromUtf8("verticalLayout"))
+        self.versionsTreeWidget = QTreeWidget(self)
+        self.versionsTreeWidget.setObjectName(_fromUtf8("versionsTreeWidget"))
+        self.versionsTreeWidget.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.versionsTreeWidget.setRootIsDecorated(False)
+        self.vl.addWidget(self.versionsTreeWidget)
+        self.changesTreeWidget = QTreeWidget(self)
+        self.changesTreeWidget.setObjectName(_fromUtf8("changesTreeWidget"))
+        self.changesTreeWidget.setRootIsDecorated(False)
+        self.vl.addWidget(self.changesTreeWidget)
+        self.bb = QDialogButtonBox(self)
+        self.bb.setStandardButtons(QDialogButtonBox.Close)
+        self.bb.setObjectName(_fromUtf8("buttonBox"))
+        self.vl.addWidget(self.bb)
+        self.setModal(True)
+        self.setWindowTitle(QApplication.translate("History", "History", None, QApplication.UnicodeUTF8))
+        self.versionsTreeWidget.setHeaderLabels(QStringList(["Version", "User", "Time", "Files", "Size", "State"]))
+        self.changesTreeWidget.setHeaderLabels(QStringList(["Change", "File"]))
+        QObject.connect(self.bb, SIGNAL(_fromUtf8("rejected()")), self.reject)
+        QObject.connect(self.versionsTreeWidget, SIGNAL("itemSelectionChanged()"), self.versionSelectionChanged)
+        QMetaObject.connectSlotsByName(self)
+    
+    def showHistory(self, vDirPath, versionItems):
+        self.vDirPath = vDirPath
+        self.setWindowTitle("History of " + os.path.basename(vDirPath))
+        self.changesTreeWidget.clear()
+        self.versionsTreeWidget.clear()
+        self.versionsTreeWidget.addTopLevelItems(versionItems)
+        self.exec_()
+    
+    def versionSelectionChanged(self):
+        controller.historySelectionChanged(self)
+
 class NewFolderDialog(QDialog):
     def setup(self):
         self.setObjectName(_fromUtf8("newFolderDialog"))
@@ -250,16 +288,54 @@ class Ui_MainWindow(object):
         self.verticalLayout = QVBoxLayout(self.projectFilesTab)
         self.verticalLayout.setMargin(5)
         self.verticalLayout.setObjectName(_fromUtf8("verticalLayout"))
+        self.searchLayout = QHBoxLayout()
+        self.searchLayout.setObjectName(_fromUtf8("searchLayout"))
+        self.searchIconLabel = QLabel(self.projectFilesTab)
+        self.searchIconLabel.setPixmap(QPixmap(_fromUtf8("images/Search.png")).scaled(20, 20, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.searchLayout.addWidget(self.searchIconLabel)
+        self.searchLineEdit = QLineEdit(self.projectFilesTab)
+        self.searchLineEdit.setObjectName(_fromUtf8("searchLineEdit"))
+        self.searchLayout.addWidget(self.searchLineEdit)
+        self.verticalLayout.addLayout(self.searchLayout)
+        self.searchResultsTreeWidget = QTreeWidget(self.projectFilesTab)
+        self.searchResultsTreeWidget.setObjectName(_fromUtf8("searchResultsTreeWidget"))
+        self.searchResultsTreeWidget.setRootIsDecorated(False)
+        self.searchResultsTreeWidget.header().setDefaultSectionSize(200)
+        self.searchResultsTreeWidget.hide()
+        self.verticalLayout.addWidget(self.searchResultsTreeWidget)
         #self.projectFilesTreeWidget = QTreeWidget(self.projectFilesTab)
         self.projectFilesTreeWidget = DeselectableTreeWidget(self.projectFilesTab)
         self.projectFilesTreeWidget.setContextMenuPolicy(Qt.CustomContextMenu)
         self.projectFilesTreeWidget.setObjectName(_fromUtf8("projectFilesTreeWidget"))
         self.projectFilesTreeWidget.header().setDefaultSectionSize(120)
         self.projectFilesTreeWidget.setIndentation(12)
+        self.projectFilesTreeWidget.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.verticalLayout.addWidget(self.projectFilesTreeWidget)
         self.fileTabs.addTab(self.projectFilesTab, _fromUtf8(""))
         self.horizontalLayout.addWidget(self.fileTabs)
         
+        # Jobs Panel
+        self.jobsDock = QDockWidget(MainWindow)
+        self.jobsDock.setObjectName(_fromUtf8("jobsDock"))
+        self.jobsDock.setFeatures(QDockWidget.DockWidgetMovable|QDockWidget.DockWidgetFloatable)
+        self.jobsWidget = QWidget()
+        self.jobsWidget.setObjectName(_fromUtf8("jobsWidget"))
+        self.jobsLayout = QHBoxLayout(self.jobsWidget)
+        self.jobsLayout.setMargin(5)
+        self.jobsLayout.setObjectName(_fromUtf8("jobsLayout"))
+        self.jobsTreeWidget = QTreeWidget(self.jobsWidget)
+        self.jobsTreeWidget.setObjectName(_fromUtf8("jobsTreeWidget"))
+        self.jobsTreeWidget.setRootIsDecorated(False)
+        self.jobsTreeWidget.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.jobsTreeWidget.header().setDefaultSectionSize(200)
+        self.jobsLayout.addWidget(self.jobsTreeWidget)
+        self.cancelJobButton = QPushButton(self.jobsWidget)
+        self.cancelJobButton.setObjectName(_fromUtf8("cancelJobButton"))
+        self.cancelJobButton.setEnabled(False)
+        self.jobsLayout.addWidget(self.cancelJobButton, 0, Qt.AlignTop)
+        self.jobsDock.setWidget(self.jobsWidget)
+        MainWindow.addDockWidget(Qt.BottomDockWidgetArea, self.jobsDock)
+        
         # Status Bar
         MainWindow.setCentralWidget(self.mainWidget)
         self.statusbar = QStatusBar(MainWindow)
@@ -312,6 +388,10 @@ class Ui_MainWindow(object):
         self.actionInstall.setIcon(icon5)
         self.actionInstall.setObjectName(_fromUtf8("actionInstall"))
         
+        self.actionBatchInstall = QAction(MainWindow)
+        self.actionBatchInstall.setIcon(icon5)
+        self.actionBatchInstall.setObjectName(_fromUtf8("actionBatchInstall"))
+        
         self.actionRefresh = QAction(MainWindow)
         icon6 = QIcon()
         icon6.addPixmap(QPixmap(_fromUtf8("images/Refresh.png")), QIcon.Normal, QIcon.Off)
@@ -340,6 +420,13 @@ class Ui_MainWindow(object):
         self.actionDiscard.setObjectName(_fromUtf8("actionDiscard"))
         self.actionDiscard.setIcon(icon8)
         
+        self.actionHistory = QAction(MainWindow)
+        self.actionHistory.setObjectName(_fromUtf8("actionHistory"))
+        
+        self.actionUpdate = QAction(MainWindow)
+        self.actionUpdate.setObjectName(_fromUtf8("actionUpdate"))
+        self.actionUpdate.setIcon(icon6)
+        
         # Add Actions to Tool Bar
         self.toolbar.addAction(self.actionCheckout)
         self.toolbar.addAction(self.actionInstall)
@@ -360,6 +447,7 @@ class Ui_MainWindow(object):
         # Popup Menus
         self.localPopMenu = QMenu(MainWindow)
         self.localPopMenu.addAction(self.actionCheckin)
+        self.localPopMenu.addAction(self.actionUpdate)
         self.localPopMenu.addSeparator()
         self.localPopMenu.addAction(self.actionDiscard)
         self.localPopMenu.addAction(self.actionOpen_File)
@@ -367,6 +455,8 @@ class Ui_MainWindow(object):
         self.projectPopMenu = QMenu(MainWindow)
         self.projectPopMenu.addAction(self.actionCheckout)
         self.projectPopMenu.addAction(self.actionInstall)
+        self.projectPopMenu.addAction(self.actionBatchInstall)
+        self.projectPopMenu.addAction(self.actionHistory)
         self.projectPopMenu.addSeparator()
         self.projectPopMenu.addAction(self.actionNew)
         self.projectPopMenu.addAction(self.actionRename)
@@ -377,6 +467,10 @@ class Ui_MainWindow(object):
         self.file_select_dialog = FileSelectDialog(MainWindow)
         self.file_select_dialog.setup()
         
+        ## History Dialog
+        self.historyDialog = HistoryDialog(MainWindow)
+        self.historyDialog.setup()
+        
         ## Error Message
         self.errorMessage = QErrorMessage(MainWindow)
         
@@ -418,6 +512,16 @@ class Ui_MainWindow(object):
         self.projectFilesTreeWidget.header().resizeSection(4, 80)
         self.projectFilesTreeWidget.header().resizeSection(5, 200)
         self.fileTabs.setTabText(self.fileTabs.indexOf(self.projectFilesTab), QApplication.translate("MainWindow", "ProjectFiles", None, QApplication.UnicodeUTF8))
+        self.searchLineEdit.setPlaceholderText(QApplication.translate("MainWindow", "Search   locked:USER  by:USER  installed:yes|no", None, QApplication.UnicodeUTF8))
+        self.searchResultsTreeWidget.headerItem().setText(0, QApplication.translate("MainWindow", "Name", None, QApplication.UnicodeUTF8))
+        self.searchResultsTreeWidget.headerItem().setText(1, QApplication.translate("MainWindow", "Folder", None, QApplication.UnicodeUTF8))
+        
+        self.jobsDock.setWindowTitle(QApplication.translate("MainWindow", "Jobs", None, QApplication.UnicodeUTF8))
+        self.jobsTreeWidget.headerItem().setText(0, QApplication.translate("MainWindow", "Job", None, QApplication.UnicodeUTF8))
+        self.jobsTreeWidget.headerItem().setText(1, QApplication.translate("MainWindow", "Progress", None, QApplication.UnicodeUTF8))
+        self.jobsTreeWidget.headerItem().setText(2, QApplication.translate("MainWindow", "Status", None, QApplication.UnicodeUTF8))
+        self.cancelJobButton.setText(QApplication.translate("MainWindow", "Cancel", None, QApplication.UnicodeUTF8))
+        self.cancelJobButton.setToolTip(QApplication.translate("MainWindow", "Cancel the selected jobs", None, QApplication.UnicodeUTF8))
         
         #Set Actions Text
         self.toolbar.setWindowTitle(QApplication.translate("MainWindow", "Tool Bar", None, QApplication.UnicodeUTF8))
@@ -430,6 +534,8 @@ class Ui_MainWindow(object):
         self.actionCache_to_Alembic.setText(QApplication.translate("MainWindow", "Alembic", None, QApplication.UnicodeUTF8))
         self.actionInstall.setText(QApplication.translate("MainWindow", "Install", None, QApplication.UnicodeUTF8))
         self.actionInstall.setToolTip(QApplication.translate("MainWindow", "Install / Flatten a File", None, QApplication.UnicodeUTF8))
+        self.actionBatchInstall.setText(QApplication.translate("MainWindow", "Install Selected", None, QApplication.UnicodeUTF8))
+        self.actionBatchInstall.setToolTip(QApplication.translate("MainWindow", "Install / Flatten a File in each selected Folder", None, QApplication.UnicodeUTF8))
         self.actionRefresh.setText(QApplication.translate("MainWindow", "Refresh", None, QApplication.UnicodeUTF8))
         self.actionRefresh.setToolTip(QApplication.translate("MainWindow", "Refresh", None, QApplication.UnicodeUTF8))
         self.actionOpen_File.setText(QApplication.translate("MainWindow", "Open File", None, QApplication.UnicodeUTF8))
@@ -443,6 +549,10 @@ class Ui_MainWindow(object):
         self.actionRemove.setToolTip(QApplication.translate("MainWindow", "Remove this folder and its contents", None, QApplication.UnicodeUTF8))
         self.actionDiscard.setText(QApplication.translate("MainWindow", "Discard", None, QApplication.UnicodeUTF8))
         self.actionDiscard.setToolTip(QApplication.translate("MainWindow", "Discard Changes, and release lock", None, QApplication.UnicodeUTF8))
+        self.actionHistory.setText(QApplication.translate("MainWindow", "History", None, QApplication.UnicodeUTF8))
+        self.actionHistory.setToolTip(QApplication.translate("MainWindow", "List the versions and what changed in each", None, QApplication.UnicodeUTF8))
+        self.actionUpdate.setText(QApplication.translate("MainWindow", "Update", None, QApplication.UnicodeUTF8))
+        self.actionUpdate.setToolTip(QApplication.translate("MainWindow", "Copy only what changed in the latest version into this checkout", None, QApplication.UnicodeUTF8))
 
     
     def connectSignalsAndSlots(self, MainWindow):
@@ -451,6 +561,7 @@ class Ui_MainWindow(object):
         QObject.connect(self.actionCheckout, SIGNAL("triggered()"), self.checkout)
         QObject.connect(self.actionCheckin, SIGNAL("triggered()"), self.checkin)
         QObject.connect(self.actionInstall, SIGNAL("triggered()"), self.install)
+        QObject.connect(self.actionBatchInstall, SIGNAL("triggered()"), self.batchInstall)
         QObject.connect(self.actionOpen_File, SIGNAL("triggered()"), self.openFile)
         QObject.connect(self.actionSettings, SIGNAL("triggered()"), self.settings)
         QObject.connect(self.actionRefresh, SIGNAL("triggered()"), self.refresh)
@@ -458,6 +569,8 @@ class Ui_MainWindow(object):
         QObject.connect(self.actionRename, SIGNAL("triggered()"), self.rename)
         QObject.connect(self.actionRemove, SIGNAL("triggered()"), self.remove)
         QObject.connect(self.actionDiscard, SIGNAL("triggered()"), self.discard)
+        QObject.connect(self.actionHistory, SIGNAL("triggered()"), self.history)
+        QObject.connect(self.actionUpdate, SIGNAL("triggered()"), self.update)
         
         # Tabs
         QObject.connect(self.fileTabs, SIGNAL("currentChanged(int)"), self.tabSwitch)
@@ -467,6 +580,15 @@ class Ui_MainWindow(object):
         QObject.connect(self.localFilesTreeWidget, SIGNAL("customContextMenuRequested(QPoint)"), self.localFilesContextMenu)
         QObject.connect(self.projectFilesTreeWidget, SIGNAL("itemSelectionChanged()"), self.projectItemSelectionChanged)
         QObject.connect(self.projectFilesTreeWidget, SIGNAL("customContextMenuRequested(QPoint)"), self.projectFilesContextMenu)
+        QObject.connect(self.projectFilesTreeWidget, SIGNAL("itemExpanded(QTreeWidgetItem*)"), self.projectItemExpanded)
+        
+        # Search
+        QObject.connect(self.searchLineEdit, SIGNAL("textChanged(QString)"), self.search)
+        QObject.connect(self.searchResultsTreeWidget, SIGNAL("itemActivated(QTreeWidgetItem*,int)"), self.searchResultActivated)
+        
+        # Jobs
+        QObject.connect(self.jobsTreeWidget, SIGNAL("itemSelectionChanged()"), self.jobSelectionChanged)
+        QObject.connect(self.cancelJobButton, SIGNAL("clicked()"), self.cancelJob)
     
     def refresh(self):
     	controller.refreshTree(self)
@@ -483,9 +605,18 @@ class Ui_MainWindow(object):
     def discard(self):
         controller.runDiscard(self)
     
+    def update(self):
+        controller.runUpdate(self)
+    
     def install(self):
         controller.runInstall(self)
     
+    def batchInstall(self):
+        controller.runBatchInstall(self)
+    
+    def history(self):
+        controller.runHistory(self)
+    
     def openFile(self):
         controller.runOpen(self)
     
@@ -510,6 +641,21 @@ class Ui_MainWindow(object):
     def projectItemSelectionChanged(self):
         controller.projectItemSelectionChanged(self)
     
+    def projectItemExpanded(self, item):
+        controller.projectItemExpanded(self, item)
+    
+    def search(self, text):
+        controller.runSearch(self, text)
+    
+    def searchResultActivated(self, item, column):
+        controller.searchResultActivated(self, item)
+    
+    def jobSelectionChanged(self):
+        controller.jobSelectionChanged(self)
+    
+    def cancelJob(self):
+        controller.cancelSelectedJobs(self)
+    
     def localFilesContextMenu(self, point):
         controller.localFilesContextMenu(self, point)
     
@@ -0,0 +1,179 @@
+"""
+Compressed tar archives of old versions. Archives are written and read as
+streams: the tar data is piped through the zstd or xz command (python 2 has
+neither module) or through tarfile's own gzip, and extracting writes every
+file straight to its destination.
+
+Every archive has a small JSON index of its contents, so listing an archived
+version does not decompress it.
+"""
+
+import os, stat, json, tarfile, tempfile
+from subprocess import Popen, PIPE
+from distutils.spawn import find_executable
+
+# name: (compress command, decompress command, file extension); gz needs no command
+COMPRESSIONS = {
+	"zstd": (["zstd", "-q", "-c", "-T0"], ["zstd", "-q", "-d", "-c"], ".tar.zst"),
+	"xz": (["xz", "-c", "-T0"], ["xz", "-d", "-c"], ".tar.xz"),
+	"gz": (None, None, ".tar.gz"),
+}
+INDEX_FORMAT = 1
+CHUNK_SIZE = 1024 * 1024
+
+def isAvailable(compression):
+	if compression not in COMPRESSIONS:
+		return False
+	command = COMPRESSIONS[compression][0]
+	return command is None or find_executable(command[0]) is not None
+
+def extension(compression):
+	return COMPRESSIONS[compression][2]
+
+class _Writer:
+	"""A tarfile in stream mode, compressed by a command or gzip"""
+	def __init__(self, archivePath, compression):
+		self._out = open(archivePath, "wb")
+		self._process = None
+		command = COMPRESSIONS[compression][0]
+		if command is None:
+			self.tar = tarfile.open(fileobj=self._out, mode="w|gz")
+		else:
+			self._process = Popen(command, stdin=PIPE, stdout=self._out, close_fds=True)
+			self.tar = tarfile.open(fileobj=self._process.stdin, mode="w|")
+
+	def close(self, failed=False):
+		try:
+			if not failed:
+				self.tar.close()
+			if self._process is not None:
+				self._process.stdin.close()
+				if self._process.wait() != 0 and not failed:
+					raise Exception("Compression failed")
+		finally:
+			self._out.close()
+
+class _Reader:
+	def __init__(self, archivePath, compression):
+		self._process = None
+		command = COMPRESSIONS[compression][1]
+		if command is None:
+			self.tar = tarfile.open(archivePath, mode="r|gz")
+		else:
+			self._process = Popen(command + [archivePath], stdout=PIPE, close_fds=True)
+			self.tar = tarfile.open(fileobj=self._process.stdout, mode="r|")
+
+	def close(self, failed=False):
+		self.tar.close()
+		if self._process is not None:
+			if failed:
+				self._process.kill()
+			self._process.stdout.close()
+			if self._process.wait() != 0 and not failed:
+				raise Exception("Decompression failed")
+
+def writeArchive(entries, archivePath, compression):
+	"""
+	Streams entries into a new archive.
+	@precondition: entries yields (relPath, st, source): st is the os.lstat
+		result to record, and source the file to read for regular files, the
+		link target for symlinks, and None for folders
+	@returns: The index of the archive, see writeIndex()
+	"""
+	index = {"format": INDEX_FORMAT, "compression": compression, "files": [], "bytes": 0}
+	writer = _Writer(archivePath, compression)
+	try:
+		for relPath, st, source in entries:
+			info = tarfile.TarInfo(relPath)
+			info.mode = st.st_mode & 07777
+			info.mtime = st.st_mtime
+			entry = {"path": relPath, "mode": info.mode, "mtime": st.st_mtime}
+			if stat.S_ISDIR(st.st_mode):
+				info.type = tarfile.DIRTYPE
+				entry["type"] = "dir"
+				writer.tar.addfile(info)
+			elif stat.S_ISLNK(st.st_mode):
+				info.type = tarfile.SYMTYPE
+				info.linkname = source
+				entry.update({"type": "link", "target": source})
+				writer.tar.addfile(info)
+			else:
+				info.size = os.path.getsize(source)
+				entry.update({"type": "file", "size": info.size})
+				f = open(source, "rb")
+				try:
+					writer.tar.addfile(info, f)
+				finally:
+					f.close()
+				index["bytes"] += info.size
+			index["files"].append(entry)
+	except BaseException:
+		writer.close(True)
+		raise
+	writer.close()
+	return index
+
+def _safeName(name):
+	name = os.path.normpath(name)
+	if os.path.isabs(name) or name == ".." or name.startswith(".." + os.sep):
+		raise Exception("Bad path in archive: " + name)
+	return name
+
+def extractArchive(archivePath, compression, dest, onChunk=None, writable=False):
+	"""
+	Writes the contents of an archive below dest, file by file as they are
+	decompressed. onChunk(size) is called after every chunk and may raise to stop.
+	@precondition: dest does not exist
+	@postcondition: if writable is True the owner may write every file
+	"""
+	os.makedirs(dest)
+	reader = _Reader(archivePath, compression)
+	dirs = []
+	try:
+		for member in reader.tar:
+			target = os.path.join(dest, _safeName(member.name))
+			if member.isdir():
+				if not os.path.isdir(target):
+					os.makedirs(target)
+				dirs.append((target, member))
+				continue
+			if not os.path.isdir(os.path.dirname(target)):
+				os.makedirs(os.path.dirname(target))
+			if member.issym():
+				os.symlink(member.linkname, target)
+				continue
+			src = reader.tar.extractfile(member)
+			out = open(target, "wb")
+			try:
+				for chunk in iter(lambda: src.read(CHUNK_SIZE), ""):
+					out.write(chunk)
+					if onChunk is not None:
+						onChunk(len(chunk))
+			finally:
+				out.close()
+			os.chmod(target, member.mode | (stat.S_IWUSR if writable else 0))
+			os.utime(target, (member.mtime, member.mtime))
+	except BaseException:
+		reader.close(True)
+		raise
+	reader.close()
+	for target, member in reversed(dirs):
+		os.chmod(target, member.mode)
+		os.utime(target, (member.mtime, member.mtime))
+
+def writeIndex(indexPath, index):
+	"""Replaces indexPath in one step; an archive counts as complete once its index exists"""
+	fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(indexPath))
+	f = os.fdopen(fd, "w")
+	try:
+		json.dump(index, f)
+	finally:
+		f.close()
+	os.rename(tmp, indexPath)
+
+def readIndex(indexPath):
+	f = open(indexPath)
+	try:
+		return json.load(f)
+	finally:
+		f.close()
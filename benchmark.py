@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+Times the core asset management operations on a synthetic project, so that
+changes can be compared across commits:
+	python benchmark.py --output before.json
+	... change something ...
+	python benchmark.py --output after.json
+
+The project is built with addProjectFolder/addVersionedFolder: depth levels
+of plain folders with fanout folders each, and folders versioned folders in
+every folder of the last level, each with versions versions of files files
+of fileSize bytes. Versions are written directly instead of checked in so
+that large projects are quick to build.
+
+controller imports Qt, so the tree operations replay the utilities calls
+that its populate/enable handlers make instead of building widgets.
+Results are the min/median/mean/max seconds of repeat runs per operation.
+"""
+
+import os, sys, time, json, shutil, tempfile, argparse, platform, subprocess
+import utilities
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Synthetic Project
+def buildProject(root, depth, fanout, folders, versions, files, fileSize, installed):
+	"""
+	Configures utilities for a new project in root and fills it.
+	@returns: The paths of the versioned folders
+	"""
+	projectDir = os.path.join(root, "project")
+	userDir = os.path.join(root, "local")
+	os.makedirs(projectDir)
+	os.makedirs(userDir)
+	utilities._configureProject(["Benchmark", projectDir, "benchmark", userDir], os.path.join(root, "config.ini"))
+
+	parents = [projectDir]
+	for level in range(depth):
+		children = []
+		for parent in parents:
+			for i in range(fanout):
+				utilities.addProjectFolder(parent, "f%d_%d" % (level, i))
+				children.append(os.path.join(parent, "f%d_%d" % (level, i)))
+		parents = children
+
+	vDirs = []
+	for parent in parents:
+		for i in range(folders):
+			vDirs.append(utilities.addVersionedFolder(parent, "asset%d" % i).paths(utilities.PROJECT_ADDED)[0])
+	for n, vDir in enumerate(vDirs):
+		for v in range(1, versions + 1):
+			vPath = os.path.join(vDir, "src", "v" + str(v))
+			os.makedirs(vPath)
+			for f in range(files):
+				out = open(os.path.join(vPath, "file%d.txt" % f), "wb")
+				out.write(os.urandom(fileSize))
+				out.close()
+		utilities._updateNodeInfo(vDir, lambda nodeInfo: nodeInfo.set("Versioning", "latestversion", str(versions)))
+		if n < len(vDirs) * installed:
+			utilities.install(vDir, os.path.join(vDir, "src", "v" + str(versions), "file0.txt"), True)
+	return vDirs
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Controller Replays
+def populateProjectTree(dirPath, expand):
+	"""The utilities calls of controller.populateProjectTree(), and of expanding every folder if expand"""
+	for f, isDir in utilities.getProjectChildren(dirPath):
+		if isDir:
+			if utilities.isVersionedFolder(f):
+				utilities.getVersionedFolderInfo(f)
+			elif expand:
+				populateProjectTree(f, expand)
+
+def populateLocalTree():
+	"""The utilities calls of controller.populateLocalTree()"""
+	for f in os.listdir(utilities.getUserDir()):
+		f = os.path.join(utilities.getUserDir(), f)
+		os.path.getmtime(f)
+		try:
+			utilities.getFilesCheckoutTime(f)
+		except Exception:
+			pass
+
+def enableComponents(path):
+	"""The utilities calls of controller.enableComponents() for a selected project folder"""
+	utilities.isVersionedFolder(path)
+	utilities.canRename(path)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Timing
+def _summary(times):
+	times = sorted(times)
+	return {"runs": len(times), "min": times[0], "median": times[len(times) / 2],
+		"mean": sum(times) / len(times), "max": times[-1]}
+
+def timeOperation(func, repeat, setup=None, teardown=None, cold=False):
+	"""
+	@precondition: setup is None or is called before each run, untimed, and
+		what it returns is passed to func
+	@precondition: teardown is None or is called with what func returned after each run, untimed
+	@precondition: cold is True to empty the metadata cache before each run
+	"""
+	times = []
+	for i in range(repeat):
+		arg = setup() if setup is not None else None
+		if cold:
+			utilities._metadataCache.clear()
+		start = time.time()
+		if setup is not None:
+			result = func(arg)
+		else:
+			result = func()
+		times.append(time.time() - start)
+		if teardown is not None:
+			teardown(result)
+	return _summary(times)
+
+def runBenchmarks(vDirs, repeat, withIndex):
+	projectDir = utilities.getProjectDir()
+	vDir = vDirs[len(vDirs) / 2]
+	category = os.path.dirname(vDir)
+	results = {}
+	def run(name, func, setup=None, teardown=None, cold=False):
+		results[name] = timeOperation(func, repeat, setup, teardown, cold)
+		print "%-32s %10.6f s" % (name, results[name]["median"])
+
+	if withIndex:
+		run("rebuildIndex", lambda: utilities.rebuildIndex(projectDir))
+	run("populateProjectTree", lambda: populateProjectTree(projectDir, False), cold=True)
+	run("populateProjectTree (warm)", lambda: populateProjectTree(projectDir, False))
+	run("expandProjectTree", lambda: populateProjectTree(projectDir, True), cold=True)
+	run("expandProjectTree (warm)", lambda: populateProjectTree(projectDir, True))
+	run("hasInstalledChild (project)", lambda: utilities.hasInstalledChild(projectDir))
+	run("hasInstalledChild (folder)", lambda: utilities.hasInstalledChild(category))
+	run("enableComponents", lambda: enableComponents(category))
+	run("getVersionedFolderInfo", lambda: utilities.getVersionedFolderInfo(vDir))
+	run("buildSearchIndex", lambda: utilities.getSearchIndex(True))
+	run("search", lambda: utilities.searchProject("asset1"))
+	run("search (prefix)", lambda: utilities.searchProject("a"))
+
+	# Each checkout is discarded or checked in before the next one
+	def checkedOut():
+		return utilities.checkout(vDir, True).paths(utilities.LOCAL_ADDED)[0]
+	run("checkout", lambda: utilities.checkout(vDir, True),
+		teardown=lambda changes: utilities.discard(changes.paths(utilities.LOCAL_ADDED)[0]))
+	run("checkin", utilities.checkin, setup=checkedOut)
+	run("discard", utilities.discard, setup=checkedOut)
+	for d in vDirs[:10]:
+		utilities.checkout(d, False)
+	run("populateLocalTree", populateLocalTree, cold=True)
+	for f in os.listdir(utilities.getUserDir()):
+		utilities.discard(os.path.join(utilities.getUserDir(), f))
+
+	latest = lambda: os.path.join(vDir, "src", "v" + str(utilities.getNode(vDir)["latestversion"]), "file0.txt")
+	run("install", lambda path: utilities.install(vDir, path, True), setup=latest)
+	def oldVersions():
+		# Put back versions for purge() to remove
+		for vPath in [os.path.join(vDir, "src", "v%d" % v) for v in range(1, 4)]:
+			if not os.path.exists(vPath):
+				shutil.copytree(os.path.dirname(latest()), vPath)
+		return 4
+	run("purge", lambda upto: utilities.purge(os.path.join(vDir, "src"), upto), setup=oldVersions)
+	run("collectVersions", lambda upto: utilities.collectVersions(vDir, 0), setup=oldVersions)
+	return results
+
+def _commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+			stderr=open(os.devnull, "w")).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Time the asset manager on a synthetic project")
+	parser.add_argument("--depth", type=int, default=2, help="levels of plain folders")
+	parser.add_argument("--fanout", type=int, default=5, help="plain folders in each folder")
+	parser.add_argument("--folders", type=int, default=10, help="versioned folders in each folder of the last level")
+	parser.add_argument("--versions", type=int, default=5, help="versions of each versioned folder")
+	parser.add_argument("--files", type=int, default=5, help="files in each version")
+	parser.add_argument("--file-size", type=int, default=64 * 1024, help="bytes in each file")
+	parser.add_argument("--installed", type=float, default=0.2, help="fraction of versioned folders installed")
+	parser.add_argument("--repeat", type=int, default=5, help="runs of each operation")
+	parser.add_argument("--index", action="store_true", help="give the project a node index")
+	parser.add_argument("--dir", help="build the project here instead of in a temporary directory, and keep it")
+	parser.add_argument("--output", help="write the results to this JSON file")
+	args = parser.parse_args()
+
+	root = args.dir or tempfile.mkdtemp(prefix="chasmBenchmark")
+	try:
+		start = time.time()
+		vDirs = buildProject(root, args.depth, args.fanout, args.folders, args.versions, args.files,
+			args.file_size, args.installed)
+		print "Built %d versioned folders in %.1f s" % (len(vDirs), time.time() - start)
+		if args.index:
+			utilities.rebuildIndex(utilities.getProjectDir())
+		results = runBenchmarks(vDirs, args.repeat, args.index)
+	finally:
+		utilities.stopInstallScheduler()
+		if not args.dir:
+			shutil.rmtree(root, ignore_errors=True)
+
+	report = {"commit": _commit(), "time": time.time(), "python": platform.python_version(),
+		"platform": platform.platform(), "parameters": vars(args), "results": results}
+	if args.output:
+		out = open(args.output, "w")
+		json.dump(report, out, indent=1, sort_keys=True)
+		out.close()
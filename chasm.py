@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Command line interface to the asset manager for pipeline scripts and farm
+hooks. It never imports Qt, and utilities is only imported once the
+arguments are parsed, so that it starts quickly.
+
+	chasm.py status [PATH...]
+	chasm.py ls [PATH]
+	chasm.py checkout PATH [--no-lock] [--version N] [--keep-links]
+	chasm.py checkin PATH
+	chasm.py discard PATH
+	chasm.py update PATH [--dry-run]
+	chasm.py install PATH FILE [--stable] [--priority N]
+	chasm.py purge PATH --upto N [--archive]
+	chasm.py gc [PATH] [--rate BYTES]
+	chasm.py retention PATH [--keep-last N] [--keep-days N] [--keep-installed True|False]
+	chasm.py pin PATH VERSION [--unpin]
+	chasm.py history PATH
+	chasm.py diff PATH OLD [NEW]
+	chasm.py search [WORD...] [--locked-by USER] [--checkin-user USER] [--installed yes|no] [--limit N]
+
+Project paths may be absolute or relative to the project directory, checked
+out paths absolute or relative to the local directory; a relative path that
+exists from the current directory is taken as it is. With --json the result
+is printed as one JSON document, and errors as {"error": message}.
+The project is read from .myConfig.ini next to this script, like the GUI,
+unless --config or the --project/--user/--local options say otherwise.
+"""
+
+import os, sys, argparse
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".myConfig.ini")
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Helpers
+def _configure(utilities, args):
+	from ConfigParser import ConfigParser
+	cp = ConfigParser()
+	cp.read(args.config)
+	def option(value, section, name):
+		if value is not None:
+			return value
+		if not cp.has_option(section, name):
+			raise Exception("No " + section + " " + name + " in " + args.config)
+		return cp.get(section, name)
+	parms = [cp.get("Project", "Name") if cp.has_option("Project", "Name") else "",
+		os.path.abspath(option(args.project, "Project", "Directory")),
+		option(args.user, "User", "Name"),
+		os.path.abspath(option(args.local, "User", "Directory"))]
+	utilities._configureProject(parms, args.config, save=False)
+
+def _resolve(path, base):
+	if os.path.isabs(path):
+		return os.path.normpath(path)
+	if os.path.exists(path):
+		return os.path.abspath(path)
+	return os.path.normpath(os.path.join(base, path))
+
+def _checkedOut(path):
+	if not os.path.exists(os.path.join(path, ".checkoutInfo")):
+		raise Exception("Not a checked out folder: " + path)
+	return path
+
+def _changes(changes):
+	return {"summary": changes.summary, "changes": [[kind, path] for kind, path in changes]}
+
+def _nodeStatus(utilities, path):
+	if os.path.exists(os.path.join(path, ".checkoutInfo")):
+		cp = utilities.getCheckoutInfo(path)
+		return {"path": path, "checkedout": True,
+			"checkedoutfrom": cp.get("Checkout", "checkedoutfrom"),
+			"version": cp.getint("Checkout", "version"),
+			"lockedbyme": cp.getboolean("Checkout", "lockedbyme"),
+			"checkouttime": cp.get("Checkout", "checkouttime"),
+			"cancheckin": utilities.canCheckin(path)}
+	node = utilities.getNode(path)
+	if node is None or not os.path.exists(path):
+		raise Exception("No such file or folder: " + path)
+	status = {"path": path, "isdir": node["isdir"], "versioned": node["versioned"]}
+	if node["versioned"]:
+		for key in ["latestversion", "locked", "lastcheckoutuser", "lastcheckouttime",
+				"lastcheckinuser", "lastcheckintime", "installed", "stable"]:
+			status[key] = node[key]
+	return status
+
+def _formatStatus(status):
+	if status.get("checkedout"):
+		return "%s: checked out from %s v%d%s at %s" % (status["path"], status["checkedoutfrom"],
+			status["version"], " (locked)" if status["lockedbyme"] else "", status["checkouttime"])
+	if not status["versioned"]:
+		return status["path"] + (": folder" if status["isdir"] else ": file")
+	line = "%s: v%d, checked in by %s at %s" % (status["path"], status["latestversion"],
+		status["lastcheckinuser"], status["lastcheckintime"])
+	if status["locked"]:
+		line += ", locked by " + status["lastcheckoutuser"]
+	if status["installed"]:
+		line += ", installed " + status["stable"]
+	return line
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Commands
+# Each returns (result for --json, text for people)
+def runStatus(utilities, args):
+	if args.paths:
+		paths = [_resolve(p, utilities.getProjectDir()) for p in args.paths]
+	else:
+		# Everything checked out
+		userDir = utilities.getUserDir()
+		paths = [os.path.join(userDir, n) for n in sorted(os.listdir(userDir))
+			if os.path.exists(os.path.join(userDir, n, ".checkoutInfo"))]
+	result = [_nodeStatus(utilities, p) for p in paths]
+	return result, "\n".join([_formatStatus(s) for s in result])
+
+def runLs(utilities, args):
+	dirPath = _resolve(args.path, utilities.getProjectDir()) if args.path else utilities.getProjectDir()
+	children = sorted(utilities.getProjectChildren(dirPath))
+	result = []
+	lines = []
+	for path, isDir in children:
+		versioned = isDir and utilities.isVersionedFolder(path)
+		result.append({"path": path, "isdir": isDir, "versioned": versioned})
+		lines.append(os.path.basename(path) + ("*" if versioned else "/" if isDir else ""))
+	return result, "\n".join(lines)
+
+def runCheckout(utilities, args):
+	changes = utilities.checkout(_resolve(args.path, utilities.getProjectDir()), not args.no_lock,
+		version=args.version)
+	if not args.keep_links:
+		# Whatever edits the checkout next does not know to unshare files first
+		for path in changes.paths(utilities.LOCAL_ADDED):
+			utilities.unshareTree(path)
+	return _changes(changes), changes.summary
+
+def runCheckin(utilities, args):
+	changes = utilities.checkin(_checkedOut(_resolve(args.path, utilities.getUserDir())))
+	return _changes(changes), changes.summary
+
+def runDiscard(utilities, args):
+	changes = utilities.discard(_checkedOut(_resolve(args.path, utilities.getUserDir())))
+	return _changes(changes), changes.summary
+
+def runUpdate(utilities, args):
+	toUpdate = _checkedOut(_resolve(args.path, utilities.getUserDir()))
+	if args.dry_run:
+		update = utilities.getCheckoutUpdate(toUpdate)
+		lines = ["v%d -> v%d" % (update["version"], update["latest"])]
+		for kind, mark in [("added", "A"), ("removed", "D"), ("changed", "M")]:
+			lines += [mark + " " + path for path in update[kind]]
+		lines += ["C " + path for path in update["conflicts"]]
+		return update, "\n".join(lines[:1] + sorted(lines[1:], key=lambda line: line[2:]))
+	changes = utilities.updateCheckout(toUpdate)
+	return _changes(changes), changes.summary
+
+def runInstall(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	srcFilePath = args.file
+	if not os.path.isabs(srcFilePath):
+		# A file of the latest version
+		node = utilities.getNode(vDirPath)
+		if node is None or not node["versioned"]:
+			raise Exception("Not a versioned folder.")
+		srcFilePath = os.path.join(vDirPath, "src", "v" + str(node["latestversion"]), srcFilePath)
+	if not os.path.exists(srcFilePath) and not os.path.exists(srcFilePath + utilities.DELTA_EXT):
+		raise Exception("No such file: " + srcFilePath)
+	changes = utilities.install(vDirPath, srcFilePath, args.stable, priority=args.priority)
+	return _changes(changes), changes.summary
+
+def runPurge(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	if not utilities.isVersionedFolder(vDirPath):
+		raise Exception("Not a versioned folder.")
+	utilities.purge(os.path.join(vDirPath, "src"), args.upto, True if args.archive else None)
+	return ({"path": vDirPath, "upto": args.upto, "archived": utilities.getArchivedVersions(vDirPath)},
+		"Purged versions of " + vDirPath + " below " + str(args.upto))
+
+def runGc(utilities, args):
+	rate = args.rate
+	if args.path:
+		vDirPath = _resolve(args.path, utilities.getProjectDir())
+		if not utilities.isVersionedFolder(vDirPath):
+			raise Exception("Not a versioned folder.")
+		freed = utilities.collectVersions(vDirPath, rate)
+	else:
+		freed = utilities.collectGarbage(utilities.getProjectDir(), rate)
+	return {"freed": freed}, "Freed " + str(freed) + " bytes"
+
+def _policy(utilities, vDirPath):
+	policy = utilities.getRetentionPolicy(vDirPath)
+	policy["pinned"] = sorted(policy["pinned"])
+	policy["installed"] = sorted(policy["installed"])
+	policy["expired"] = utilities.expiredVersions(vDirPath)
+	text = "keep last %(keepLast)d, keep %(keepDays)g days, keep installed %(keepInstalled)s" % policy
+	text += "\npinned: %s\ninstalled: %s\nexpired: %s" % (policy["pinned"], policy["installed"], policy["expired"])
+	return policy, text
+
+def runRetention(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	if args.keep_last is not None or args.keep_days is not None or args.keep_installed is not None:
+		utilities.setRetentionPolicy(vDirPath, args.keep_last, args.keep_days, args.keep_installed)
+	return _policy(utilities, vDirPath)
+
+def runPin(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	if not os.path.isdir(os.path.join(vDirPath, "src", "v" + str(args.version))):
+		raise Exception("Version doesn't exist " + str(args.version))
+	utilities.pinVersion(vDirPath, args.version, not args.unpin)
+	return _policy(utilities, vDirPath)
+
+def runHistory(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	history = utilities.getVersionHistory(vDirPath)
+	lines = ["%4d  %-12s %-28s %6d files %12d bytes  %s" % (h["version"], h["user"] or "?", h["time"] or "?",
+		h["files"], h["bytes"], h["state"]) for h in history]
+	return history, "\n".join(lines)
+
+def runDiff(utilities, args):
+	vDirPath = _resolve(args.path, utilities.getProjectDir())
+	new = args.new
+	if new is None:
+		node = utilities.getNode(vDirPath)
+		if node is None or not node["versioned"]:
+			raise Exception("Not a versioned folder.")
+		new = node["latestversion"]
+	diff = utilities.diffVersions(vDirPath, args.old, new)
+	lines = []
+	for kind, mark in [("added", "A"), ("removed", "D"), ("changed", "M")]:
+		lines += [mark + " " + path for path in diff[kind]]
+	return diff, "\n".join(sorted(lines, key=lambda line: line[2:]))
+
+def runSearch(utilities, args):
+	text = " ".join(args.words)
+	if args.locked_by:
+		text += " locked:" + args.locked_by
+	if args.checkin_user:
+		text += " by:" + args.checkin_user
+	if args.installed:
+		text += " installed:" + args.installed
+	paths = utilities.searchProject(text, args.limit)
+	projectDir = utilities.getProjectDir()
+	return paths, "\n".join([os.path.relpath(p, projectDir) for p in paths])
+
+def _parser():
+	parser = argparse.ArgumentParser(prog="chasm", description="Asset manager command line interface")
+	parser.add_argument("--json", action="store_true", help="print results as JSON")
+	parser.add_argument("--config", default=DEFAULT_CONFIG, help="the asset manager config file")
+	parser.add_argument("--project", help="the project directory")
+	parser.add_argument("--user", help="the user name")
+	parser.add_argument("--local", help="the local directory")
+	commands = parser.add_subparsers(title="commands")
+
+	p = commands.add_parser("status", help="show versioned folders or checked out folders")
+	p.add_argument("paths", nargs="*")
+	p.set_defaults(run=runStatus)
+	p = commands.add_parser("ls", help="list a project folder")
+	p.add_argument("path", nargs="?")
+	p.set_defaults(run=runLs)
+	p = commands.add_parser("checkout", help="check out a versioned folder")
+	p.add_argument("path")
+	p.add_argument("--no-lock", action="store_true", help="do not lock the folder")
+	p.add_argument("--version", type=int, help="check out an older version")
+	p.add_argument("--keep-links", action="store_true",
+		help="keep files hardlinked to the checked in version read-only instead of copying them")
+	p.set_defaults(run=runCheckout)
+	p = commands.add_parser("checkin", help="check in a checked out folder")
+	p.add_argument("path")
+	p.set_defaults(run=runCheckin)
+	p = commands.add_parser("discard", help="discard a checked out folder")
+	p.add_argument("path")
+	p.set_defaults(run=runDiscard)
+	p = commands.add_parser("update", help="bring a checked out folder up to the latest version")
+	p.add_argument("path")
+	p.add_argument("--dry-run", action="store_true", help="only list the files it would change, and the conflicts")
+	p.set_defaults(run=runUpdate)
+	p = commands.add_parser("install", help="install a file of a versioned folder")
+	p.add_argument("path")
+	p.add_argument("file", help="a file of the latest version, or an absolute path")
+	p.add_argument("--stable", action="store_true", help="make it the stable install")
+	p.add_argument("--priority", type=int, help="the install queue priority")
+	p.set_defaults(run=runInstall)
+	p = commands.add_parser("purge", help="remove old versions of a versioned folder")
+	p.add_argument("path")
+	p.add_argument("--upto", type=int, required=True, help="remove versions below this one")
+	p.add_argument("--archive", action="store_true", help="keep them as compressed archives")
+	p.set_defaults(run=runPurge)
+	p = commands.add_parser("gc", help="remove the versions the retention policies no longer keep")
+	p.add_argument("path", nargs="?", help="a versioned folder; the whole project by default")
+	p.add_argument("--rate", type=int, help="delete at most this many bytes a second, 0 for no limit")
+	p.set_defaults(run=runGc)
+	p = commands.add_parser("retention", help="show or change the retention policy of a versioned folder")
+	p.add_argument("path")
+	p.add_argument("--keep-last", type=int, help="keep this many of the newest versions")
+	p.add_argument("--keep-days", type=float, help="keep versions younger than this, 0 to turn it off")
+	p.add_argument("--keep-installed", choices=["True", "False"], help="keep versions that were installed")
+	p.set_defaults(run=runRetention)
+	p = commands.add_parser("pin", help="keep a version whatever the retention policy")
+	p.add_argument("path")
+	p.add_argument("version", type=int)
+	p.add_argument("--unpin", action="store_true", help="stop keeping it")
+	p.set_defaults(run=runPin)
+	p = commands.add_parser("history", help="list the versions of a versioned folder")
+	p.add_argument("path")
+	p.set_defaults(run=runHistory)
+	p = commands.add_parser("diff", help="list the files that differ between two versions")
+	p.add_argument("path")
+	p.add_argument("old", type=int)
+	p.add_argument("new", type=int, nargs="?", help="the latest version by default")
+	p.set_defaults(run=runDiff)
+	p = commands.add_parser("search", help="find folders and files by name")
+	p.add_argument("words", nargs="*", help="the last word is looked for in names, the others in paths")
+	p.add_argument("--locked-by", help="only versioned folders this user has locked")
+	p.add_argument("--checkin-user", help="only versioned folders this user checked in last")
+	p.add_argument("--installed", choices=["yes", "no"], help="only installed, or not installed, versioned folders")
+	p.add_argument("--limit", type=int, default=50, help="show at most this many")
+	p.set_defaults(run=runSearch)
+	return parser
+
+def main(argv):
+	args = _parser().parse_args(argv)
+	try:
+		import utilities
+		_configure(utilities, args)
+		result, text = args.run(utilities, args)
+	except Exception, e:
+		if args.json:
+			import json
+			print json.dumps({"error": str(e)})
+		else:
+			sys.stderr.write("chasm: error: " + str(e) + "\n")
+		return 1
+	if args.json:
+		import json
+		print json.dumps(result, indent=1)
+	elif text:
+		print text
+	return 0
+
+# >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,8 @@
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
-import os, glob, types, subprocess, sys
+import os, glob, types, subprocess, sys, threading, errno
 from project import Project
-import utilities
+import utilities, jobs, watcher, tracing
 from utilities import *
 
 _tabNum = 0
@@ -20,6 +20,8 @@ def setup(ui):
         populateLocalTree(ui)
         populateProjectTree(ui)
         enableComponents(ui)
+        startWatching(ui)
+        startSearchIndex()
     
 #>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Common User Actions
 
@@ -32,13 +34,9 @@ def runCheckout(ui):
     if tabNum == 1:
         curItem = ui.projectFilesTreeWidget.currentItem()
         coPath = ui.getTreeItemPath(curItem, getProjectDir())
-        try:
-            #TODO ask about locking?
-            checkout(coPath, True)
-            setProjectTreeVersionedItemInfo(curItem, coPath)
-            populateLocalTree(ui)
-        except Exception:
-            ui.errorMessage.showMessage("Error")
+        #TODO ask about locking?
+        startJob(ui, "Checkout " + os.path.basename(coPath), checkout, (coPath, True), coPath,
+                 lambda changes: applyChanges(ui, changes))
     else:
         ui.errorMessage.showMessage("You can only checkout project files")
 
@@ -48,21 +46,26 @@ def runCheckin(ui):
         curItem = ui.localFilesTreeWidget.currentItem()
         toCheckin = ui.getTreeItemPath(curItem, getUserDir())
         if canCheckin(toCheckin):
-            checkin(toCheckin)
-            populateLocalTree(ui)
-            populateProjectTree(ui)
+            startJob(ui, "Checkin " + os.path.basename(toCheckin), checkin, (toCheckin,), toCheckin,
+                     lambda changes: applyChanges(ui, changes))
         else:
             ui.errorMessage.showMessage("Can not checkin: file is locked or newer verion is available")
     else:
         ui.errorMessage.showMessage("You can only checkin local files")
 
 def runDiscard(ui):
-	if ui.fileTabs.currentIndex() == 0:
-		curItem = ui.localFilesTreeWidget.currentItem()
+    if ui.fileTabs.currentIndex() == 0:
+        curItem = ui.localFilesTreeWidget.currentItem()
         toDiscard = ui.getTreeItemPath(curItem, getUserDir())
-        discard(toDiscard)
-        populateLocalTree(ui)
-        populateProjectTree(ui)
+        startJob(ui, "Discard " + os.path.basename(toDiscard), discard, (toDiscard,), toDiscard,
+                 lambda changes: applyChanges(ui, changes), withProgress=False)
+
+def runUpdate(ui):
+    if ui.fileTabs.currentIndex() == 0:
+        curItem = ui.localFilesTreeWidget.currentItem()
+        toUpdate = ui.getTreeItemPath(curItem, getUserDir())
+        startJob(ui, "Update " + os.path.basename(toUpdate), updateCheckout, (toUpdate,), toUpdate,
+                 lambda changes: applyChanges(ui, changes))
 
 def runInstall(ui):
     tabNum = ui.fileTabs.currentIndex()
@@ -74,15 +77,67 @@ def runInstall(ui):
         if not selected == None:
             srcFilePath = str(selected.text(1))
             #TODO ask about stable
-            #try:
-            install(vDirPath, srcFilePath, True)
-            setProjectTreeVersionedItemInfo(curItem, vDirPath)
-            #populateProjectTree(ui)
-            #except Exception:
-            #    ui.errorMessage.showMessage("Error")
+            startJob(ui, "Install " + os.path.basename(srcFilePath), install, (vDirPath, srcFilePath, True), vDirPath,
+                     lambda changes: applyChanges(ui, changes))
     else:
         ui.errorMessage.showMessage("You can only install project files")
 
+def runBatchInstall(ui):
+    """
+    Installs one file from each selected versioned folder in a single job.
+    Folders with more than one file ask which one to install.
+    """
+    if ui.fileTabs.currentIndex() != 1:
+        ui.errorMessage.showMessage("You can only install project files")
+        return
+    entries = []
+    for item in ui.projectFilesTreeWidget.selectedItems():
+        vDirPath = ui.getTreeItemPath(item, getProjectDir())
+        if not isVersionedFolder(vDirPath):
+            continue
+        files = getAvailableInstallFiles(vDirPath)
+        if len(files) == 1:
+            entries.append((vDirPath, files[0], True))
+        elif len(files) > 1:
+            selected = ui.file_select_dialog.selectFile(convertToFileSelectionDialogItems(files))
+            if not selected == None:
+                entries.append((vDirPath, str(selected.text(1)), True))
+    if entries:
+        startJob(ui, "Install " + str(len(entries)) + " files", batchInstall, (entries,), [e[0] for e in entries],
+                 lambda report: batchInstallFinished(ui, report))
+
+def batchInstallFinished(ui, report):
+    failed = []
+    for vDirPath, srcFilePath, newInstFilePath, error in report:
+        updateProjectTreeItem(ui, vDirPath)
+        if error is not None:
+            failed.append(os.path.basename(srcFilePath) + ": " + error)
+    ui.statusbar.showMessage("Installed " + str(len(report) - len(failed)) + " of " + str(len(report)) + " files")
+    if failed:
+        ui.errorMessage.showMessage("Could not install:<br>" + "<br>".join(failed))
+
+def runHistory(ui):
+    if ui.fileTabs.currentIndex() == 1:
+        curItem = ui.projectFilesTreeWidget.currentItem()
+        vDirPath = ui.getTreeItemPath(curItem, getProjectDir())
+        ui.historyDialog.showHistory(vDirPath, convertToHistoryItems(getVersionHistory(vDirPath)))
+    else:
+        ui.errorMessage.showMessage("You can only show the history of project files")
+
+def historySelectionChanged(dialog):
+    """Lists what changed in the selected version, or between the first and last selected versions"""
+    versions = sorted([int(item.text(0)) for item in dialog.versionsTreeWidget.selectedItems()])
+    dialog.changesTreeWidget.clear()
+    if not versions or versions[-1] == 0:
+        return
+    old = versions[0] if len(versions) > 1 else versions[0] - 1
+    try:
+        diff = diffVersions(dialog.vDirPath, old, versions[-1])
+    except Exception, e:
+        dialog.changesTreeWidget.addTopLevelItem(QTreeWidgetItem(QStringList(["", str(e)])))
+        return
+    dialog.changesTreeWidget.addTopLevelItems(convertToChangeItems(diff))
+
 def runNew(ui):
     if ui.fileTabs.currentIndex() == 1:
         curItem = ui.projectFilesTreeWidget.currentItem()
@@ -92,17 +147,18 @@ def runNew(ui):
         if folderType == None or folderName == None:
             return
         if curItem != None and curItem.isSelected():
-            if folderType == 0:
-                newPath = addProjectFolder(ui.getTreeItemPath(curItem, getProjectDir()), folderName)
-            else:
-                newPath = addVersionedFolder(ui.getTreeItemPath(curItem, getProjectDir()), folderName)
-            curItem.addChildren(convertToProjectTreeItems([newPath]))
+            parentPath = ui.getTreeItemPath(curItem, getProjectDir())
         else:
-            if folderType == 0:
-                newPath = addProjectFolder(getProjectDir(), folderName)
-            else:
-                newPath = addVersionedFolder(getProjectDir(), folderName)
-            ui.projectFilesTreeWidget.addTopLevelItems(convertToProjectTreeItems([newPath]))
+            parentPath = getProjectDir()
+        if folderType == 0:
+            changes = addProjectFolder(parentPath, folderName)
+        else:
+            changes = addVersionedFolder(parentPath, folderName)
+        if curItem != None and curItem.isSelected():
+            # The scan picks up the new folder
+            loadProjectTreeChildren(ui, curItem)
+            curItem.setExpanded(True)
+        applyChanges(ui, changes)
     else:
         print "local new"
     
@@ -114,8 +170,7 @@ def runRename(ui):
         if ok:
             name = str(a)
             try:
-                renameFolder(ui.getTreeItemPath(curItem, getProjectDir()), name)
-                curItem.setText(0, name)
+                applyChanges(ui, renameFolder(ui.getTreeItemPath(curItem, getProjectDir()), name))
             except Exception:
                 ui.errorMessage.showMessage("Error")
 
@@ -129,8 +184,7 @@ def runRemove(ui):
         else:
             reply = QMessageBox.Yes
         if reply == QMessageBox.Yes:
-            removeFolder(curItemPath)
-            ui.removeTreeItem(curItem)
+            applyChanges(ui, removeFolder(curItemPath))
 
 def runOpen(ui):
     if ui.fileTabs.currentIndex() == 0:
@@ -140,6 +194,8 @@ def runOpen(ui):
         selected = ui.file_select_dialog.selectFile(convertToFileSelectionDialogItems(files))
         if not selected == None:
             toOpen = str(selected.text(1))
+            # Hardlinked checkouts are read-only until the file gets its own copy
+            unshareFile(toOpen)
             if utilities._isHoudiniFile(toOpen):
                 subprocess.call([os.path.abspath(os.path.join(sys.path[0], "openHoudiniFile")), toOpen])
             else:
@@ -150,6 +206,7 @@ def refreshTree(ui):
 		populateLocalTree(ui)
 	else:
 		populateProjectTree(ui)
+		startSearchIndex(True)
 
 def runSettings(ui):
     ui.settingsDialog.loadSettings(getUsername(), getProjectDir(), getUserDir())
@@ -164,6 +221,123 @@ def runSettings(ui):
         populateLocalTree(ui)
         populateProjectTree(ui)
         enableComponents(ui)
+        startWatching(ui)
+        startSearchIndex()
+
+#>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Search
+
+def startSearchIndex(rebuild=False):
+    """
+    Builds the search index on a background thread, so that the first search does not wait for the scan.
+    With rebuild the node index is rescanned first, for Refresh.
+    """
+    thread = threading.Thread(target=rebuildIndexes if rebuild else getSearchIndex)
+    thread.daemon = True
+    thread.start()
+
+def runSearch(ui, text):
+    text = unicode(text).encode("utf-8").strip()
+    ui.searchResultsTreeWidget.clear()
+    if not text:
+        ui.searchResultsTreeWidget.hide()
+        return
+    ui.searchResultsTreeWidget.addTopLevelItems(convertToSearchResultItems(searchProject(text)))
+    ui.searchResultsTreeWidget.show()
+
+def searchResultActivated(ui, item):
+    revealProjectPath(ui, os.path.join(getProjectDir(), str(item.text(1)), str(item.text(0))))
+
+def revealProjectPath(ui, path):
+    """Loads and expands the project tree down to path and selects its item"""
+    item = None
+    for name in os.path.relpath(path, getProjectDir()).split(os.sep):
+        if item is None:
+            children = [ui.projectFilesTreeWidget.topLevelItem(i) for i in range(ui.projectFilesTreeWidget.topLevelItemCount())]
+        else:
+            loadProjectTreeChildren(ui, item)
+            item.setExpanded(True)
+            children = [item.child(i) for i in range(item.childCount())]
+        matches = [child for child in children if str(child.text(0)) == name]
+        if not matches:
+            ui.statusbar.showMessage("Not in the project any more: " + path)
+            return
+        item = matches[0]
+    ui.projectFilesTreeWidget.clearSelection()
+    ui.projectFilesTreeWidget.setCurrentItem(item)
+    item.setSelected(True)
+    ui.projectFilesTreeWidget.scrollToItem(item)
+
+#>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Background Jobs
+
+# (jobs tree item, job) for every job that has not finished yet
+_runningJobs = []
+# Paths that a running job is working on
+_busyPaths = set()
+
+def startJob(ui, title, func, args, busyPath, onFinished, withProgress=True):
+    """
+    Runs func(*args) on the job thread pool and shows it in the jobs panel.
+    onFinished(result) is called in the GUI thread if func succeeds.
+    Only one job at a time may work on busyPath, which may also be a list of paths.
+    """
+    busyPaths = busyPath if isinstance(busyPath, list) else [busyPath]
+    for path in busyPaths:
+        if path in _busyPaths:
+            ui.errorMessage.showMessage(os.path.basename(path) + " is busy with another job")
+            return
+    job = jobs.Job(title, func, args, withProgress)
+    item = QTreeWidgetItem(ui.jobsTreeWidget)
+    item.setText(0, title)
+    item.setText(2, "Queued")
+    progressBar = QProgressBar()
+    progressBar.setRange(0, 100)
+    progressBar.setValue(0)
+    ui.jobsTreeWidget.setItemWidget(item, 1, progressBar)
+    
+    def done(status):
+        item.setText(2, status)
+        _busyPaths.difference_update(busyPaths)
+        for entry in _runningJobs:
+            if entry[1] is job:
+                _runningJobs.remove(entry)
+                break
+        enableJobComponents(ui)
+        enableComponents(ui)
+    def finished(result):
+        progressBar.setValue(100)
+        done("Done")
+        onFinished(result)
+    def failed(message):
+        done("Failed")
+        ui.errorMessage.showMessage(title + " failed: " + str(message))
+    
+    QObject.connect(job.signals, SIGNAL("started()"), lambda: item.setText(2, "Running"))
+    QObject.connect(job.signals, SIGNAL("progress(int)"), progressBar.setValue)
+    QObject.connect(job.signals, SIGNAL("message(QString)"), lambda message: item.setText(2, message))
+    QObject.connect(job.signals, SIGNAL("finished(PyQt_PyObject)"), finished)
+    QObject.connect(job.signals, SIGNAL("failed(QString)"), failed)
+    QObject.connect(job.signals, SIGNAL("cancelled()"), lambda: done("Cancelled"))
+    
+    _runningJobs.append((item, job))
+    _busyPaths.update(busyPaths)
+    jobs.threadPool().start(job)
+
+def cancelSelectedJobs(ui):
+    for item, job in _runningJobs:
+        if item.isSelected() and not job.isCancelled():
+            job.cancel()
+            item.setText(2, "Cancelling...")
+    enableJobComponents(ui)
+
+def enableJobComponents(ui):
+    cancellable = False
+    for item, job in _runningJobs:
+        if item.isSelected() and not job.isCancelled():
+            cancellable = True
+    ui.cancelJobButton.setEnabled(cancellable)
+
+def jobSelectionChanged(ui):
+    enableJobComponents(ui)
 
 #>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Model to GUI Conversions
 
@@ -176,6 +350,38 @@ def convertToFileSelectionDialogItems(files):
         treeItems.append(item)
     return treeItems
 
+def convertToSearchResultItems(paths):
+    treeItems = []
+    for path in paths:
+        item = QTreeWidgetItem()
+        item.setText(0, os.path.basename(path))
+        item.setText(1, os.path.dirname(os.path.relpath(path, getProjectDir())))
+        treeItems.append(item)
+    return treeItems
+
+def convertToHistoryItems(history):
+    treeItems = []
+    for h in reversed(history):
+        item = QTreeWidgetItem()
+        item.setText(0, str(h["version"]))
+        item.setText(1, h["user"] or "")
+        item.setText(2, h["time"] or "")
+        item.setText(3, str(h["files"]))
+        item.setText(4, "%.1f MB" % (h["bytes"] / 1048576.0))
+        item.setText(5, h["state"])
+        treeItems.append(item)
+    return treeItems
+
+def convertToChangeItems(diff):
+    treeItems = []
+    for kind, label in [("added", "Added"), ("removed", "Removed"), ("changed", "Changed")]:
+        for path in diff[kind]:
+            item = QTreeWidgetItem()
+            item.setText(0, label)
+            item.setText(1, path)
+            treeItems.append(item)
+    return treeItems
+
 def convertToLocalTreeItems(files):
     treeItems = []
     for f in files:
@@ -210,19 +416,139 @@ def setProjectTreeVersionedItemInfo(pTreeItem, curDir):
 
 def populateProjectTree(ui):
     ui.projectFilesTreeWidget.clear()
-    recurseProjectFiles(ui, ui.projectFilesTreeWidget, getProjectDir())
+    addProjectTreeChildren(ui.projectFilesTreeWidget, getProjectDir())
     ui.projectFilesTreeWidget.sortItems(0,0)
 
-def recurseProjectFiles(ui, parent, curDir):
-    if isVersionedFolder(curDir):
-        setProjectTreeVersionedItemInfo(parent, curDir)
+class _PlaceholderItem(QTreeWidgetItem):
+    """Stands in for the children of a folder that has not been scanned yet"""
+
+def isUnexpandedItem(item):
+    return item.childCount() == 1 and isinstance(item.child(0), _PlaceholderItem)
+
+def addProjectTreeChildren(parent, curDir):
+    """
+    Adds one level of tree items below parent. Folders that are not versioned
+    get a placeholder child so they can be expanded; they are scanned by
+    loadProjectTreeChildren() when that happens.
+    """
+    watchPath(curDir)
+    for f, isDir in getProjectChildren(curDir):
+        addProjectTreeItem(parent, f, isDir)
+
+def addProjectTreeItem(parent, f, isDir):
+    item = QTreeWidgetItem(parent)
+    item.setText(0, os.path.basename(f))
+    if isDir:
+        if isVersionedFolder(f):
+            setProjectTreeVersionedItemInfo(item, f)
+            # .nodeInfo changes and inst/stable relinks
+            watchPath(f)
+            watchPath(os.path.join(f, "inst"))
+        else:
+            _PlaceholderItem(item).setText(0, "Loading...")
+    return item
+
+def loadProjectTreeChildren(ui, item):
+    if isUnexpandedItem(item):
+        item.takeChild(0)
+        addProjectTreeChildren(item, ui.getTreeItemPath(item, getProjectDir()))
+        item.sortChildren(0,0)
+
+def findProjectTreeItem(ui, path):
+    """@returns: The project tree item for path, or None if it has not been loaded"""
+    item = None
+    for name in os.path.relpath(path, getProjectDir()).split(os.sep):
+        if item is None:
+            children = [ui.projectFilesTreeWidget.topLevelItem(i) for i in range(ui.projectFilesTreeWidget.topLevelItemCount())]
+        else:
+            children = [item.child(i) for i in range(item.childCount())]
+        item = None
+        for child in children:
+            if str(child.text(0)) == name and not isinstance(child, _PlaceholderItem):
+                item = child
+                break
+        if item is None:
+            return None
+    return item
+
+def applyChanges(ui, changes):
+    """
+    Updates only the tree items an operation changed.
+    @precondition: changes is a utilities.Changes
+    """
+    for kind, path in changes:
+        if kind == LOCAL_ADDED:
+            addLocalTreeItem(ui, path)
+        elif kind == LOCAL_REMOVED:
+            removeLocalTreeItem(ui, path)
+        elif kind == LOCAL_CHANGED:
+            # The item is made again with the new check out time
+            addLocalTreeItem(ui, path)
+        elif kind == PROJECT_ADDED:
+            addProjectTreeChild(ui, path)
+        elif kind == PROJECT_REMOVED:
+            item = findProjectTreeItem(ui, path)
+            if item is not None:
+                ui.removeTreeItem(item)
+        elif kind == PROJECT_RENAMED:
+            item = findProjectTreeItem(ui, path[0])
+            if item is not None:
+                item.setText(0, os.path.basename(path[1]))
+                sortProjectTreeChildren(ui, item.parent() if item.parent() is not None else ui.projectFilesTreeWidget)
+        elif kind == PROJECT_CHANGED:
+            updateProjectTreeItem(ui, path)
+    if changes.summary:
+        ui.statusbar.showMessage(changes.summary)
+    enableComponents(ui)
+
+def addProjectTreeChild(ui, path):
+    """Adds the item for a new folder if its parent has been loaded and does not show it yet"""
+    parent, items = loadedProjectTreeChildren(ui, os.path.dirname(path))
+    if parent is None or os.path.basename(path) in [str(item.text(0)) for item in items]:
         return
-    if os.path.isdir(curDir):
-        files = glob.glob(os.path.join(curDir, '*'))
-        for f in files:
-            item = QTreeWidgetItem(parent)
-            item.setText(0, os.path.basename(f))
-            recurseProjectFiles(ui, item, f)
+    addProjectTreeItem(parent, path, os.path.isdir(path))
+    sortProjectTreeChildren(ui, parent)
+
+def loadedProjectTreeChildren(ui, dirPath):
+    """
+    @returns: (parent, child items) for dirPath, where parent is the tree widget for
+        the project directory, or (None, None) if the children of dirPath are not loaded
+    """
+    if os.path.abspath(dirPath) == os.path.abspath(getProjectDir()):
+        parent = ui.projectFilesTreeWidget
+        return parent, [parent.topLevelItem(i) for i in range(parent.topLevelItemCount())]
+    parent = findProjectTreeItem(ui, dirPath)
+    if parent is None or isUnexpandedItem(parent):
+        return None, None
+    return parent, [parent.child(i) for i in range(parent.childCount())]
+
+def sortProjectTreeChildren(ui, parent):
+    if parent is ui.projectFilesTreeWidget:
+        parent.sortItems(0,0)
+    else:
+        parent.sortChildren(0,0)
+
+def updateProjectTreeItem(ui, path):
+    item = findProjectTreeItem(ui, path)
+    if item is not None:
+        setProjectTreeVersionedItemInfo(item, path)
+
+def findLocalTreeItem(ui, path):
+    name = os.path.basename(path)
+    for i in range(ui.localFilesTreeWidget.topLevelItemCount()):
+        if str(ui.localFilesTreeWidget.topLevelItem(i).text(0)) == name:
+            return ui.localFilesTreeWidget.topLevelItem(i)
+    return None
+
+def addLocalTreeItem(ui, path):
+    removeLocalTreeItem(ui, path)
+    ui.localFilesTreeWidget.addTopLevelItems(convertToLocalTreeItems([path]))
+    ui.localFilesTreeWidget.sortItems(1,0)
+
+def removeLocalTreeItem(ui, path):
+    item = findLocalTreeItem(ui, path)
+    if item is not None:
+        ui.removeTreeItem(item)
 
 def populateLocalTree(ui):
     ui.localFilesTreeWidget.clear()
@@ -231,17 +557,180 @@ def populateLocalTree(ui):
     ui.localFilesTreeWidget.addTopLevelItems(items)
     ui.localFilesTreeWidget.sortItems(1,0)
 
+#>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Live Updates
+
+# Set [Watch] mode in .projectInfo to inotify, poll, off or auto (the default),
+# which polls when the project or user directory is on NFS.
+# [Watch] pollInterval is in seconds.
+POLL_INTERVAL = 5
+# Events are collected for this long and then applied together
+BATCH_DELAY_MS = 300
+
+_watcher = None
+# Polls the folders inotify has no watches left for, see watchPath()
+_fallbackWatcher = None
+_watchTimers = []
+_pendingEvents = set()
+
+def startWatching(ui):
+    """Watches the user directory and the loaded part of the project tree"""
+    global _watcher
+    stopWatching()
+    mode = getProjectSetting("Watch", "mode", "auto")
+    if mode == "off":
+        return
+    _watcher = watcher.createWatcher([getProjectDir(), getUserDir()], mode)
+    
+    batchTimer = QTimer(ui.projectFilesTreeWidget)
+    batchTimer.setSingleShot(True)
+    batchTimer.setInterval(BATCH_DELAY_MS)
+    QObject.connect(batchTimer, SIGNAL("timeout()"), lambda: applyWatchEvents(ui))
+    _watchTimers.append(batchTimer)
+    
+    def readEvents(source):
+        if source is not None:
+            _pendingEvents.update(source.readEvents())
+            if _pendingEvents and not batchTimer.isActive():
+                batchTimer.start()
+    def polledWatcher():
+        if _watcher is not None and _watcher.fileno() is None:
+            return _watcher
+        return _fallbackWatcher
+    if _watcher.fileno() is not None:
+        notifier = QSocketNotifier(_watcher.fileno(), QSocketNotifier.Read, ui.projectFilesTreeWidget)
+        QObject.connect(notifier, SIGNAL("activated(int)"), lambda fd: readEvents(_watcher))
+        _watchTimers.append(notifier)
+    pollTimer = QTimer(ui.projectFilesTreeWidget)
+    pollTimer.setInterval(int(float(getProjectSetting("Watch", "pollInterval", POLL_INTERVAL)) * 1000))
+    QObject.connect(pollTimer, SIGNAL("timeout()"), lambda: readEvents(polledWatcher()))
+    pollTimer.start()
+    _watchTimers.append(pollTimer)
+    
+    watchPath(getUserDir())
+    watchPath(getProjectDir())
+    for i in range(ui.projectFilesTreeWidget.topLevelItemCount()):
+        watchLoadedItems(ui, ui.projectFilesTreeWidget.topLevelItem(i))
+
+def stopWatching():
+    global _watcher, _fallbackWatcher
+    for obj in _watchTimers:
+        if isinstance(obj, QSocketNotifier):
+            obj.setEnabled(False)
+        else:
+            obj.stop()
+        obj.deleteLater()
+    del _watchTimers[:]
+    _pendingEvents.clear()
+    if _watcher is not None:
+        _watcher.close()
+        _watcher = None
+    if _fallbackWatcher is not None:
+        _fallbackWatcher.close()
+        _fallbackWatcher = None
+
+def watchPath(path):
+    """
+    Watches path for changes. Once inotify runs out of watches
+    (fs.inotify.max_user_watches) further folders are polled instead; a
+    folder that can not be watched at all is skipped.
+    """
+    global _fallbackWatcher
+    if _watcher is None:
+        return
+    try:
+        _watcher.watch(path)
+    except OSError, e:
+        if e.errno != errno.ENOSPC:
+            print "Not watching " + path + ": " + str(e)
+            return
+        if _fallbackWatcher is None:
+            print "Out of inotify watches, polling the folders loaded from now on"
+            _fallbackWatcher = watcher.PollingWatcher()
+        _fallbackWatcher.watch(path)
+
+def watchLoadedItems(ui, item):
+    path = ui.getTreeItemPath(item, getProjectDir())
+    if isVersionedFolder(path):
+        watchPath(path)
+        watchPath(os.path.join(path, "inst"))
+    elif not isUnexpandedItem(item):
+        watchPath(path)
+        for i in range(item.childCount()):
+            watchLoadedItems(ui, item.child(i))
+
+def applyWatchEvents(ui):
+    """Updates the tree items affected by the events collected since the last call"""
+    events = list(_pendingEvents)
+    _pendingEvents.clear()
+    if (None, None) in events:
+        # Events were lost
+        populateLocalTree(ui)
+        populateProjectTree(ui)
+        enableComponents(ui)
+        startSearchIndex(True)
+        return
+    userDir = os.path.abspath(getUserDir())
+    projectDir = os.path.abspath(getProjectDir())
+    changedVersioned = set()
+    changedFolders = set()
+    for dirPath, name in events:
+        dirPath = os.path.abspath(dirPath)
+        if dirPath == userDir:
+            if not name.startswith("."):
+                if os.path.exists(os.path.join(dirPath, name)):
+                    if findLocalTreeItem(ui, name) is None:
+                        addLocalTreeItem(ui, os.path.join(dirPath, name))
+                else:
+                    removeLocalTreeItem(ui, name)
+        elif dirPath == projectDir or dirPath.startswith(projectDir + os.sep):
+            if name == ".nodeInfo":
+                changedVersioned.add(dirPath)
+            elif name == "stable" and os.path.basename(dirPath) == "inst":
+                changedVersioned.add(os.path.dirname(dirPath))
+            elif not name.startswith(".") and not isVersionedFolder(dirPath):
+                changedFolders.add(dirPath)
+    for path in changedFolders:
+        # Made outside utilities, so the indexes do not know about it yet
+        refreshIndexes(path)
+        syncProjectTreeChildren(ui, path)
+    for path in changedVersioned:
+        refreshIndexes(path)
+        if isVersionedFolder(path):
+            updateProjectTreeItem(ui, path)
+    enableComponents(ui)
+
+def syncProjectTreeChildren(ui, dirPath):
+    """Adds and removes tree items so the loaded children of dirPath match the project"""
+    parent, items = loadedProjectTreeChildren(ui, dirPath)
+    if parent is None:
+        # Scanned when it is expanded
+        return
+    existing = dict((str(item.text(0)), item) for item in items)
+    children = getProjectChildren(dirPath) if os.path.isdir(dirPath) else []
+    names = set()
+    for f, isDir in children:
+        names.add(os.path.basename(f))
+        if os.path.basename(f) not in existing:
+            addProjectTreeItem(parent, f, isDir)
+    for name, item in existing.items():
+        if name not in names:
+            ui.removeTreeItem(item)
+    sortProjectTreeChildren(ui, parent)
+
 #>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Other Helper Functions
 
 def enableComponents(ui):
     # Project Tab Open
     if ui.fileTabs.currentIndex():
         ui.actionCheckin.setEnabled(False)
+        ui.actionUpdate.setEnabled(False)
         ui.actionOpen_File.setEnabled(False)
         
         ui.actionNew.setEnabled(True)
         ui.actionCheckout.setEnabled(False)
         ui.actionInstall.setEnabled(False)
+        ui.actionBatchInstall.setEnabled(False)
+        ui.actionHistory.setEnabled(False)
         ui.actionCache_to_Alembic.setEnabled(False)
         ui.actionRename.setEnabled(False)
         ui.actionRemove.setEnabled(False)
@@ -255,11 +744,16 @@ def enableComponents(ui):
                 ui.actionNew.setEnabled(False)
                 ui.actionCheckout.setEnabled(True)
                 ui.actionInstall.setEnabled(True)
+                ui.actionHistory.setEnabled(True)
                 ui.actionCache_to_Alembic.setEnabled(True)
-            if canRename(curItemPath):
-                ui.actionRename.setEnabled(True)
-            if canRemove(curItemPath):
-                ui.actionRemove.setEnabled(True)
+            # canRemove() is the same check as canRename()
+            movable = canRename(curItemPath)
+            ui.actionRename.setEnabled(movable)
+            ui.actionRemove.setEnabled(movable)
+        for item in ui.projectFilesTreeWidget.selectedItems():
+            if isVersionedFolder(ui.getTreeItemPath(item, getProjectDir())):
+                ui.actionBatchInstall.setEnabled(True)
+                break
     # Local Tab Open
     else:
         ui.actionNew.setEnabled(False)
@@ -267,13 +761,17 @@ def enableComponents(ui):
         ui.actionRemove.setEnabled(False)
         
         curItem = ui.localFilesTreeWidget.currentItem()
+        ui.actionUpdate.setEnabled(False)
         ui.actionCheckout.setEnabled(False)
         ui.actionInstall.setEnabled(False)
+        ui.actionBatchInstall.setEnabled(False)
+        ui.actionHistory.setEnabled(False)
         ui.actionCache_to_Alembic.setEnabled(False)
         if not type(curItem) == types.NoneType and curItem.isSelected():
             if not str(curItem.text(1)) == "Not a versioned Folder":
                 ui.actionCheckin.setEnabled(True)
                 ui.actionOpen_File.setEnabled(True)
+                ui.actionUpdate.setEnabled(canUpdate(ui.getTreeItemPath(curItem, getUserDir())))
         else:
             ui.actionCheckin.setEnabled(False)
             ui.actionOpen_File.setEnabled(False)
@@ -287,6 +785,9 @@ def localItemSelectionChanged(ui):
 def projectItemSelectionChanged(ui):
     enableComponents(ui)
 
+def projectItemExpanded(ui, item):
+    loadProjectTreeChildren(ui, item)
+
 def localFilesContextMenu(ui, point):
     enableComponents(ui)
     ui.localPopMenu.popup(ui.projectFilesTreeWidget.mapToGlobal(point))
@@ -300,3 +801,5 @@ def fileDialogAccept():
 def fileDialogRejected():
     print "Rejected"
 
+# The handlers are timed while tracing is enabled, see tracing.py
+tracing.instrument(globals(), lambda name: name.startswith("run") or name.startswith("populate"), "controller.")
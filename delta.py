@@ -0,0 +1,225 @@
+"""
+rsync style binary deltas.
+computeDelta() describes a target file as blocks copied from a base file plus
+literal bytes; applyDelta() rebuilds the target from the base and the delta.
+Checkin uses this to store older versions of large files as reverse deltas
+against the next version.
+
+Delta file layout (all integers big endian):
+	MAGIC, target size (Q), block size (I), target sha1 (20 bytes)
+	then a sequence of operations:
+		'C' offset (Q) length (Q)    copy length bytes from offset in the base
+		'L' length (I) bytes         literal bytes
+		'E'                          end
+"""
+
+import os, struct, zlib, hashlib
+
+MAGIC = "CHDELTA1"
+DEFAULT_BLOCK_SIZE = 64 * 1024
+_ADLER_MOD = 65521
+_READ_SIZE = 4 * 1024 * 1024
+# Pending literal bytes are written out once there are this many
+_MAX_PENDING_LITERAL = 1024 * 1024
+
+class DeltaTooLarge(Exception):
+	"""Raised by computeDelta when the files differ too much for a delta to pay off"""
+
+def _weak(data):
+	return zlib.adler32(data) & 0xffffffff
+
+def _signatures(basePath, blockSize):
+	"""
+	@returns: A dict mapping the adler32 of every whole block in basePath to
+		a list of (md5 digest, block index) pairs
+	"""
+	signatures = {}
+	f = open(basePath, 'rb')
+	try:
+		index = 0
+		while True:
+			block = f.read(blockSize)
+			if len(block) < blockSize:
+				break
+			signatures.setdefault(_weak(block), []).append((hashlib.md5(block).digest(), index))
+			index += 1
+	finally:
+		f.close()
+	return signatures
+
+class _DeltaWriter:
+	def __init__(self, out, maxLiteral):
+		self._out = out
+		self._maxLiteral = maxLiteral
+		self._copyOffset = None
+		self._copyLength = 0
+		self.literalBytes = 0
+
+	def _flushCopy(self):
+		if self._copyOffset is not None:
+			self._out.write("C" + struct.pack(">QQ", self._copyOffset, self._copyLength))
+			self._copyOffset = None
+
+	def copy(self, offset, length):
+		if self._copyOffset is not None and self._copyOffset + self._copyLength == offset:
+			self._copyLength += length
+			return
+		self._flushCopy()
+		self._copyOffset = offset
+		self._copyLength = length
+
+	def literal(self, data):
+		if not data:
+			return
+		self.literalBytes += len(data)
+		if self._maxLiteral is not None and self.literalBytes > self._maxLiteral:
+			raise DeltaTooLarge("More than " + str(self._maxLiteral) + " literal bytes")
+		self._flushCopy()
+		self._out.write("L" + struct.pack(">I", len(data)))
+		self._out.write(str(data))
+
+	def close(self):
+		self._flushCopy()
+		self._out.write("E")
+
+def computeDelta(basePath, targetPath, deltaPath, blockSize=DEFAULT_BLOCK_SIZE, maxLiteral=None):
+	"""
+	Writes a delta to deltaPath that rebuilds targetPath from basePath.
+	Matching blocks are found at any byte offset in the target with a rolling
+	adler32 checksum confirmed by md5; everything else is stored literally.
+	@precondition: deltaPath does not exist
+	@postcondition: if the delta would hold more than maxLiteral literal bytes
+		DeltaTooLarge is raised and deltaPath is removed
+	@returns: The size of the delta file
+	"""
+	signatures = _signatures(basePath, blockSize)
+	targetSha = hashlib.sha1()
+	target = open(targetPath, 'rb')
+	out = open(deltaPath, 'wb')
+	try:
+		out.write(MAGIC)
+		out.write(struct.pack(">QI", os.fstat(target.fileno()).st_size, blockSize))
+		out.write("\0" * 20) # target sha1, filled in at the end
+		writer = _DeltaWriter(out, maxLiteral)
+
+		buf = bytearray()
+		pos = 0 # start of the window in buf
+		literalStart = 0 # start of the pending literal bytes in buf
+		weak = None
+		eof = False
+		while True:
+			if not eof and len(buf) - pos <= blockSize:
+				# Keep only the pending literal and the window, then read more
+				if pos - literalStart > _MAX_PENDING_LITERAL:
+					writer.literal(buf[literalStart:pos])
+					literalStart = pos
+				del buf[:literalStart]
+				pos -= literalStart
+				literalStart = 0
+				data = target.read(_READ_SIZE)
+				targetSha.update(data)
+				buf.extend(data)
+				eof = not data
+				continue
+			if len(buf) - pos < blockSize:
+				break
+			if weak is None:
+				weak = _weak(buffer(buf, pos, blockSize))
+			match = None
+			candidates = signatures.get(weak)
+			if candidates:
+				strong = hashlib.md5(buffer(buf, pos, blockSize)).digest()
+				for digest, index in candidates:
+					if digest == strong:
+						match = index
+						break
+			if match is not None:
+				writer.literal(buf[literalStart:pos])
+				writer.copy(match * blockSize, blockSize)
+				pos += blockSize
+				literalStart = pos
+				weak = None
+			elif pos + blockSize < len(buf):
+				# Roll the window one byte forward
+				old = buf[pos]
+				a = ((weak & 0xffff) - old + buf[pos + blockSize]) % _ADLER_MOD
+				b = ((weak >> 16) - blockSize * old + a - 1) % _ADLER_MOD
+				weak = (b << 16) | a
+				pos += 1
+			else:
+				pos += 1
+				weak = None
+		writer.literal(buf[literalStart:])
+		writer.close()
+		out.seek(len(MAGIC) + struct.calcsize(">QI"))
+		out.write(targetSha.digest())
+	except BaseException:
+		out.close()
+		target.close()
+		os.remove(deltaPath)
+		raise
+	out.close()
+	target.close()
+	return os.path.getsize(deltaPath)
+
+def _readExactly(f, size):
+	data = f.read(size)
+	if len(data) != size:
+		raise Exception("Truncated delta file " + f.name)
+	return data
+
+def targetSize(deltaPath):
+	"""
+	@returns: The size of the file deltaPath rebuilds, read from its header
+	"""
+	delta = open(deltaPath, 'rb')
+	try:
+		if _readExactly(delta, len(MAGIC)) != MAGIC:
+			raise Exception("Not a delta file " + deltaPath)
+		return struct.unpack(">Q", _readExactly(delta, struct.calcsize(">Q")))[0]
+	finally:
+		delta.close()
+
+def applyDelta(basePath, deltaPath, outPath):
+	"""
+	Rebuilds the target of deltaPath from basePath into outPath.
+	@postcondition: outPath is removed again if the delta is corrupt or does not fit basePath
+	"""
+	base = open(basePath, 'rb')
+	delta = open(deltaPath, 'rb')
+	out = open(outPath, 'wb')
+	try:
+		if _readExactly(delta, len(MAGIC)) != MAGIC:
+			raise Exception("Not a delta file " + deltaPath)
+		size, blockSize = struct.unpack(">QI", _readExactly(delta, struct.calcsize(">QI")))
+		expectedSha = _readExactly(delta, 20)
+		sha = hashlib.sha1()
+		while True:
+			op = _readExactly(delta, 1)
+			if op == "E":
+				break
+			elif op == "C":
+				offset, length = struct.unpack(">QQ", _readExactly(delta, 16))
+				base.seek(offset)
+				while length > 0:
+					data = _readExactly(base, min(length, _READ_SIZE))
+					sha.update(data)
+					out.write(data)
+					length -= len(data)
+			elif op == "L":
+				length = struct.unpack(">I", _readExactly(delta, 4))[0]
+				data = _readExactly(delta, length)
+				sha.update(data)
+				out.write(data)
+			else:
+				raise Exception("Corrupt delta file " + deltaPath)
+		if out.tell() != size or sha.digest() != expectedSha:
+			raise Exception("Delta " + deltaPath + " does not match " + basePath)
+	except BaseException:
+		out.close()
+		os.remove(outPath)
+		raise
+	finally:
+		base.close()
+		delta.close()
+	out.close()
@@ -3,6 +3,7 @@
 @author: Brian Kingery
 Install script for Houdnini files.
 This script should be called directly using Houdini's python at $HFS/python/bin/python
+With --serve it stays running and installs files requested on stdin (see installWorker.py)
 """
 
 import sys, os
@@ -71,12 +72,17 @@ def lockFileNodes(srcFilePath, newInstFilePath):
     
     hou.hipFile.save(newInstFilePath)
 
+def clearScene():
+    hou.hipFile.clear(suppress_save_prompt=True)
 
 # >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
 enableHouModule()
 import hou
 
-if len(sys.argv) == 3 and os.path.exists(str(sys.argv[1])) and not os.path.exists(str(sys.argv[2])):
+if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+    import installWorker
+    installWorker.serve(lockFileNodes, clearScene)
+elif len(sys.argv) == 3 and os.path.exists(str(sys.argv[1])) and not os.path.exists(str(sys.argv[2])):
     lockFileNodes(str(sys.argv[1]), str(sys.argv[2]))
 else:
     raise Exception("Can not install file: File does not exist.")
@@ -3,6 +3,7 @@
 @author: Brian Kingery
 Install script for Maya files.
 This script should be called directly using Maya's mayapy at $MAYA_LOCATION/bin/mayapy
+With --serve it stays running and installs files requested on stdin (see installWorker.py)
 """
 
 import sys, os
@@ -32,8 +33,14 @@ def importObjectsFromReference(srcFilePath, newInstFilePath):
     mc.file(rename=newInstFilePath)
     mc.file(save=True, force=True)
 
+def newScene():
+    mc.file(new=True, force=True)
+
 # >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
-if len(sys.argv) == 3 and os.path.exists(str(sys.argv[1])) and not os.path.exists(str(sys.argv[2])):
+if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+    import installWorker
+    installWorker.serve(importObjectsFromReference, newScene)
+elif len(sys.argv) == 3 and os.path.exists(str(sys.argv[1])) and not os.path.exists(str(sys.argv[2])):
     importObjectsFromReference(str(sys.argv[1]), str(sys.argv[2]))
 else:
     raise Exception("Can not install file: File does not exist.")
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+A persistent install queue kept in the project directory. Installs wait in
+the queue until a scheduler in any asset manager session (or on a farm node)
+picks them up, so pending installs survive a crashed session and the number
+of Maya/Houdini installs running at once is capped for the whole project.
+
+Every job is a small ini file that lives in one of
+	<project>/.installQueue/pending
+	<project>/.installQueue/running
+	<project>/.installQueue/done
+	<project>/.installQueue/failed
+and moves between them with os.rename. Pending job files are named so that
+sorting them gives the order they run in: highest priority first, then oldest.
+
+Run a scheduler without the GUI with:
+	python installQueue.py /path/to/project
+"""
+
+import os, time, socket, fcntl, errno, threading, tempfile
+from ConfigParser import ConfigParser
+
+QUEUE_DIR = ".installQueue"
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATES = [PENDING, RUNNING, DONE, FAILED]
+
+# Higher priorities run first, e.g. HERO_PRIORITY for hero assets
+MAX_PRIORITY = 999
+DEFAULT_PRIORITY = 500
+HERO_PRIORITY = 900
+MAX_ATTEMPTS = 3
+# Seconds a failed job waits before it is tried again, times the attempt number
+RETRY_DELAY = 60
+# A running job whose file was not touched for this many seconds belongs to a
+# session that died and is put back in the queue
+STALE_AFTER = 600
+HEARTBEAT = 30
+# Finished jobs are removed after a week
+KEEP_FINISHED = 7 * 24 * 3600
+# How many installs of each kind may run at once in the whole project
+DEFAULT_LIMITS = {"maya": 1, "houdini": 1, "copy": 4}
+
+_OPTIONS = ["vdirpath", "srcfilepath", "setstable", "dcc", "priority", "attempts", "maxattempts",
+	"notbefore", "addedby", "addedtime", "owner", "result", "error"]
+
+def queueDir(projectDir):
+	return os.path.join(projectDir, QUEUE_DIR)
+
+class InstallQueue:
+	"""
+	The install queue of one project. Jobs are dicts keyed by _OPTIONS plus
+	"id" (the job file name) and "state". vdirpath and srcfilepath are
+	absolute in the dicts and stored relative to the project.
+	"""
+
+	def __init__(self, projectDir):
+		self._project_dir = os.path.abspath(projectDir)
+		self._dir = queueDir(self._project_dir)
+
+	def _path(self, state, jobId):
+		return os.path.join(self._dir, state, jobId)
+
+	def _ensureDirs(self):
+		for state in STATES:
+			d = os.path.join(self._dir, state)
+			if not os.path.isdir(d):
+				try:
+					os.makedirs(d)
+				except OSError, e:
+					if e.errno != errno.EEXIST:
+						raise
+
+	def _read(self, state, jobId):
+		cp = ConfigParser()
+		if not cp.read(self._path(state, jobId)) or not cp.has_section("Job"):
+			return None
+		job = dict(cp.items("Job"))
+		for option in ["priority", "attempts", "maxattempts"]:
+			job[option] = int(job[option])
+		job["notbefore"] = float(job["notbefore"])
+		job["setstable"] = job["setstable"] == "True"
+		job["vdirpath"] = os.path.join(self._project_dir, job["vdirpath"])
+		job["srcfilepath"] = os.path.join(self._project_dir, job["srcfilepath"])
+		job["id"] = jobId
+		job["state"] = state
+		return job
+
+	def _write(self, state, job):
+		"""Replaces the job file in one step so readers never see half a job"""
+		cp = ConfigParser()
+		cp.add_section("Job")
+		for option in _OPTIONS:
+			value = job.get(option)
+			if option in ["vdirpath", "srcfilepath"]:
+				value = os.path.relpath(value, self._project_dir)
+			cp.set("Job", option, "" if value is None else str(value))
+		fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.join(self._dir, state))
+		f = os.fdopen(fd, "w")
+		try:
+			cp.write(f)
+		finally:
+			f.close()
+		os.rename(tmp, self._path(state, job["id"]))
+
+	def _move(self, job, state):
+		"""@returns: False if someone else moved the job first"""
+		try:
+			os.rename(self._path(job["state"], job["id"]), self._path(state, job["id"]))
+		except OSError, e:
+			if e.errno == errno.ENOENT:
+				return False
+			raise
+		job["state"] = state
+		return True
+
+	def _lock(self):
+		"""@returns: An open file holding the queue lock; close it to unlock"""
+		f = open(os.path.join(self._dir, ".lock"), "a")
+		fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+		return f
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Queries
+	def jobs(self, state):
+		"""@returns: The jobs in state, in the order they run"""
+		d = os.path.join(self._dir, state)
+		if not os.path.isdir(d):
+			return []
+		result = []
+		for jobId in sorted(os.listdir(d)):
+			if jobId.startswith("."):
+				continue
+			job = self._read(state, jobId)
+			if job is not None:
+				result.append(job)
+		return result
+
+	def getJob(self, jobId):
+		"""@returns: The job with jobId, or None if it is not in the queue"""
+		# Look twice in case the job moved to a state that was already checked
+		for attempt in range(2):
+			for state in STATES:
+				if os.path.exists(self._path(state, jobId)):
+					job = self._read(state, jobId)
+					if job is not None:
+						return job
+		return None
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Updates
+	def add(self, vDirPath, srcFilePath, setStable, dcc, priority=DEFAULT_PRIORITY, maxAttempts=MAX_ATTEMPTS, addedBy=None):
+		"""
+		@precondition: 0 <= priority <= MAX_PRIORITY
+		@returns: The id of the new job
+		"""
+		self._ensureDirs()
+		now = time.time()
+		jobId = "%03d-%017.6f-%s-%d.job" % (MAX_PRIORITY - priority, now, socket.gethostname(), os.getpid())
+		self._write(PENDING, {"id": jobId, "vdirpath": vDirPath, "srcfilepath": srcFilePath,
+			"setstable": bool(setStable), "dcc": dcc, "priority": priority, "attempts": 0,
+			"maxattempts": maxAttempts, "notbefore": 0, "addedby": addedBy, "addedtime": now})
+		return jobId
+
+	def remove(self, jobId):
+		"""
+		Takes a job out of the queue if it has not started yet.
+		@returns: True if the job was removed
+		"""
+		try:
+			os.remove(self._path(PENDING, jobId))
+			return True
+		except OSError, e:
+			if e.errno == errno.ENOENT:
+				return False
+			raise
+
+	def claim(self, limits, owner):
+		"""
+		Moves the first pending job whose kind of install is below its limit
+		to running.
+		@precondition: limits maps dcc names to the number of installs that may run at once
+		@returns: The claimed job, or None if there is nothing to run
+		"""
+		if not os.path.isdir(self._dir):
+			return None
+		lock = self._lock()
+		try:
+			running = {}
+			for job in self.jobs(RUNNING):
+				running[job["dcc"]] = running.get(job["dcc"], 0) + 1
+			now = time.time()
+			for job in self.jobs(PENDING):
+				if job["notbefore"] > now or running.get(job["dcc"], 0) >= limits.get(job["dcc"], 1):
+					continue
+				if self._move(job, RUNNING):
+					job["owner"] = owner
+					self._write(RUNNING, job)
+					return job
+			return None
+		finally:
+			lock.close()
+
+	def heartbeat(self, job):
+		"""Marks a running job as still alive, see STALE_AFTER"""
+		try:
+			os.utime(self._path(RUNNING, job["id"]), None)
+		except OSError:
+			pass
+
+	def finish(self, job, result):
+		job["result"] = result
+		job["error"] = None
+		self._write(RUNNING, job)
+		self._move(job, DONE)
+
+	def fail(self, job, error):
+		"""Puts the job back in the queue to be retried later, or moves it to failed"""
+		job["attempts"] += 1
+		job["error"] = error
+		job["owner"] = None
+		if job["attempts"] < job["maxattempts"]:
+			job["notbefore"] = time.time() + RETRY_DELAY * job["attempts"]
+			self._write(RUNNING, job)
+			self._move(job, PENDING)
+		else:
+			self._write(RUNNING, job)
+			self._move(job, FAILED)
+
+	def recoverStale(self):
+		"""
+		Puts running jobs of sessions that died back in the queue.
+		@returns: The number of jobs recovered
+		"""
+		if not os.path.isdir(self._dir):
+			return 0
+		lock = self._lock()
+		try:
+			recovered = 0
+			now = time.time()
+			for job in self.jobs(RUNNING):
+				try:
+					age = now - os.path.getmtime(self._path(RUNNING, job["id"]))
+				except OSError:
+					continue
+				if age > STALE_AFTER and self._move(job, PENDING):
+					recovered += 1
+			return recovered
+		finally:
+			lock.close()
+
+	def prune(self, maxAge=KEEP_FINISHED):
+		"""Removes done and failed jobs older than maxAge seconds"""
+		now = time.time()
+		for state in [DONE, FAILED]:
+			d = os.path.join(self._dir, state)
+			if not os.path.isdir(d):
+				continue
+			for jobId in os.listdir(d):
+				path = os.path.join(d, jobId)
+				try:
+					if now - os.path.getmtime(path) > maxAge:
+						os.remove(path)
+				except OSError:
+					pass
+
+class InstallScheduler(threading.Thread):
+	"""
+	Runs queued installs with runner(vDirPath, srcFilePath, setStable) on their
+	own threads, as many at a time as limits allow.
+	"""
+
+	def __init__(self, queue, runner, limits=None, pollInterval=2.0):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self._queue = queue
+		self._runner = runner
+		self._limits = limits or DEFAULT_LIMITS
+		self._poll_interval = pollInterval
+		self._owner = socket.gethostname() + ":" + str(os.getpid())
+		self._stop_event = threading.Event()
+
+	def stop(self):
+		self._stop_event.set()
+
+	def run(self):
+		lastPrune = 0
+		while not self._stop_event.is_set():
+			try:
+				if time.time() - lastPrune > 3600:
+					self._queue.prune()
+					lastPrune = time.time()
+				self._queue.recoverStale()
+				while not self._stop_event.is_set():
+					job = self._queue.claim(self._limits, self._owner)
+					if job is None:
+						break
+					worker = threading.Thread(target=self._runJob, args=(job,))
+					worker.daemon = True
+					worker.start()
+			except Exception, e:
+				print "Install scheduler: " + str(e)
+			self._stop_event.wait(self._poll_interval)
+
+	def _heartbeat(self, job, done):
+		while not done.wait(HEARTBEAT):
+			self._queue.heartbeat(job)
+
+	def _runJob(self, job):
+		done = threading.Event()
+		beat = threading.Thread(target=self._heartbeat, args=(job, done))
+		beat.daemon = True
+		beat.start()
+		try:
+			result = self._runner(job["vdirpath"], job["srcfilepath"], job["setstable"])
+		except Exception, e:
+			done.set()
+			self._queue.fail(job, str(e))
+		else:
+			done.set()
+			self._queue.finish(job, result)
+
+# >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
+if __name__ == "__main__":
+	import sys, getpass
+	import utilities
+	if len(sys.argv) == 2 and os.path.isdir(sys.argv[1]):
+		projectDir = os.path.abspath(sys.argv[1])
+		utilities._configureProject([os.path.basename(projectDir), projectDir, getpass.getuser(), ""], "", save=False)
+		scheduler = utilities.startInstallScheduler()
+		print "Running installs queued in " + queueDir(projectDir)
+		try:
+			while scheduler.is_alive():
+				scheduler.join(1)
+		except KeyboardInterrupt:
+			scheduler.stop()
+	else:
+		print "usage: python installQueue.py <projectDir>"
+		sys.exit(1)
@@ -0,0 +1,226 @@
+"""
+Long-lived Maya/Houdini processes that install files on request, so that
+maya.standalone.initialize / import hou and the license checkout are paid
+once per process instead of once per install.
+
+The DCC side runs installMayaFile.py or installHoudiniFile.py with --serve,
+which calls serve(). It reads one JSON request per line from stdin and
+answers each with RESULT_MARKER and the result on stdout. The DCC may print
+on the same line before the marker, so it is looked for anywhere in a line.
+Anything else the DCC prints is passed through.
+
+The asset manager side is getPool(). It must not import Qt, maya or hou.
+"""
+
+import os, sys, time, json, threading, Queue, atexit
+from subprocess import Popen, PIPE
+
+RESULT_MARKER = "CHASM_RESULT "
+# A worker is restarted after this many installs to keep leaks in check
+DEFAULT_MAX_JOBS = 20
+# Seconds an install may take before its worker is killed
+DEFAULT_TIMEOUT = 600.0
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> DCC Side
+def handleRequest(install, request):
+	"""
+	Installs request["src"] to request["dst"] with install(src, dst).
+	@returns: The result dict to send back: {"ok": True} or {"ok": False, "error": message}
+	"""
+	try:
+		src = str(request["src"])
+		dst = str(request["dst"])
+		if not os.path.exists(src) or os.path.exists(dst):
+			raise Exception("Can not install file: File does not exist.")
+		install(src, dst)
+		return {"ok": True}
+	except Exception, e:
+		return {"ok": False, "error": str(e)}
+
+def respond(result):
+	sys.stdout.write(RESULT_MARKER + json.dumps(result) + "\n")
+	sys.stdout.flush()
+
+def serve(install, reset):
+	"""
+	Handles install requests until stdin is closed.
+	After every request reset() is called to give the next one an empty scene.
+	If reset() fails the worker exits after answering, and is restarted.
+	@precondition: install(srcFilePath, newInstFilePath) and reset() work in this DCC
+	"""
+	while True:
+		line = sys.stdin.readline()
+		if not line:
+			return
+		try:
+			result = handleRequest(install, json.loads(line))
+		except ValueError, e:
+			result = {"ok": False, "error": "Bad request: " + str(e)}
+		try:
+			reset()
+		except Exception, e:
+			result["restart"] = True
+			respond(result)
+			return
+		respond(result)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Asset Manager Side
+class WorkerCrashed(Exception):
+	"""Raised when a worker process dies while it is working on a request"""
+
+class WorkerTimeout(Exception):
+	"""Raised when a worker does not answer a request in time; it has been killed"""
+
+class InstallWorker:
+	"""
+	One DCC process started with command, which must end in --serve.
+	Not thread safe apart from stop(): WorkerPool hands each worker to one
+	thread at a time, and may stop it from another.
+	"""
+	def __init__(self, command, maxJobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_TIMEOUT):
+		self._command = command
+		self._max_jobs = maxJobs
+		self._timeout = timeout
+		self._process = None
+		self._processLock = threading.Lock()
+		self._lines = None
+		self._jobs = 0
+
+	def _start(self):
+		process = Popen(self._command, stdin=PIPE, stdout=PIPE, close_fds=True)
+		self._jobs = 0
+		self._lines = Queue.Queue()
+		reader = threading.Thread(target=self._read, args=(process.stdout, self._lines))
+		reader.daemon = True
+		reader.start()
+		with self._processLock:
+			self._process = process
+		return process
+
+	def _read(self, stdout, lines):
+		for line in iter(stdout.readline, ""):
+			start = line.find(RESULT_MARKER)
+			if start < 0:
+				sys.stdout.write(line)
+				continue
+			if start > 0:
+				sys.stdout.write(line[:start] + "\n")
+			lines.put(line[start + len(RESULT_MARKER):])
+		lines.put(None)
+
+	def stop(self):
+		"""Kills the process; a thread waiting for its answer gets WorkerCrashed"""
+		with self._processLock:
+			process = self._process
+			self._process = None
+		if process is not None:
+			if process.poll() is None:
+				process.stdin.close()
+				process.kill()
+			process.wait()
+
+	def isRunning(self):
+		process = self._process
+		return process is not None and process.poll() is None
+
+	def install(self, srcFilePath, newInstFilePath, progress=None):
+		"""
+		Sends one request and waits for the answer. progress() is called while
+		waiting; if it raises, the process is killed and the exception passed on.
+		@raises WorkerCrashed: if the process died or was stopped before it answered
+		@raises WorkerTimeout: if it did not answer within the timeout
+		@raises Exception: if the install failed
+		"""
+		process = self._process
+		if not self.isRunning() or self._jobs >= self._max_jobs:
+			self.stop()
+			process = self._start()
+		try:
+			process.stdin.write(json.dumps({"src": srcFilePath, "dst": newInstFilePath}) + "\n")
+			process.stdin.flush()
+		except (IOError, ValueError):
+			# ValueError: stop() closed stdin meanwhile
+			self.stop()
+			raise WorkerCrashed("Install worker " + self._command[0] + " is not running")
+		self._jobs += 1
+
+		deadline = time.time() + self._timeout
+		while True:
+			try:
+				line = self._lines.get(True, 0.2)
+				break
+			except Queue.Empty:
+				pass
+			if time.time() > deadline:
+				self.stop()
+				if os.path.exists(newInstFilePath):
+					os.remove(newInstFilePath)
+				raise WorkerTimeout("Install worker " + self._command[0] + " did not finish within " + str(self._timeout) + " seconds")
+			try:
+				if progress is not None:
+					progress()
+			except BaseException:
+				self.stop()
+				raise
+		if line is None:
+			self.stop()
+			raise WorkerCrashed("Install worker " + self._command[0] + " crashed")
+		result = json.loads(line)
+		if result.get("restart"):
+			self.stop()
+		if not result["ok"]:
+			raise Exception(result["error"])
+
+class WorkerPool:
+	"""Up to size InstallWorkers started with the same command"""
+	def __init__(self, command, size=1, maxJobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_TIMEOUT):
+		self._workers = [InstallWorker(command, maxJobs, timeout) for i in range(size)]
+		self._idle = Queue.Queue()
+		for worker in self._workers:
+			self._idle.put(worker)
+		self._stopped = False
+
+	def install(self, srcFilePath, newInstFilePath, progress=None):
+		"""
+		Installs with the next idle worker. A request whose worker crashed is
+		tried once more with a fresh process, unless the pool was stopped.
+		"""
+		if self._stopped:
+			raise WorkerCrashed("Install workers were stopped")
+		worker = self._idle.get()
+		try:
+			try:
+				worker.install(srcFilePath, newInstFilePath, progress)
+			except WorkerCrashed:
+				if os.path.exists(newInstFilePath):
+					os.remove(newInstFilePath)
+				if self._stopped:
+					raise
+				worker.install(srcFilePath, newInstFilePath, progress)
+		finally:
+			self._idle.put(worker)
+
+	def stop(self):
+		"""Kills every worker process, also those that are installing"""
+		self._stopped = True
+		for worker in self._workers:
+			worker.stop()
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+def getPool(command, size=1, maxJobs=DEFAULT_MAX_JOBS, timeout=DEFAULT_TIMEOUT):
+	"""@returns: The WorkerPool for command, started on first use"""
+	with _poolsLock:
+		key = tuple(command)
+		if key not in _pools:
+			_pools[key] = WorkerPool(command, size, maxJobs, timeout)
+		return _pools[key]
+
+def stopAll():
+	with _poolsLock:
+		for pool in _pools.values():
+			pool.stop()
+		_pools.clear()
+
+atexit.register(stopAll)
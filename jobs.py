@@ -0,0 +1,88 @@
+"""
+Runs long asset management operations (checkout, checkin, discard, install)
+on a thread pool so the main window stays responsive.
+"""
+
+from PyQt4.QtCore import *
+import utilities
+
+# Number of operations that may run at the same time
+MAX_THREADS = 4
+
+def threadPool():
+    pool = QThreadPool.globalInstance()
+    pool.setMaxThreadCount(MAX_THREADS)
+    return pool
+
+def formatStatus(status):
+    """@returns: e.g. '3/120 files, 1:05 left' for a utilities.CopyStatus"""
+    message = str(status.filesDone) + "/" + str(status.filesTotal) + " files"
+    eta = status.eta()
+    if eta is not None and status.filesDone < status.filesTotal:
+        message += ", %d:%02d left" % (int(eta) / 60, int(eta) % 60)
+    return message
+
+class Job(QRunnable):
+    """
+    Runs func(*args) on a pool thread. If withProgress is True func is also
+    passed progress=self.progress, which reports to the GUI and raises
+    utilities.CancelledError once cancel() has been called.
+
+    self.signals lives in the GUI thread, so slots connected to it run there:
+        started()
+        progress(int)                  percent done
+        message(QString)               files done and time left
+        finished(PyQt_PyObject)        the return value of func
+        failed(QString)                the error message
+        cancelled()
+    """
+
+    def __init__(self, title, func, args, withProgress=True):
+        QRunnable.__init__(self)
+        # The controller keeps a reference until the job is done
+        self.setAutoDelete(False)
+        self.title = title
+        self.signals = QObject()
+        self._func = func
+        self._args = args
+        self._withProgress = withProgress
+        self._cancelled = False
+        self._percent = -1
+        self._message = ""
+
+    def cancel(self):
+        self._cancelled = True
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def progress(self, status):
+        """
+        @precondition: status is a utilities.CopyStatus
+        """
+        if self._cancelled:
+            raise utilities.CancelledError(self.title + " was cancelled")
+        percent = int(status.fraction() * 100)
+        if percent != self._percent:
+            self._percent = percent
+            self.signals.emit(SIGNAL("progress(int)"), percent)
+        message = formatStatus(status)
+        if message != self._message:
+            self._message = message
+            self.signals.emit(SIGNAL("message(QString)"), message)
+
+    def run(self):
+        self.signals.emit(SIGNAL("started()"))
+        try:
+            if self._cancelled:
+                raise utilities.CancelledError(self.title + " was cancelled")
+            if self._withProgress:
+                result = self._func(*self._args, progress=self.progress)
+            else:
+                result = self._func(*self._args)
+        except utilities.CancelledError:
+            self.signals.emit(SIGNAL("cancelled()"))
+        except Exception, e:
+            self.signals.emit(SIGNAL("failed(QString)"), str(e))
+        else:
+            self.signals.emit(SIGNAL("finished(PyQt_PyObject)"), result)
@@ -0,0 +1,102 @@
+"""
+Manifests of versions: who checked a version in and when, and the size,
+mtime and content hash of every file in it. Two versions are compared by
+their manifests alone, without reading the files.
+
+A manifest is a JSON document:
+	{"format": 1, "version": 13, "user": "...", "time": "...",
+		"files": {relative path: {"size", "mtime", "hash"} or {"link": target}}}
+user and time are None for versions whose manifest was written after the fact.
+"""
+
+import os, stat, json, tempfile
+
+FORMAT = 1
+# Copies keep mtimes through float seconds, which moves them by a few
+# microseconds; mtimes closer than this are the same
+MTIME_TOLERANCE = 1e-3
+
+def sameMtime(a, b):
+	return a is not None and b is not None and abs(a - b) < MTIME_TOLERANCE
+
+def _entry(path, st, hashFile, previous):
+	if stat.S_ISLNK(st.st_mode):
+		return {"link": os.readlink(path)}
+	entry = {"size": st.st_size, "mtime": st.st_mtime}
+	if previous is not None and "hash" in previous and previous.get("size") == st.st_size and sameMtime(previous.get("mtime"), st.st_mtime):
+		# Unchanged since the previous version, checkout and checkin keep mtimes
+		entry["hash"] = previous["hash"]
+	else:
+		entry["hash"] = hashFile(path)
+	return entry
+
+def build(root, hashFile, previous=None):
+	"""
+	@precondition: hashFile(path) returns the content hash of a file
+	@precondition: previous is None or the files of an older manifest, whose
+		hashes are reused for files with the same size and mtime
+	@returns: The files of a manifest of the folder root
+	"""
+	previous = previous or {}
+	files = {}
+	for curDir, dirs, names in os.walk(root):
+		for name in names + [d for d in dirs if os.path.islink(os.path.join(curDir, d))]:
+			path = os.path.join(curDir, name)
+			relPath = os.path.relpath(path, root)
+			files[relPath] = _entry(path, os.lstat(path), hashFile, previous.get(relPath))
+	return files
+
+def fromArchiveIndex(index):
+	"""@returns: The files of a manifest from an archive index, see archive.py; it has no hashes"""
+	files = {}
+	for f in index["files"]:
+		if f["type"] == "file":
+			files[f["path"]] = {"size": f["size"], "mtime": f["mtime"]}
+		elif f["type"] == "link":
+			files[f["path"]] = {"link": f["target"]}
+	return files
+
+def totalSize(files):
+	return sum([f.get("size", 0) for f in files.values()])
+
+def isChanged(old, new):
+	"""@returns: True if two entries of the same path differ; without hashes by size and mtime"""
+	if "link" in old or "link" in new:
+		return old.get("link") != new.get("link")
+	if "hash" in old and "hash" in new:
+		return old["hash"] != new["hash"]
+	return old["size"] != new["size"] or not sameMtime(old["mtime"], new["mtime"])
+
+def diff(old, new):
+	"""@returns: {"added", "removed", "changed"}: sorted paths, going from the files old to the files new"""
+	return {"added": sorted([p for p in new if p not in old]),
+		"removed": sorted([p for p in old if p not in new]),
+		"changed": sorted([p for p in new if p in old and isChanged(old[p], new[p])])}
+
+def _encode(text):
+	return text.encode("utf-8") if isinstance(text, unicode) else text
+
+def read(path):
+	"""Paths and link targets are read as str, like the os functions return them"""
+	f = open(path)
+	try:
+		manifest = json.load(f)
+	finally:
+		f.close()
+	files = {}
+	for relPath, entry in manifest["files"].items():
+		if "link" in entry:
+			entry["link"] = _encode(entry["link"])
+		files[_encode(relPath)] = entry
+	manifest["files"] = files
+	return manifest
+
+def write(path, manifest):
+	"""Replaces path in one step"""
+	fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(path))
+	f = os.fdopen(fd, "w")
+	try:
+		json.dump(manifest, f, separators=(",", ":"))
+	finally:
+		f.close()
+	os.rename(tmp, path)
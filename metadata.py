@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Reads and writes the .nodeInfo and .checkoutInfo metadata files.
+
+Two formats are understood:
+	ini      The original ConfigParser files, with times written by
+	         time.strftime(TIME_FORMAT)
+	compact  One line of JSON, {"format": FORMAT_VERSION, "<Section>": {...}},
+	         with numbers, booleans and times as seconds since the epoch
+read() accepts both and always returns a ConfigParser, so callers do not
+care which one a file is in. Converting is lossless both ways: a value that
+does not fit its type (e.g. a time written in another locale) is kept as
+a string.
+
+New metadata is written as ini files until a project is migrated. Convert a
+project or a local directory in place with:
+	python metadata.py migrate /path/to/project
+	python metadata.py rollback /path/to/project
+"""
+
+import os, time, json, collections, tracing
+from ConfigParser import ConfigParser
+from StringIO import StringIO
+
+FORMAT_VERSION = 1
+INI = "ini"
+COMPACT = "compact"
+TIME_FORMAT = "%a, %d %b %Y %I:%M:%S %p"
+METADATA_FILES = [".nodeInfo", ".checkoutInfo"]
+
+_INT = "int"
+_BOOL = "bool"
+_TIME = "time"
+# (section, option) -> type of the options that are not stored as strings
+_TYPES = {
+	("Versioning", "latestversion"): _INT,
+	("Versioning", "locked"): _BOOL,
+	("Versioning", "lastcheckouttime"): _TIME,
+	("Versioning", "lastcheckintime"): _TIME,
+	("Versioning", "generation"): _INT,
+	("Checkout", "checkouttime"): _TIME,
+	("Checkout", "version"): _INT,
+	("Checkout", "lockedbyme"): _BOOL,
+}
+
+def formatTime(seconds):
+	return time.strftime(TIME_FORMAT, time.localtime(seconds))
+
+def parseTime(text):
+	"""@returns: The seconds since the epoch of a time written with formatTime(), or None"""
+	try:
+		seconds = int(time.mktime(time.strptime(text, TIME_FORMAT)))
+	except (ValueError, OverflowError):
+		return None
+	if formatTime(seconds) != text:
+		return None
+	return seconds
+
+def getTime(configParser, section, option):
+	"""@returns: The seconds since the epoch of a time option, or None if it is not a valid time"""
+	return parseTime(configParser.get(section, option))
+
+def _pack(kind, text):
+	if kind == _INT:
+		try:
+			if str(int(text)) == text:
+				return int(text)
+		except ValueError:
+			pass
+	elif kind == _BOOL:
+		if text in ("True", "False"):
+			return text == "True"
+	elif kind == _TIME:
+		seconds = parseTime(text)
+		if seconds is not None:
+			return seconds
+	return text
+
+def _unpack(kind, value):
+	if isinstance(value, bool):
+		return str(value)
+	if isinstance(value, (int, long, float)):
+		if kind == _TIME:
+			return formatTime(value)
+		return str(int(value))
+	return value.encode("utf-8") if isinstance(value, unicode) else value
+
+def dumps(configParser):
+	"""@returns: configParser in the compact format"""
+	# Ordered so that converting back writes the options in their old order
+	record = collections.OrderedDict([("format", FORMAT_VERSION)])
+	for section in configParser.sections():
+		values = collections.OrderedDict()
+		# raw: a "%" in a value is text, not an interpolation
+		for option, text in configParser.items(section, raw=True):
+			values[option] = _pack(_TYPES.get((section, option)), text)
+		record[section] = values
+	return json.dumps(record, separators=(",", ":")) + "\n"
+
+def loads(data):
+	"""@returns: A ConfigParser with the contents of data, which may be in either format"""
+	cp = ConfigParser()
+	if not isCompact(data):
+		cp.readfp(StringIO(data))
+		return cp
+	record = json.loads(data, object_pairs_hook=collections.OrderedDict)
+	if record.get("format", 0) > FORMAT_VERSION:
+		raise Exception("Metadata format " + str(record["format"]) + " is newer than this asset manager")
+	for section in record:
+		if section == "format":
+			continue
+		cp.add_section(str(section))
+		for option, value in record[section].items():
+			cp.set(str(section), str(option), _unpack(_TYPES.get((section, option)), value))
+	return cp
+
+def isCompact(data):
+	return data.lstrip().startswith("{")
+
+def read(path):
+	"""@returns: A ConfigParser with the contents of path, empty if path can not be read"""
+	try:
+		f = open(path, "rb")
+	except IOError:
+		return ConfigParser()
+	try:
+		return loads(f.read())
+	finally:
+		f.close()
+
+def fileFormat(path):
+	"""@returns: INI or COMPACT"""
+	f = open(path, "rb")
+	try:
+		return COMPACT if isCompact(f.read(64)) else INI
+	finally:
+		f.close()
+
+# Parsing is timed while tracing is enabled, see tracing.py
+tracing.instrument(globals(), lambda name: name in ["read", "dumps"], "metadata.")
+
+# >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
+if __name__ == "__main__":
+	import sys, getpass
+	import utilities
+	if len(sys.argv) == 3 and sys.argv[1] in ("migrate", "rollback") and os.path.isdir(sys.argv[2]):
+		dirPath = os.path.abspath(sys.argv[2])
+		compact = sys.argv[1] == "migrate"
+		if os.path.exists(os.path.join(dirPath, ".nullReference")):
+			# A project: also make new metadata keep the format
+			utilities._configureProject([os.path.basename(dirPath), dirPath, getpass.getuser(), ""], "", save=False)
+			utilities.setProjectSetting("Metadata", "format", COMPACT if compact else INI)
+		converted = utilities.convertMetadata(dirPath, compact)
+		print "Converted " + str(converted) + " metadata files"
+	else:
+		print "usage: python metadata.py migrate|rollback <projectDir or localDir>"
+		sys.exit(1)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""
+An SQLite index that mirrors the .nodeInfo metadata of a project.
+The index lives in the project root. If it exists, utilities keeps it up to
+date and answers tree and can*/is* queries from it instead of walking the
+project and parsing every .nodeInfo file. utilities creates it the first time
+it is needed, unless [Index] autoCreate = False in .projectInfo.
+
+Every row also counts the installed and the checked out versioned folders
+at or below it (installedbelow, lockedbelow). The counts are kept up to date
+on every change, so asking whether a subtree has any is a single row lookup.
+
+Rebuild (or create) the index from the filesystem with:
+	python nodeIndex.py /path/to/project
+"""
+
+import os, sqlite3, threading
+
+INDEX_NAME = ".nodeIndex.db"
+
+_COLUMNS = ["path", "parent", "name", "isdir", "versioned", "type", "latestversion",
+	"locked", "lastcheckoutuser", "lastcheckouttime", "lastcheckinuser",
+	"lastcheckintime", "stable", "installed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+	path TEXT PRIMARY KEY,
+	parent TEXT NOT NULL,
+	name TEXT NOT NULL,
+	isdir INTEGER NOT NULL DEFAULT 1,
+	versioned INTEGER NOT NULL DEFAULT 0,
+	type TEXT,
+	latestversion INTEGER,
+	locked INTEGER NOT NULL DEFAULT 0,
+	lastcheckoutuser TEXT,
+	lastcheckouttime TEXT,
+	lastcheckinuser TEXT,
+	lastcheckintime TEXT,
+	stable TEXT,
+	installed INTEGER NOT NULL DEFAULT 0,
+	installedbelow INTEGER NOT NULL DEFAULT 0,
+	lockedbelow INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent);
+"""
+_COUNT_COLUMNS = ["installedbelow", "lockedbelow"]
+_INSERT = "INSERT OR REPLACE INTO nodes (" + ",".join(_COLUMNS + _COUNT_COLUMNS) + \
+	") VALUES (" + ",".join("?" * (len(_COLUMNS) + len(_COUNT_COLUMNS))) + ")"
+# What a row adds to the counts of itself and its ancestors
+_OWN_COUNTS = "(versioned AND installed), (versioned AND locked)"
+
+def indexPath(projectDir):
+	"""@returns: The path of the index database for projectDir"""
+	return os.path.join(projectDir, INDEX_NAME)
+
+def exists(projectDir):
+	return bool(projectDir) and os.path.exists(indexPath(projectDir))
+
+class NodeIndex:
+	"""
+	Wraps the index database of one project.
+	Paths passed in and returned are absolute; they are stored relative
+	to the project root so the project can be moved.
+	Connections are kept per thread because sqlite3 connections can not
+	be shared between threads.
+	"""
+
+	def __init__(self, projectDir, dbPath=None):
+		self._project_dir = os.path.abspath(projectDir)
+		self._db_path = dbPath or indexPath(self._project_dir)
+		self._local = threading.local()
+
+	def _connect(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(self._db_path, timeout=30)
+			conn.row_factory = sqlite3.Row
+			conn.text_factory = str
+			conn.executescript(_SCHEMA)
+			self._local.conn = conn
+			self._migrate(conn)
+		return conn
+
+	def _migrate(self, conn):
+		"""Adds the count columns to an index created before they existed"""
+		columns = [row[1] for row in conn.execute("PRAGMA table_info(nodes)")]
+		missing = [c for c in _COUNT_COLUMNS if c not in columns]
+		if missing:
+			with conn:
+				for column in missing:
+					conn.execute("ALTER TABLE nodes ADD COLUMN " + column + " INTEGER NOT NULL DEFAULT 0")
+				self._recount(conn)
+
+	def close(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
+	def contains(self, path):
+		"""@returns: True if path is inside the project this index covers"""
+		path = os.path.abspath(path)
+		return path == self._project_dir or path.startswith(self._project_dir + os.sep)
+
+	def _rel(self, path):
+		rel = os.path.relpath(os.path.abspath(path), self._project_dir)
+		if rel == os.curdir:
+			return ""
+		return rel
+
+	def _abs(self, rel):
+		return os.path.join(self._project_dir, rel)
+
+	def _toDict(self, row):
+		node = dict(zip(row.keys(), row))
+		node["path"] = self._abs(node["path"])
+		node["locked"] = bool(node["locked"])
+		node["installed"] = bool(node["installed"])
+		node["versioned"] = bool(node["versioned"])
+		node["isdir"] = bool(node["isdir"])
+		return node
+
+	def _row(self, path, node):
+		rel = self._rel(path)
+		parent, name = os.path.split(rel)
+		values = dict((c, None) for c in _COLUMNS)
+		values.update(node)
+		values.update({"path": rel, "parent": parent, "name": name})
+		for flag in ["isdir", "versioned", "locked", "installed"]:
+			values[flag] = int(bool(values[flag])) if values[flag] is not None else 0
+		if node.get("isdir") is None:
+			values["isdir"] = 1
+		return [values[c] for c in _COLUMNS]
+
+	def _ancestors(self, rel):
+		"""@returns: The relative paths of the indexed folders above rel"""
+		ancestors = []
+		while rel:
+			rel = os.path.dirname(rel)
+			if rel:
+				ancestors.append(rel)
+		return ancestors
+
+	def _addToAncestors(self, conn, rel, installed, locked):
+		ancestors = self._ancestors(rel)
+		if ancestors and (installed or locked):
+			conn.execute("UPDATE nodes SET installedbelow = installedbelow + ?, lockedbelow = lockedbelow + ? WHERE path IN (" +
+				",".join("?" * len(ancestors)) + ")", [installed, locked] + ancestors)
+
+	def _subtreeCounts(self, conn, path):
+		clause, args = self._subtreeClause(path)
+		row = conn.execute("SELECT TOTAL(versioned AND installed), TOTAL(versioned AND locked) FROM nodes WHERE " + clause, args).fetchone()
+		return int(row[0]), int(row[1])
+
+	def _recount(self, conn):
+		"""Recomputes installedbelow and lockedbelow of every row"""
+		counts = {}
+		for path, installed, locked in conn.execute("SELECT path, " + _OWN_COUNTS + " FROM nodes"):
+			for rel in [path] + self._ancestors(path):
+				total = counts.setdefault(rel, [0, 0])
+				total[0] += installed
+				total[1] += locked
+		conn.execute("UPDATE nodes SET installedbelow = 0, lockedbelow = 0")
+		conn.executemany("UPDATE nodes SET installedbelow = ?, lockedbelow = ? WHERE path = ?",
+			[(i, l, rel) for rel, (i, l) in counts.items() if i or l])
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Queries
+	def getNode(self, path):
+		"""@returns: A dict of the indexed columns for path, or None"""
+		row = self._connect().execute("SELECT * FROM nodes WHERE path = ?", (self._rel(path),)).fetchone()
+		if row is None:
+			return None
+		return self._toDict(row)
+
+	def getChildren(self, path):
+		"""@returns: A list of node dicts for the direct children of path"""
+		rows = self._connect().execute("SELECT * FROM nodes WHERE parent = ? AND path != ''", (self._rel(path),))
+		return [self._toDict(r) for r in rows]
+
+	def getAll(self):
+		"""@returns: A list of node dicts for every indexed path"""
+		rows = self._connect().execute("SELECT * FROM nodes WHERE path != ''")
+		return [self._toDict(r) for r in rows]
+
+	def _subtreeClause(self, path):
+		rel = self._rel(path)
+		if rel == "":
+			return "1", ()
+		# Everything strictly below rel sorts between 'rel/' and 'rel0'
+		return "(path = ? OR (path >= ? AND path < ?))", (rel, rel + "/", rel + "0")
+
+	def hasInstalledOrCheckedOut(self, path):
+		"""@returns: True if path or anything below it is installed or locked"""
+		rel = self._rel(path)
+		conn = self._connect()
+		row = conn.execute("SELECT installedbelow, lockedbelow FROM nodes WHERE path = ?", (rel,)).fetchone()
+		if row is not None:
+			return bool(row[0] or row[1])
+		# The project root has no row of its own
+		row = conn.execute("SELECT 1 FROM nodes WHERE parent = ? AND path != '' AND (installedbelow OR lockedbelow) LIMIT 1",
+			(rel,)).fetchone()
+		return row is not None
+
+	def getCounts(self, path):
+		"""@returns: (installed, checked out) versioned folders at or below path"""
+		row = self._connect().execute("SELECT installedbelow, lockedbelow FROM nodes WHERE path = ?", (self._rel(path),)).fetchone()
+		if row is None:
+			return self._subtreeCounts(self._connect(), path)
+		return row[0], row[1]
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Updates
+	def putNode(self, path, node):
+		"""
+		Inserts or replaces the row for path.
+		@precondition: node is a dict keyed by column names
+		"""
+		rel = self._rel(path)
+		values = self._row(path, node)
+		byName = dict(zip(_COLUMNS, values))
+		installed = int(bool(byName["versioned"] and byName["installed"]))
+		locked = int(bool(byName["versioned"] and byName["locked"]))
+		conn = self._connect()
+		with conn:
+			old = conn.execute("SELECT installedbelow, lockedbelow, " + _OWN_COUNTS + " FROM nodes WHERE path = ?", (rel,)).fetchone()
+			if old is None:
+				# Rows below path may already be indexed
+				below = self._subtreeCounts(conn, path)
+				counts = [below[0] + installed, below[1] + locked]
+				changes = [installed, locked]
+			else:
+				counts = [old[0] - old[2] + installed, old[1] - old[3] + locked]
+				changes = [installed - old[2], locked - old[3]]
+			conn.execute(_INSERT, values + counts)
+			self._addToAncestors(conn, rel, changes[0], changes[1])
+
+	def removeTree(self, path):
+		"""Removes path and everything below it"""
+		clause, args = self._subtreeClause(path)
+		conn = self._connect()
+		with conn:
+			installed, locked = self._subtreeCounts(conn, path)
+			conn.execute("DELETE FROM nodes WHERE " + clause, args)
+			self._addToAncestors(conn, self._rel(path), -installed, -locked)
+
+	def renameTree(self, oldPath, newPath):
+		"""Moves the rows for oldPath and everything below it to newPath"""
+		old = self._rel(oldPath)
+		new = self._rel(newPath)
+		parent, name = os.path.split(new)
+		conn = self._connect()
+		with conn:
+			installed, locked = self._subtreeCounts(conn, oldPath)
+			self._addToAncestors(conn, old, -installed, -locked)
+			conn.execute("UPDATE nodes SET path = ?, parent = ?, name = ? WHERE path = ?", (new, parent, name, old))
+			conn.execute("UPDATE nodes SET path = ? || substr(path, ?) WHERE path >= ? AND path < ?",
+				(new, len(old) + 1, old + "/", old + "0"))
+			conn.execute("UPDATE nodes SET parent = ? || substr(parent, ?) WHERE parent = ? OR (parent >= ? AND parent < ?)",
+				(new, len(old) + 1, old, old + "/", old + "0"))
+			self._addToAncestors(conn, new, installed, locked)
+
+	def replaceAll(self, nodes):
+		"""
+		Replaces the whole index with nodes.
+		@precondition: nodes is an iterable of (path, node dict) pairs
+		"""
+		conn = self._connect()
+		with conn:
+			conn.execute("DELETE FROM nodes")
+			conn.executemany(_INSERT, (self._row(p, n) + [0, 0] for p, n in nodes))
+			self._recount(conn)
+
+# >>>>>>>>>>>>>>>>>>>>>>>> STARTS HERE <<<<<<<<<<<<<<<<<<<<<<<<<<<<
+if __name__ == "__main__":
+	import sys
+	import utilities
+	if len(sys.argv) == 2 and os.path.isdir(sys.argv[1]):
+		count = utilities.rebuildIndex(os.path.abspath(sys.argv[1]))
+		print "Indexed " + str(count) + " entries in " + indexPath(os.path.abspath(sys.argv[1]))
+	else:
+		print "usage: python nodeIndex.py <projectDir>"
+		sys.exit(1)
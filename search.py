@@ -0,0 +1,239 @@
+"""
+An in-memory index of the folders and files of a project for the search box.
+Names are indexed by trigram and kept sorted for prefix lookups, so a query
+only looks at the entries that can match instead of walking the project.
+
+A query is a list of words. The last word has to be in the name of an entry:
+anywhere in it if it has 3 letters or more, at its start if it is shorter.
+The other words have to be somewhere in its path. Matching ignores case.
+Words like locked:USER, by:USER and installed:yes|no are filters, see
+parseQuery(): the user who has a versioned folder locked, the user who
+checked it in last, and whether it is installed.
+
+Entries are added and removed one by one as the project changes. Removed
+entries are only marked, and the index is compacted once enough of them
+have piled up.
+"""
+
+import os, bisect, heapq, threading
+
+SEARCH_LIMIT = 200
+# The index is compacted when more than this fraction of its entries were removed
+COMPACT_FRACTION = 0.25
+FILTERS = {"locked": "lockedBy", "by": "checkinUser", "installed": "installed"}
+
+def parseQuery(text):
+	"""
+	@returns: (query, filters): the words of text that are not filters, and the
+		keyword arguments for SearchIndex.search()
+	"""
+	words = []
+	filters = {}
+	for word in text.split():
+		key, sep, value = word.partition(":")
+		if sep and key.lower() in FILTERS and value:
+			if key.lower() == "installed":
+				value = value.lower() in ["yes", "true", "1"]
+			filters[FILTERS[key.lower()]] = value
+		else:
+			words.append(word)
+	return " ".join(words), filters
+
+def _trigrams(text):
+	return set([text[i:i + 3] for i in range(len(text) - 2)])
+
+class SearchIndex:
+	"""
+	Paths passed in and returned are absolute; they are stored relative to the
+	project root, like in nodeIndex.NodeIndex. Node dicts are the ones
+	NodeIndex stores. The index may be used from several threads.
+	"""
+
+	def __init__(self, projectDir):
+		self.projectDir = os.path.abspath(projectDir)
+		self._lock = threading.Lock()
+		self._clear()
+
+	def _clear(self):
+		# id -> (len(relPath), relPath, lower case relPath, lower case name, attributes), None
+		# once removed; entries sort shortest path first
+		self._entries = []
+		self._ids = {}
+		# parent relPath -> set of the relPaths directly inside it
+		self._children = {}
+		self._postings = {}
+		# sorted (lower case name, id)
+		self._names = []
+		self._removed = 0
+
+	def __len__(self):
+		return len(self._ids)
+
+	def contains(self, path):
+		"""@returns: True if path is inside the project this index covers"""
+		path = os.path.abspath(path)
+		return path == self.projectDir or path.startswith(self.projectDir + os.sep)
+
+	def _rel(self, path):
+		if path.startswith(self.projectDir + os.sep) and os.sep + "." not in path:
+			# Already absolute and normalized, the common case
+			return path[len(self.projectDir) + 1:].rstrip(os.sep)
+		rel = os.path.relpath(os.path.abspath(path), self.projectDir)
+		if rel == os.curdir:
+			return ""
+		return rel
+
+	def _attributes(self, node):
+		"""@returns: (isdir, versioned, lockedBy, checkinUser, installed)"""
+		versioned = bool(node.get("versioned"))
+		lockedBy = node.get("lastcheckoutuser") if versioned and node.get("locked") else None
+		return (node.get("isdir", True) is not False, versioned, lockedBy,
+			node.get("lastcheckinuser") if versioned else None, versioned and bool(node.get("installed")))
+
+	def _add(self, rel, attributes, sortNames=True):
+		name = os.path.basename(rel).lower()
+		i = len(self._entries)
+		self._entries.append((len(rel), rel, rel.lower(), name, attributes))
+		self._ids[rel] = i
+		self._children.setdefault(os.path.dirname(rel), set()).add(rel)
+		for trigram in _trigrams(name):
+			self._postings.setdefault(trigram, []).append(i)
+		if sortNames:
+			bisect.insort(self._names, (name, i))
+		else:
+			self._names.append((name, i))
+
+	def _remove(self, rel):
+		i = self._ids.pop(rel)
+		self._entries[i] = None
+		self._removed += 1
+		parent = os.path.dirname(rel)
+		siblings = self._children[parent]
+		siblings.discard(rel)
+		if not siblings:
+			del self._children[parent]
+
+	def _subtree(self, rel):
+		"""@returns: rel if it is indexed and the relPaths below it, parents before their children"""
+		subtree = [rel] if rel in self._ids else []
+		stack = [rel]
+		while stack:
+			children = self._children.get(stack.pop(), ())
+			subtree.extend(children)
+			stack.extend(children)
+		return subtree
+
+	def _compactIfNeeded(self):
+		if self._removed > COMPACT_FRACTION * len(self._entries):
+			live = [e for e in self._entries if e is not None]
+			self._clear()
+			for length, rel, relLower, name, attributes in live:
+				self._add(rel, attributes, False)
+			self._names.sort()
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Updates
+	def put(self, path, node):
+		"""Adds or updates the entry for path"""
+		rel = self._rel(path)
+		if rel == "":
+			return
+		attributes = self._attributes(node)
+		with self._lock:
+			i = self._ids.get(rel)
+			if i is None:
+				self._add(rel, attributes)
+			else:
+				self._entries[i] = self._entries[i][:4] + (attributes,)
+
+	def removeTree(self, path):
+		"""Removes path and everything below it"""
+		with self._lock:
+			for rel in self._subtree(self._rel(path)):
+				self._remove(rel)
+			self._compactIfNeeded()
+
+	def renameTree(self, oldPath, newPath):
+		"""Moves the entries for oldPath and everything below it to newPath"""
+		old = self._rel(oldPath)
+		new = self._rel(newPath)
+		with self._lock:
+			for rel in self._subtree(old):
+				attributes = self._entries[self._ids[rel]][4]
+				self._remove(rel)
+				self._add(new + rel[len(old):], attributes)
+			self._compactIfNeeded()
+
+	def replaceAll(self, nodes):
+		"""
+		Replaces the whole index with nodes.
+		@precondition: nodes is an iterable of (path, node dict) pairs
+		"""
+		with self._lock:
+			self._clear()
+			for path, node in nodes:
+				rel = self._rel(path)
+				if rel != "" and rel not in self._ids:
+					self._add(rel, self._attributes(node), False)
+			self._names.sort()
+
+	# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Queries
+	def getChildren(self, path):
+		"""@returns: The paths of the entries directly inside path"""
+		rel = self._rel(path)
+		with self._lock:
+			return [os.path.join(self.projectDir, r) for r in self._children.get(rel, ())]
+
+	def _trigramCandidates(self, word):
+		"""@returns: The live entries whose name has word in it"""
+		postings = [self._postings.get(t, []) for t in _trigrams(word)]
+		# Each match is in every posting list; the shortest has the fewest to check
+		entries = [self._entries[i] for i in min(postings, key=len)]
+		return [e for e in entries if e is not None and word in e[3]]
+
+	def _prefixCandidates(self, word):
+		"""@returns: (names equal to word, names starting with it): lists of live entries"""
+		start = bisect.bisect_left(self._names, (word,))
+		middle = bisect.bisect_left(self._names, (word + "\x00",), start)
+		end = bisect.bisect_left(self._names, (word + (u"\uffff" if isinstance(word, unicode) else "\xff"),), middle)
+		return (filter(None, [self._entries[i] for name, i in self._names[start:middle]]),
+			filter(None, [self._entries[i] for name, i in self._names[middle:end]]))
+
+	def search(self, query, lockedBy=None, checkinUser=None, installed=None, limit=SEARCH_LIMIT):
+		"""
+		@precondition: query is a list of words separated by spaces or path separators
+		@precondition: lockedBy, checkinUser and installed are None or a value the
+			matches must have, see the module documentation
+		@returns: The paths of at most limit matches, best first: names equal to
+			the last word, then names starting with it, then shorter paths
+		"""
+		words = query.lower().replace(os.sep, " ").split()
+		# The matches are gathered a group at a time, best group first, and
+		# filtered a condition at a time: list comprehensions and plain tuple
+		# comparison (entries sort shortest path first) keep a search of
+		# 100000 entries fast
+		with self._lock:
+			if not words:
+				groups = [filter(None, self._entries)]
+			elif len(words[-1]) >= 3:
+				last = words[-1]
+				candidates = self._trigramCandidates(last)
+				groups = [[e for e in candidates if e[3] == last],
+					lambda: [e for e in candidates if e[3] != last and e[3].startswith(last)],
+					lambda: [e for e in candidates if not e[3].startswith(last)]]
+			else:
+				groups = list(self._prefixCandidates(words[-1]))
+		best = []
+		for group in groups:
+			if len(best) >= limit:
+				break
+			entries = group() if callable(group) else group
+			for word in words[:-1]:
+				entries = [e for e in entries if word in e[2]]
+			if lockedBy is not None:
+				entries = [e for e in entries if e[4][2] == lockedBy]
+			if checkinUser is not None:
+				entries = [e for e in entries if e[4][3] == checkinUser]
+			if installed is not None:
+				entries = [e for e in entries if e[4][4] == bool(installed)]
+			best += heapq.nsmallest(limit - len(best), entries)
+		return [os.path.join(self.projectDir, e[1]) for e in best]
@@ -0,0 +1,74 @@
+"""
+Tests for the asset management functions in utilities.py.
+Run them from the program's root directory with
+	python -m unittest discover -s tests -t .
+"""
+
+import os, shutil, tempfile, unittest
+import utilities
+
+class ProjectTestCase(unittest.TestCase):
+	"""Configures a new, empty project and local directory for every test"""
+	
+	def setUp(self):
+		self.root = tempfile.mkdtemp(prefix="chasmTest")
+		self.projectDir = os.path.join(self.root, "project")
+		self.userDir = os.path.join(self.root, "user")
+		os.makedirs(self.projectDir)
+		os.makedirs(self.userDir)
+		self.configFile = os.path.join(self.root, ".config.ini")
+		self.configure("tester")
+	
+	def tearDown(self):
+		utilities.stopInstallScheduler()
+		self.waitForGarbageCollection()
+		shutil.rmtree(self.root, ignore_errors=True)
+	
+	def waitForGarbageCollection(self):
+		"""Waits until the background passes scheduled by checkin() are done"""
+		if utilities._collector is not None:
+			self.assertTrue(utilities._collector.drain(60))
+	
+	def configure(self, username, userDir=None):
+		"""Works as username from now on, with the local directory userDir"""
+		if userDir is None:
+			userDir = self.userDir
+		utilities._configureProject(["Test", self.projectDir, username, userDir], self.configFile)
+	
+	def addVersionedFolder(self, name, files=None):
+		"""
+		@precondition: files is None or a dictionary of relative path: contents
+		@returns: The path of a new versioned folder whose latest version holds files
+		"""
+		changes = utilities.addVersionedFolder(self.projectDir, name)
+		vDirPath = changes.paths(utilities.PROJECT_ADDED)[0]
+		if files:
+			self.checkin(vDirPath, files)
+		return vDirPath
+	
+	def checkout(self, vDirPath, lock=True, version=None):
+		"""@returns: The local copy"""
+		return utilities.checkout(vDirPath, lock, version=version).paths(utilities.LOCAL_ADDED)[0]
+	
+	def checkin(self, vDirPath, files, removed=()):
+		"""Checks in a new version of vDirPath with files changed and removed deleted"""
+		local = self.checkout(vDirPath)
+		for rel in removed:
+			os.remove(os.path.join(local, rel))
+		for rel, contents in files.items():
+			writeFile(os.path.join(local, rel), contents)
+		utilities.checkin(local)
+
+def writeFile(path, contents):
+	if not os.path.isdir(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	f = open(path, "w")
+	f.write(contents)
+	f.close()
+
+def readFile(path):
+	f = open(path)
+	try:
+		return f.read()
+	finally:
+		f.close()
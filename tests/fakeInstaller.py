@@ -0,0 +1,27 @@
+"""
+Stands in for installMayaFile.py --serve in the install worker tests.
+It copies the source file, unless the file says otherwise:
+	crash     exit without answering
+	hang      never answer
+	fail      answer with an error
+	noisy     print without a newline before the answer
+"""
+
+import os, sys, time, shutil
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import installWorker
+
+def install(src, dst):
+	what = open(src).read()
+	if what == "crash":
+		os._exit(3)
+	if what == "hang":
+		time.sleep(60)
+	if what == "fail":
+		raise Exception("Can not install " + os.path.basename(src))
+	if what == "noisy":
+		sys.stdout.write("Result: untitled")
+	shutil.copy(src, dst)
+
+if __name__ == "__main__":
+	installWorker.serve(install, lambda: None)
@@ -0,0 +1,52 @@
+import os, unittest
+import utilities
+from tests import ProjectTestCase, readFile
+
+# Big enough to be stored as a delta with a small block size
+PADDING = "".join([chr(i % 251) for i in range(8192)])
+
+class ArchiveTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		utilities.setProjectSetting("Retention", "gcRate", 0)
+		utilities.setProjectSetting("Archive", "enabled", True)
+		self.vDirPath = self.addVersionedFolder("asset")
+		self.srcDir = os.path.join(self.vDirPath, "src")
+
+	def checkinVersions(self, count):
+		for i in range(1, count + 1):
+			self.checkin(self.vDirPath, {"notes.txt": "v%d" % i,
+				os.path.join("maps", "color.txt"): "color %d" % i + PADDING})
+		self.waitForGarbageCollection()
+
+	def assertVersion(self, version):
+		local = self.checkout(self.vDirPath, False, version)
+		self.assertEqual(readFile(os.path.join(local, "notes.txt")), "v%d" % version)
+		self.assertEqual(readFile(os.path.join(local, "maps", "color.txt")), "color %d" % version + PADDING)
+		self.assertTrue(os.access(os.path.join(local, "notes.txt"), os.W_OK))
+
+	def testCollectedVersionsAreArchived(self):
+		self.checkinVersions(3)
+		utilities.setRetentionPolicy(self.vDirPath, keepLast=1)
+		utilities.collectVersions(self.vDirPath)
+		self.assertEqual(utilities._versionNumbers(self.srcDir), [3])
+		self.assertEqual(utilities.getArchivedVersions(self.vDirPath), [0, 1, 2])
+		self.assertVersion(1)
+		self.assertVersion(2)
+		self.assertEqual(utilities.diffVersions(self.vDirPath, 1, 3)["changed"],
+			[os.path.join("maps", "color.txt"), "notes.txt"])
+
+	def testArchiveRebuildsDeltas(self):
+		utilities.setProjectSetting("Storage", "mode", "delta")
+		utilities.setProjectSetting("Storage", "deltaThreshold", 1024)
+		utilities.setProjectSetting("Storage", "deltaBlockSize", 256)
+		self.checkinVersions(3)
+		self.assertTrue(os.path.exists(os.path.join(self.srcDir, "v2", "maps", "color.txt" + utilities.DELTA_EXT)))
+		utilities.purge(self.srcDir, 3)
+		self.assertEqual(utilities.getArchivedVersions(self.vDirPath), [0, 1, 2])
+		self.assertVersion(1)
+		self.assertVersion(2)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,52 @@
+import os, unittest
+import utilities
+from utilities import PROJECT_ADDED, PROJECT_REMOVED, PROJECT_RENAMED, PROJECT_CHANGED, \
+	LOCAL_ADDED, LOCAL_REMOVED, INSTALLED_FILE
+from tests import ProjectTestCase, writeFile
+
+class ChangesTest(ProjectTestCase):
+	"""Every operation describes exactly the tree items it changed"""
+
+	def testPaths(self):
+		changes = utilities.Changes("Did two things", [(LOCAL_ADDED, "/a"), (PROJECT_CHANGED, "/b"), (LOCAL_ADDED, "/c")])
+		self.assertEqual(changes.summary, "Did two things")
+		self.assertEqual(changes.paths(LOCAL_ADDED), ["/a", "/c"])
+		self.assertEqual(changes.paths(PROJECT_REMOVED), [])
+
+	def testProjectFolders(self):
+		folder = os.path.join(self.projectDir, "shots")
+		self.assertEqual(utilities.addProjectFolder(self.projectDir, "shots"), [(PROJECT_ADDED, folder)])
+		vDirPath = os.path.join(folder, "cup")
+		self.assertEqual(utilities.addVersionedFolder(folder, "cup"), [(PROJECT_ADDED, vDirPath)])
+		renamed = os.path.join(folder, "mug")
+		changes = utilities.renameFolder(vDirPath, "mug")
+		self.assertEqual(changes, [(PROJECT_RENAMED, (vDirPath, renamed))])
+		self.assertEqual(changes.summary, "Renamed cup to mug")
+		self.assertEqual(utilities.removeFolder(renamed), [(PROJECT_REMOVED, renamed)])
+
+	def testCheckoutAndCheckin(self):
+		vDirPath = self.addVersionedFolder("cup")
+		changes = utilities.checkout(vDirPath, True)
+		local = changes.paths(LOCAL_ADDED)[0]
+		self.assertEqual(changes, [(LOCAL_ADDED, local), (PROJECT_CHANGED, vDirPath)])
+		writeFile(os.path.join(local, "notes.txt"), "v1")
+		changes = utilities.checkin(local)
+		self.assertEqual(changes, [(LOCAL_REMOVED, local), (PROJECT_CHANGED, vDirPath)])
+		self.assertEqual(changes.summary, "Checked in cup as version 1")
+
+	def testDiscard(self):
+		vDirPath = self.addVersionedFolder("cup")
+		local = self.checkout(vDirPath)
+		self.assertEqual(utilities.discard(local), [(LOCAL_REMOVED, local), (PROJECT_CHANGED, vDirPath)])
+		self.assertFalse(os.path.exists(local))
+
+	def testInstall(self):
+		vDirPath = self.addVersionedFolder("cup", {"notes.txt": "v1"})
+		changes = utilities.install(vDirPath, os.path.join(vDirPath, "src", "v1", "notes.txt"), True)
+		installed = changes.paths(INSTALLED_FILE)
+		self.assertEqual(len(installed), 1)
+		self.assertEqual(os.path.dirname(installed[0]), os.path.join(vDirPath, "inst"))
+		self.assertEqual(changes.paths(PROJECT_CHANGED), [vDirPath])
+
+if __name__ == "__main__":
+	unittest.main()
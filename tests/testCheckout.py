@@ -0,0 +1,52 @@
+import os, stat, unittest
+import utilities, chasm
+from tests import ProjectTestCase, writeFile, readFile
+
+class HardlinkCheckoutTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		utilities.setProjectSetting("Checkout", "hardlinks", True)
+		self.vDirPath = self.addVersionedFolder("asset", {"scene.ma": "v1", os.path.join("maps", "color.txt"): "red"})
+		self.stored = os.path.join(self.vDirPath, "src", "v1", "scene.ma")
+		# Test with hardlinks even where the filesystem could clone files
+		self.strategies = utilities.CHECKOUT_STRATEGIES
+		utilities.CHECKOUT_STRATEGIES = ["hardlink", "copy"]
+
+	def tearDown(self):
+		utilities.CHECKOUT_STRATEGIES = self.strategies
+		ProjectTestCase.tearDown(self)
+
+	def testHardlinksAreReadOnly(self):
+		changes = utilities.checkout(self.vDirPath, False)
+		self.assertTrue("hardlink" in changes.summary)
+		local = os.path.join(changes.paths(utilities.LOCAL_ADDED)[0], "scene.ma")
+		self.assertTrue(os.path.samefile(local, self.stored))
+		self.assertFalse(os.stat(local).st_mode & stat.S_IWUSR)
+
+	def testUnshareFile(self):
+		local = os.path.join(self.checkout(self.vDirPath, False), "scene.ma")
+		self.assertTrue(utilities.unshareFile(local))
+		self.assertFalse(os.path.samefile(local, self.stored))
+		self.assertTrue(os.stat(local).st_mode & stat.S_IWUSR)
+		writeFile(local, "mine")
+		self.assertEqual(readFile(self.stored), "v1")
+		self.assertFalse(utilities.unshareFile(local))
+
+	def testCommandLineCheckoutUnshares(self):
+		args = chasm._parser().parse_args(["checkout", self.vDirPath, "--no-lock"])
+		result, text = args.run(utilities, args)
+		local = os.path.join(self.userDir, os.path.basename(self.projectDir) + "_asset_1")
+		for name in ["scene.ma", os.path.join("maps", "color.txt")]:
+			self.assertEqual(os.stat(os.path.join(local, name)).st_nlink, 1)
+		self.assertEqual(utilities.unshareTree(local), 0)
+
+	def testCommandLineKeepLinks(self):
+		args = chasm._parser().parse_args(["checkout", self.vDirPath, "--no-lock", "--keep-links"])
+		args.run(utilities, args)
+		local = os.path.join(self.userDir, os.path.basename(self.projectDir) + "_asset_1")
+		self.assertTrue(os.path.samefile(os.path.join(local, "scene.ma"), self.stored))
+		self.assertEqual(utilities.unshareTree(local), 2)
+
+if __name__ == "__main__":
+	unittest.main()
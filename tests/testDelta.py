@@ -0,0 +1,57 @@
+import os, random, unittest
+import utilities
+from tests import ProjectTestCase, readFile
+
+class DeltaStorageTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		utilities.setProjectSetting("Storage", "mode", "delta")
+		utilities.setProjectSetting("Storage", "deltaThreshold", 1024)
+		utilities.setProjectSetting("Storage", "deltaBlockSize", 256)
+		rand = random.Random(7)
+		self.contents = ["".join([chr(rand.randint(0, 255)) for i in range(64 * 1024)])]
+		for i in range(2):
+			previous = self.contents[-1]
+			self.contents.append(previous[:1000] + "changed %d" % i + previous[1000:])
+		self.vDirPath = self.addVersionedFolder("prop", {"data.bin": self.contents[0]})
+		for contents in self.contents[1:]:
+			self.checkin(self.vDirPath, {"data.bin": contents})
+		self.waitForGarbageCollection()
+
+	def testOlderVersionsAreDeltas(self):
+		src = os.path.join(self.vDirPath, "src")
+		self.assertTrue(os.path.exists(os.path.join(src, "v1", "data.bin" + utilities.DELTA_EXT)))
+		self.assertTrue(os.path.exists(os.path.join(src, "v2", "data.bin" + utilities.DELTA_EXT)))
+		self.assertTrue(os.path.exists(os.path.join(src, "v3", "data.bin")))
+		self.assertEqual(sorted(os.listdir(os.path.join(src, utilities.DELTA_MARKER_DIR))), ["v0", "v1", "v2"])
+		self.assertEqual([n for n in os.listdir(src) if n.startswith(utilities.DELTA_TMP_PREFIX)], [])
+
+	def testStoppedPassIsResumed(self):
+		src = os.path.join(self.vDirPath, "src")
+		utilities._gcStopped.set()
+		try:
+			self.checkin(self.vDirPath, {"data.bin": self.contents[0]})
+			self.waitForGarbageCollection()
+			utilities.collectVersions(self.vDirPath)
+		finally:
+			utilities._gcStopped.clear()
+		self.assertFalse(os.path.exists(os.path.join(src, utilities.DELTA_MARKER_DIR, "v3")))
+		self.assertTrue(os.path.exists(os.path.join(src, "v3", "data.bin")))
+		utilities.collectVersions(self.vDirPath)
+		self.assertTrue(os.path.exists(os.path.join(src, utilities.DELTA_MARKER_DIR, "v3")))
+		self.assertTrue(os.path.exists(os.path.join(src, "v3", "data.bin" + utilities.DELTA_EXT)))
+		self.assertEqual(readFile(os.path.join(self.checkout(self.vDirPath, False, 3), "data.bin")), self.contents[2])
+
+	def testCheckoutCountsRebuiltSize(self):
+		statuses = []
+		local = utilities.checkout(self.vDirPath, False, statuses.append, 1).paths(utilities.LOCAL_ADDED)[0]
+		self.assertEqual(readFile(os.path.join(local, "data.bin")), self.contents[0])
+		size = len(self.contents[0])
+		self.assertEqual(statuses[-1].bytesTotal, size)
+		self.assertEqual(statuses[-1].bytesDone, size)
+		for status in statuses:
+			self.assertTrue(status.bytesDone <= status.bytesTotal)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,65 @@
+import os, time, threading, unittest
+import utilities, installQueue
+from tests import ProjectTestCase, readFile
+
+class InstallQueueTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.queue = utilities.getInstallQueue()
+		self.vDirPath = self.addVersionedFolder("prop")
+		self.jobId = self.queue.add(self.vDirPath, os.path.join(self.vDirPath, "src", "v0", "prop.txt"),
+			False, "copy")
+
+	def testCancelPendingJob(self):
+		def progress(status):
+			raise utilities.CancelledError("cancelled")
+		self.assertRaises(utilities.CancelledError, utilities.waitForInstall, self.jobId, progress)
+		self.assertEqual(self.queue.getJob(self.jobId), None)
+
+	def testCancelRunningJobIsRefused(self):
+		job = self.queue.claim(installQueue.DEFAULT_LIMITS, "elsewhere")
+		calls = []
+		def progress(status):
+			calls.append(status)
+			if len(calls) == 2:
+				self.queue.finish(job, "/installed/prop.txt")
+			raise utilities.CancelledError("cancelled")
+		self.assertEqual(utilities.waitForInstall(self.jobId, progress), "/installed/prop.txt")
+
+	def testRecoverStaleWaitsForLock(self):
+		job = self.queue.claim(installQueue.DEFAULT_LIMITS, "elsewhere")
+		old = time.time() - installQueue.STALE_AFTER - 10
+		os.utime(os.path.join(installQueue.queueDir(self.projectDir), installQueue.RUNNING, job["id"]), (old, old))
+		recovered = []
+		lock = self.queue._lock()
+		try:
+			thread = threading.Thread(target=lambda: recovered.append(self.queue.recoverStale()))
+			thread.start()
+			thread.join(0.3)
+			self.assertTrue(thread.isAlive())
+			self.assertEqual(self.queue.getJob(self.jobId)["state"], installQueue.RUNNING)
+		finally:
+			lock.close()
+		thread.join()
+		self.assertEqual(recovered, [1])
+		self.assertEqual(self.queue.getJob(self.jobId)["state"], installQueue.PENDING)
+
+class QueuedBatchInstallTest(ProjectTestCase):
+
+	def testBatchInstallUsesQueue(self):
+		utilities.setProjectSetting("InstallQueue", "enabled", True)
+		entries = []
+		for name in ["cup", "plate"]:
+			vDirPath = self.addVersionedFolder(name, {"notes.txt": name})
+			entries.append((vDirPath, os.path.join(vDirPath, "src", "v1", "notes.txt"), False))
+		report = utilities.batchInstall(entries)
+		self.assertEqual([error for v, src, installed, error in report], [None, None])
+		for (vDirPath, src, installed, error), name in zip(report, ["cup", "plate"]):
+			self.assertEqual(os.path.dirname(installed), os.path.join(vDirPath, "inst"))
+			self.assertEqual(readFile(installed), name)
+		done = utilities.getInstallQueue().jobs(installQueue.DONE)
+		self.assertEqual(sorted([job["vdirpath"] for job in done]), sorted([e[0] for e in entries]))
+
+if __name__ == "__main__":
+	unittest.main()
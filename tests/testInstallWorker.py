@@ -0,0 +1,69 @@
+import os, sys, time, shutil, tempfile, threading, unittest, StringIO
+import installWorker
+from tests import writeFile, readFile
+
+FAKE_INSTALLER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakeInstaller.py"), "--serve"]
+
+class InstallWorkerTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.root = tempfile.mkdtemp(prefix="chasmTest")
+		self.pool = installWorker.WorkerPool(FAKE_INSTALLER, 1, timeout=2)
+	
+	def tearDown(self):
+		self.pool.stop()
+		shutil.rmtree(self.root, ignore_errors=True)
+	
+	def source(self, contents):
+		path = os.path.join(self.root, contents)
+		writeFile(path, contents)
+		return path
+	
+	def target(self, name):
+		return os.path.join(self.root, "inst", name)
+	
+	def testInstall(self):
+		os.mkdir(os.path.join(self.root, "inst"))
+		self.pool.install(self.source("scene"), self.target("scene_0"))
+		self.assertEqual(readFile(self.target("scene_0")), "scene")
+		self.assertRaises(Exception, self.pool.install, self.source("fail"), self.target("fail_0"))
+	
+	def testResultAfterOutput(self):
+		os.mkdir(os.path.join(self.root, "inst"))
+		# The worker's own output is passed on to ours; keep it out of the test run
+		output = StringIO.StringIO()
+		stdout = sys.stdout
+		sys.stdout = output
+		try:
+			self.pool.install(self.source("noisy"), self.target("noisy_0"))
+		finally:
+			sys.stdout = stdout
+		self.assertEqual(readFile(self.target("noisy_0")), "noisy")
+		self.assertEqual(output.getvalue(), "Result: untitled\n")
+	
+	def testTimeout(self):
+		os.mkdir(os.path.join(self.root, "inst"))
+		start = time.time()
+		self.assertRaises(installWorker.WorkerTimeout, self.pool.install, self.source("hang"), self.target("hang_0"))
+		self.assertTrue(time.time() - start < 10)
+		# The next install gets a new process
+		self.pool.install(self.source("scene"), self.target("scene_0"))
+	
+	def testStopBusyWorker(self):
+		os.mkdir(os.path.join(self.root, "inst"))
+		errors = []
+		def install():
+			try:
+				self.pool.install(self.source("hang"), self.target("hang_0"))
+			except Exception, e:
+				errors.append(e)
+		thread = threading.Thread(target=install)
+		thread.start()
+		time.sleep(0.5)
+		self.pool.stop()
+		thread.join(5)
+		self.assertFalse(thread.isAlive())
+		self.assertEqual([type(e) for e in errors], [installWorker.WorkerCrashed])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,105 @@
+import os, time, threading, unittest
+import utilities, manifest
+from tests import ProjectTestCase, writeFile
+
+class ManifestTest(unittest.TestCase):
+	
+	def testDiff(self):
+		old = {"a": {"size": 1, "mtime": 10.0, "hash": "x"},
+			"b": {"size": 1, "mtime": 10.0, "hash": "y"},
+			"link": {"link": "a"}}
+		new = {"a": {"size": 1, "mtime": 20.0, "hash": "x"},
+			"b": {"size": 1, "mtime": 10.0, "hash": "z"},
+			"c": {"size": 2, "mtime": 10.0, "hash": "w"},
+			"link": {"link": "c"}}
+		self.assertEqual(manifest.diff(old, new), {"added": ["c"], "removed": [], "changed": ["b", "link"]})
+		self.assertEqual(manifest.diff(new, old), {"added": [], "removed": ["c"], "changed": ["b", "link"]})
+	
+	def testChangedWithoutHashes(self):
+		entry = {"size": 1, "mtime": 10.380714}
+		self.assertFalse(manifest.isChanged(entry, {"size": 1, "mtime": 10.380712}))
+		self.assertTrue(manifest.isChanged(entry, {"size": 1, "mtime": 11.0}))
+		self.assertTrue(manifest.isChanged(entry, {"size": 2, "mtime": 10.380714}))
+
+class HashReuseTest(ProjectTestCase):
+	
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.folder = os.path.join(self.root, "files")
+		writeFile(os.path.join(self.folder, "scene.ma"), "scene")
+		self.hashed = []
+	
+	def hashFile(self, path):
+		self.hashed.append(os.path.basename(path))
+		return utilities._hashFile(path)
+	
+	def testReusedDespiteMtimeDrift(self):
+		previous = manifest.build(self.folder, self.hashFile)
+		self.assertEqual(self.hashed, ["scene.ma"])
+		# A copy that kept the mtime through float seconds
+		previous["scene.ma"]["mtime"] -= 2e-6
+		files = manifest.build(self.folder, self.hashFile, previous)
+		self.assertEqual(self.hashed, ["scene.ma"])
+		self.assertEqual(files["scene.ma"]["hash"], previous["scene.ma"]["hash"])
+	
+	def testRehashedWhenChanged(self):
+		previous = manifest.build(self.folder, self.hashFile)
+		previous["scene.ma"]["mtime"] -= 1
+		manifest.build(self.folder, self.hashFile, previous)
+		self.assertEqual(self.hashed, ["scene.ma", "scene.ma"])
+
+class VersionManifestTest(ProjectTestCase):
+	
+	def testHistoryAndDiff(self):
+		vDirPath = self.addVersionedFolder("asset", {"scene.ma": "one", "notes.txt": "one"})
+		self.checkin(vDirPath, {"scene.ma": "two", "tex/wood.png": "wood"}, removed=["notes.txt"])
+		self.assertEqual(utilities.diffVersions(vDirPath, 1, 2),
+			{"added": ["tex/wood.png"], "removed": ["notes.txt"], "changed": ["scene.ma"]})
+		history = utilities.getVersionHistory(vDirPath)
+		self.assertEqual([(h["version"], h["files"], h["user"]) for h in history],
+			[(0, 0, "tester"), (1, 2, "tester"), (2, 2, "tester")])
+		self.assertEqual(history[2]["bytes"], len("two") + len("wood"))
+	
+	def testUnchangedFilesNotRehashed(self):
+		vDirPath = self.addVersionedFolder("asset", {"scene.ma": "one", "notes.txt": "one"})
+		hashFile = utilities._hashFile
+		hashed = []
+		def counting(path):
+			hashed.append(os.path.basename(path))
+			return hashFile(path)
+		utilities._hashFile = counting
+		try:
+			self.checkin(vDirPath, {"scene.ma": "two"})
+		finally:
+			utilities._hashFile = hashFile
+		self.assertEqual(hashed, ["scene.ma"])
+		self.assertEqual(utilities.diffVersions(vDirPath, 1, 2)["changed"], ["scene.ma"])
+
+	def testAvailableInstallFiles(self):
+		vDirPath = self.addVersionedFolder("asset", {"scene.ma": "one", os.path.join("tex", "wood.png"): "wood"})
+		latest = os.path.join(vDirPath, "src", "v1")
+		expected = [os.path.join(latest, "scene.ma"), os.path.join(latest, "tex")]
+		self.assertEqual(utilities.getAvailableInstallFiles(vDirPath), expected)
+		# A version checked in before manifests: listed without hashing it here
+		manifestPath = utilities._manifestPath(vDirPath, 1)
+		os.remove(manifestPath)
+		hashFile = utilities._hashFile
+		callers = []
+		def recording(path):
+			callers.append(threading.current_thread())
+			return hashFile(path)
+		utilities._hashFile = recording
+		try:
+			self.assertEqual(utilities.getAvailableInstallFiles(vDirPath), expected)
+			deadline = time.time() + 10
+			while not os.path.exists(manifestPath) and time.time() < deadline:
+				time.sleep(0.05)
+		finally:
+			utilities._hashFile = hashFile
+		self.assertTrue(os.path.exists(manifestPath))
+		self.assertTrue(callers)
+		self.assertFalse(threading.current_thread() in callers)
+		self.assertEqual(utilities.getAvailableInstallFiles(vDirPath), expected)
+
+if __name__ == "__main__":
+	unittest.main()
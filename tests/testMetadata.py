@@ -0,0 +1,37 @@
+import os, unittest
+import utilities, metadata
+from tests import ProjectTestCase, readFile
+
+class CompactMetadataTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.vDirPath = self.addVersionedFolder("asset", {"notes.txt": "v1"})
+		self.local = self.checkout(self.vDirPath)
+		self.nodeInfo = os.path.join(self.vDirPath, ".nodeInfo")
+		# A value that ConfigParser would try to interpolate
+		cp = metadata.read(self.nodeInfo)
+		cp.set("Node", "comment", "50%(done)s, 100% soon")
+		utilities._writeConfigFile(self.nodeInfo, cp)
+
+	def testDumpsKeepsValues(self):
+		cp = metadata.read(self.nodeInfo)
+		data = metadata.dumps(cp)
+		self.assertTrue(metadata.isCompact(data))
+		converted = metadata.loads(data)
+		for section in cp.sections():
+			self.assertEqual(converted.items(section, raw=True), cp.items(section, raw=True))
+
+	def testMigrateAndRollback(self):
+		files = [self.nodeInfo, os.path.join(self.local, ".checkoutInfo")]
+		before = [readFile(path) for path in files]
+		self.assertEqual(utilities.convertMetadata(self.root, True), 2)
+		self.assertEqual([metadata.fileFormat(path) for path in files], [metadata.COMPACT] * 2)
+		self.assertEqual(metadata.read(self.nodeInfo).get("Node", "comment", raw=True), "50%(done)s, 100% soon")
+		self.assertEqual(utilities.getNode(self.vDirPath)["latestversion"], 1)
+		self.assertEqual(utilities.convertMetadata(self.root, True), 0)
+		self.assertEqual(utilities.convertMetadata(self.root, False), 2)
+		self.assertEqual([readFile(path) for path in files], before)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,77 @@
+import os, unittest
+import utilities
+from tests import ProjectTestCase, writeFile
+
+class MetadataCacheTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.cache = utilities.MetadataCache(2)
+		self.loads = []
+
+	def load(self, path):
+		self.loads.append(path)
+		f = open(path)
+		try:
+			return f.read()
+		finally:
+			f.close()
+
+	def newFile(self, name, contents):
+		path = os.path.join(self.root, name)
+		writeFile(path, contents)
+		return path
+
+	def testHitAndMiss(self):
+		path = self.newFile("a", "one")
+		self.assertEqual(self.cache.get(path, self.load), "one")
+		self.assertEqual(self.cache.get(path, self.load), "one")
+		self.assertEqual(self.loads, [path])
+		self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1, "maxSize": 2})
+
+	def testChangedFileIsReloaded(self):
+		path = self.newFile("a", "one")
+		self.cache.get(path, self.load)
+		# Replaced by rename like the metadata files, so st_ino changes
+		os.rename(self.newFile("a.tmp", "two"), path)
+		self.assertEqual(self.cache.get(path, self.load), "two")
+		self.assertEqual(self.cache.stats()["misses"], 2)
+
+	def testLeastRecentlyUsedIsEvicted(self):
+		a, b, c = [self.newFile(n, n) for n in "abc"]
+		self.cache.get(a, self.load)
+		self.cache.get(b, self.load)
+		# a is now more recent than b
+		self.cache.get(a, self.load)
+		self.cache.get(c, self.load)
+		self.assertEqual(self.cache.stats()["size"], 2)
+		del self.loads[:]
+		self.cache.get(a, self.load)
+		self.cache.get(c, self.load)
+		self.assertEqual(self.loads, [])
+		self.cache.get(b, self.load)
+		self.assertEqual(self.loads, [b])
+
+	def testShrinking(self):
+		a, b = [self.newFile(n, n) for n in "ab"]
+		self.cache.get(a, self.load)
+		self.cache.get(b, self.load)
+		self.cache.setMaxSize(1)
+		del self.loads[:]
+		self.cache.get(b, self.load)
+		self.assertEqual(self.loads, [])
+		self.cache.get(a, self.load)
+		self.assertEqual(self.loads, [a])
+
+	def testMissingFile(self):
+		self.assertRaises(OSError, self.cache.get, os.path.join(self.root, "missing"), self.load)
+		self.assertEqual(self.loads, [])
+
+	def testNodeInfoChangesAreSeen(self):
+		vDirPath = self.addVersionedFolder("asset")
+		self.assertEqual(utilities.getNode(vDirPath)["latestversion"], 0)
+		self.checkin(vDirPath, {"notes.txt": "v1"})
+		self.assertEqual(utilities.getNode(vDirPath)["latestversion"], 1)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,99 @@
+import os, shutil, unittest
+import utilities, nodeIndex
+from tests import ProjectTestCase, writeFile
+
+class HasInstalledChildTest(ProjectTestCase):
+	
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.folder = utilities.addProjectFolder(self.projectDir, "shots").paths(utilities.PROJECT_ADDED)[0]
+		self.vDirPath = utilities.addVersionedFolder(self.folder, "asset").paths(utilities.PROJECT_ADDED)[0]
+	
+	def testIndexCreated(self):
+		self.assertFalse(nodeIndex.exists(self.projectDir))
+		self.assertFalse(utilities.hasInstalledChild(self.folder))
+		self.assertTrue(nodeIndex.exists(self.projectDir))
+		local = self.checkout(self.vDirPath)
+		self.assertTrue(utilities.hasInstalledChild(self.folder))
+		self.assertEqual(utilities._getIndex().getCounts(self.folder), (0, 1))
+		utilities.discard(local)
+		self.assertFalse(utilities.hasInstalledChild(self.folder))
+		self.assertTrue(utilities.canRename(self.folder))
+	
+	def testWithoutIndex(self):
+		utilities.setProjectSetting("Index", "autoCreate", False)
+		self.checkout(self.vDirPath)
+		self.assertTrue(utilities.hasInstalledChild(self.folder))
+		self.assertFalse(utilities.canRemove(self.folder))
+		self.assertFalse(nodeIndex.exists(self.projectDir))
+
+class RefreshIndexesTest(ProjectTestCase):
+	
+	def testChangesMadeElsewhere(self):
+		utilities.rebuildIndex(self.projectDir)
+		self.assertEqual(utilities.searchProject("deep"), [])
+		deep = os.path.join(self.projectDir, "outside", "deep")
+		os.makedirs(deep)
+		utilities.refreshIndexes(self.projectDir)
+		self.assertEqual(utilities.getProjectChildren(self.projectDir), [(os.path.dirname(deep), True)])
+		self.assertEqual(utilities.getNode(deep)["isdir"], True)
+		self.assertEqual(utilities.searchProject("deep"), [deep])
+		os.rmdir(deep)
+		utilities.refreshIndexes(os.path.dirname(deep))
+		self.assertEqual(utilities.getNode(deep), None)
+		self.assertEqual(utilities.searchProject("deep"), [])
+
+	def testListingSeesFoldersMadeElsewhere(self):
+		utilities.rebuildIndex(self.projectDir)
+		outside = os.path.join(self.projectDir, "outside")
+		os.mkdir(outside)
+		self.assertEqual(utilities.getProjectChildren(self.projectDir), [(outside, True)])
+		self.assertEqual(utilities.getNode(outside)["isdir"], True)
+
+	def testParentsMadeElsewhereAreIndexed(self):
+		utilities.rebuildIndex(self.projectDir)
+		props = os.path.join(self.projectDir, "props")
+		os.mkdir(props)
+		cup = utilities.addVersionedFolder(props, "cup").paths(utilities.PROJECT_ADDED)[0]
+		self.assertEqual(utilities._getIndex().getChildren(self.projectDir)[0]["path"], props)
+		self.assertEqual(utilities.getProjectChildren(self.projectDir), [(props, True)])
+		self.checkout(cup)
+		self.assertTrue(utilities.hasInstalledChild(props))
+		self.assertTrue(utilities.hasInstalledChild(self.projectDir))
+
+	def testRebuildIndexes(self):
+		utilities.rebuildIndex(self.projectDir)
+		deep = os.path.join(self.projectDir, "outside", "deep")
+		os.makedirs(deep)
+		utilities.rebuildIndexes()
+		self.assertEqual(utilities.getNode(deep)["isdir"], True)
+		self.assertEqual(utilities.searchProject("deep"), [deep])
+
+class BrokenNodeInfoTest(ProjectTestCase):
+	
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.vDirPath = utilities.addVersionedFolder(self.projectDir, "asset").paths(utilities.PROJECT_ADDED)[0]
+		utilities.rebuildIndex(self.projectDir)
+	
+	def testIncompleteNodeInfo(self):
+		writeFile(os.path.join(self.vDirPath, ".nodeInfo"), "[Node]\ntype = asset\n")
+		self.assertFalse(utilities._nodeRecord(self.vDirPath)["versioned"])
+		utilities.refreshIndexes(self.vDirPath)
+		self.assertFalse(utilities.getNode(self.vDirPath)["versioned"])
+	
+	def testCheckinIntoRemovedFolder(self):
+		local = self.checkout(self.vDirPath)
+		shutil.rmtree(self.vDirPath)
+		utilities.refreshIndexes(self.projectDir)
+		self.assertEqual(utilities.getNode(self.vDirPath), None)
+		self.assertRaises(Exception, utilities.canCheckin, local)
+		try:
+			utilities.canCheckin(local)
+		except TypeError:
+			self.fail("canCheckin indexed a missing node")
+		except Exception:
+			pass
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,102 @@
+import os, unittest
+import utilities
+from tests import ProjectTestCase, writeFile
+
+class InterleavedCheckoutTest(ProjectTestCase):
+	"""A second artist checks out while the first one's files are being copied"""
+	
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.vDirPath = self.addVersionedFolder("asset", {"scene.ma": "v1"})
+		self.otherDir = os.path.join(self.root, "other")
+		os.makedirs(self.otherDir)
+	
+	def checkoutDuringCopy(self, lock, otherLock):
+		"""
+		Checks out vDirPath as tester; while the files are copied "other"
+		checks it out with otherLock.
+		"""
+		others = []
+		def progress(status):
+			if not others:
+				self.configure("other", self.otherDir)
+				try:
+					others.append(utilities.checkout(self.vDirPath, otherLock))
+				finally:
+					self.configure("tester")
+		return utilities.checkout(self.vDirPath, lock, progress)
+	
+	def testCheckoutKeepsLock(self):
+		self.checkoutDuringCopy(False, True)
+		nodeInfo = utilities._readNodeInfo(self.vDirPath)
+		self.assertEqual(nodeInfo.get("Versioning", "locked"), "True")
+		self.assertEqual(nodeInfo.get("Versioning", "lastcheckoutuser"), "other")
+	
+	def testCheckoutWithoutLockLeavesNodeInfo(self):
+		generation = utilities.getGeneration(utilities._readNodeInfo(self.vDirPath))
+		changes = utilities.checkout(self.vDirPath, False)
+		nodeInfo = utilities._readNodeInfo(self.vDirPath)
+		self.assertEqual(utilities.getGeneration(nodeInfo), generation)
+		self.assertEqual(nodeInfo.get("Versioning", "locked"), "False")
+		self.assertEqual(changes.paths(utilities.PROJECT_CHANGED), [])
+	
+	def testLockingCheckoutsConflict(self):
+		self.assertRaises(Exception, self.checkoutDuringCopy, True, True)
+		nodeInfo = utilities._readNodeInfo(self.vDirPath)
+		self.assertEqual(nodeInfo.get("Versioning", "lastcheckoutuser"), "other")
+		self.assertEqual(os.listdir(self.userDir), [])
+
+	def testCheckinDuringLockingCheckout(self):
+		copies = []
+		copyTree = utilities.copyTree
+		def countCopies(src, dst, *args):
+			copies.append(dst)
+			return copyTree(src, dst, *args)
+		def progress(status):
+			if len(copies) == 1:
+				self.configure("other", self.otherDir)
+				try:
+					self.checkin(self.vDirPath, {"scene.ma": "v2"})
+				finally:
+					self.configure("tester")
+		utilities.copyTree = countCopies
+		try:
+			self.assertRaises(Exception, utilities.checkout, self.vDirPath, True, progress)
+		finally:
+			utilities.copyTree = copyTree
+		# The version is not copied again for the failed checkout
+		self.assertEqual(len([dst for dst in copies if dst.startswith(self.userDir)]), 1)
+		self.assertEqual(os.listdir(self.userDir), [])
+		nodeInfo = utilities._readNodeInfo(self.vDirPath)
+		self.assertEqual(nodeInfo.get("Versioning", "locked"), "False")
+		self.assertEqual(nodeInfo.get("Versioning", "latestversion"), "2")
+
+class NodeInfoUpdateTest(ProjectTestCase):
+	
+	def testStaleGeneration(self):
+		vDirPath = self.addVersionedFolder("asset")
+		generation = utilities.getGeneration(utilities._readNodeInfo(vDirPath))
+		utilities._updateNodeInfo(vDirPath, lambda nodeInfo: None)
+		self.assertRaises(utilities.NodeInfoConflict, utilities._updateNodeInfo,
+			vDirPath, lambda nodeInfo: None, generation)
+	
+	def testFailedCheckinLeavesNoVersion(self):
+		vDirPath = self.addVersionedFolder("asset")
+		local = self.checkout(vDirPath)
+		writeFile(os.path.join(local, "scene.ma"), "v1")
+		writeMetadataFile = utilities._writeMetadataFile
+		def fail(filePath, configParser):
+			if filePath.endswith(".nodeInfo"):
+				raise IOError("disk full")
+			writeMetadataFile(filePath, configParser)
+		utilities._writeMetadataFile = fail
+		try:
+			self.assertRaises(IOError, utilities.checkin, local)
+		finally:
+			utilities._writeMetadataFile = writeMetadataFile
+		srcDir = os.path.join(vDirPath, "src")
+		self.assertEqual(sorted(os.listdir(srcDir)), [utilities.MANIFEST_DIR, "v0"])
+		self.assertEqual(utilities._readNodeInfo(vDirPath).get("Versioning", "latestversion"), "0")
+
+if __name__ == "__main__":
+	unittest.main()
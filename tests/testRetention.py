@@ -0,0 +1,96 @@
+import os, sys, time, tempfile, subprocess, unittest
+import utilities, manifest, metadata
+from tests import ProjectTestCase, writeFile
+
+class RetentionTest(ProjectTestCase):
+	
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		utilities.setProjectSetting("Retention", "gcRate", 0)
+		self.vDirPath = self.addVersionedFolder("asset")
+		for i in range(1, 9):
+			self.checkin(self.vDirPath, {"notes.txt": "v%d" % i})
+		self.waitForGarbageCollection()
+		self.srcDir = os.path.join(self.vDirPath, "src")
+	
+	def versions(self):
+		return utilities._versionNumbers(self.srcDir)
+	
+	def testDefaultKeepsLastSix(self):
+		self.assertEqual(self.versions(), [3, 4, 5, 6, 7, 8])
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [])
+	
+	def testKeepLast(self):
+		utilities.setRetentionPolicy(self.vDirPath, keepLast=2)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 4, 5, 6])
+		utilities.collectVersions(self.vDirPath)
+		self.assertEqual(self.versions(), [7, 8])
+		self.assertEqual([n for n in os.listdir(self.srcDir) if n.startswith(utilities.TRASH_PREFIX)], [])
+	
+	def testPinnedAndInstalled(self):
+		utilities.pinVersion(self.vDirPath, 4)
+		utilities.install(self.vDirPath, os.path.join(self.srcDir, "v5", "notes.txt"), False)
+		utilities.setRetentionPolicy(self.vDirPath, keepLast=1)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 6, 7])
+		utilities.setRetentionPolicy(self.vDirPath, keepInstalled=False)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 5, 6, 7])
+		utilities.pinVersion(self.vDirPath, 4, False)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 4, 5, 6, 7])
+	
+	def testKeepDays(self):
+		utilities.setRetentionPolicy(self.vDirPath, keepLast=1, keepDays=1)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [])
+		# Checked in two days ago, although vN itself was just written
+		for v in [3, 4, 5]:
+			path = utilities._manifestPath(self.vDirPath, v)
+			m = manifest.read(path)
+			m["time"] = metadata.formatTime(time.time() - 2 * 86400)
+			manifest.write(path, m)
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 4, 5])
+		# Without a recorded time only the other rules keep a version
+		os.remove(utilities._manifestPath(self.vDirPath, 6))
+		self.assertEqual(utilities.expiredVersions(self.vDirPath), [3, 4, 5, 6])
+	
+	def testLeftoversRemoved(self):
+		trash = tempfile.mkdtemp(prefix=utilities.TRASH_PREFIX, dir=self.srcDir)
+		writeFile(os.path.join(trash, "v", "notes.txt"), "old")
+		archiveDir = os.path.join(self.srcDir, utilities.ARCHIVE_DIR)
+		os.mkdir(archiveDir)
+		stale = tempfile.mkdtemp(prefix=".", dir=archiveDir)
+		fresh = tempfile.mkdtemp(prefix=".", dir=archiveDir)
+		old = time.time() - utilities.LEFTOVER_AGE - 60
+		os.utime(stale, (old, old))
+		utilities.collectGarbage(self.projectDir)
+		self.assertFalse(os.path.exists(trash))
+		self.assertFalse(os.path.exists(stale))
+		# Could still be written by someone else
+		self.assertTrue(os.path.exists(fresh))
+
+class ExitTest(ProjectTestCase):
+	
+	def testExitLeavesTheRestForTheNextPass(self):
+		vDirPath = self.addVersionedFolder("asset")
+		utilities.setRetentionPolicy(vDirPath, keepLast=1)
+		# Emptying the trash would take minutes at this rate
+		utilities.setProjectSetting("Retention", "gcRate", 1000)
+		script = "\n".join(["import utilities",
+			"utilities.configureProject(%r)" % self.configFile,
+			"for i in range(3):",
+			"	local = utilities.checkout(%r, True).paths(utilities.LOCAL_ADDED)[0]" % vDirPath,
+			"	open(local + '/notes.txt', 'w').write(str(i) * 100000)",
+			"	utilities.checkin(local)"])
+		root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		start = time.time()
+		process = subprocess.Popen([sys.executable, "-c", script], cwd=root,
+			stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+		output = process.communicate()[0]
+		self.assertEqual(process.returncode, 0, output)
+		self.assertEqual(output, "")
+		self.assertTrue(time.time() - start < 30)
+		srcDir = os.path.join(vDirPath, "src")
+		self.assertNotEqual(sorted(os.listdir(srcDir)), [utilities.MANIFEST_DIR, "v3"])
+		utilities.collectVersions(vDirPath, 0)
+		self.assertEqual(sorted(os.listdir(srcDir)), [utilities.MANIFEST_DIR, "v3"])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,52 @@
+import os, unittest
+import search
+
+def node(locked=None, checkinUser=None, installed=False):
+	return {"versioned": True, "isdir": True, "locked": locked is not None, "lastcheckoutuser": locked,
+		"lastcheckinuser": checkinUser, "installed": installed}
+
+class SearchIndexTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.index = search.SearchIndex("/project")
+		self.index.replaceAll([
+			("/project/props", {"isdir": True}),
+			("/project/props/chair", node(locked="ann", checkinUser="bob", installed=True)),
+			("/project/props/chairs", node(checkinUser="ann")),
+			("/project/props/armchair", node(checkinUser="bob")),
+			("/project/sets/kitchen/chair", node()),
+			("/project/sets/kitchen/table", node(installed=True))])
+	
+	def search(self, text):
+		query, filters = search.parseQuery(text)
+		return [os.path.relpath(p, "/project") for p in self.index.search(query, **filters)]
+	
+	def testRanking(self):
+		# Equal names first, then names starting with the word, then shorter paths
+		self.assertEqual(self.search("chair"), ["props/chair", "sets/kitchen/chair", "props/chairs", "props/armchair"])
+		self.assertEqual(self.search("CH"), ["props/chair", "props/chairs", "sets/kitchen/chair"])
+		self.assertEqual(self.search("kitchen chair"), ["sets/kitchen/chair"])
+	
+	def testFilters(self):
+		self.assertEqual(self.search("chair locked:ann"), ["props/chair"])
+		self.assertEqual(self.search("by:bob"), ["props/chair", "props/armchair"])
+		self.assertEqual(self.search("installed:yes"), ["props/chair", "sets/kitchen/table"])
+		self.assertEqual(self.search("chair installed:no by:ann"), ["props/chairs"])
+	
+	def testLimit(self):
+		self.assertEqual(len(self.index.search("chair", limit=2)), 2)
+	
+	def testTreeChanges(self):
+		self.assertEqual(sorted(self.index.getChildren("/project/props")),
+			["/project/props/armchair", "/project/props/chair", "/project/props/chairs"])
+		self.index.renameTree("/project/sets/kitchen", "/project/sets/diner")
+		self.assertEqual(self.search("diner chair"), ["sets/diner/chair"])
+		self.assertEqual(sorted(self.index.getChildren("/project/sets/diner")), ["/project/sets/diner/chair", "/project/sets/diner/table"])
+		self.index.removeTree("/project/props")
+		self.assertEqual(self.search("chair"), ["sets/diner/chair"])
+		self.assertEqual(self.index.getChildren("/project/props"), [])
+		self.index.put("/project/props/chair", node())
+		self.assertEqual(self.search("chair"), ["props/chair", "sets/diner/chair"])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,46 @@
+import os, shutil, stat, unittest
+import utilities
+from tests import ProjectTestCase, readFile
+
+class DedupStorageTest(ProjectTestCase):
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		utilities.setProjectSetting("Storage", "mode", "dedup")
+		self.vDirPath = self.addVersionedFolder("asset", {"a.txt": "same", "b.txt": "b1"})
+		self.checkin(self.vDirPath, {"b.txt": "b2"})
+		self.srcDir = os.path.join(self.vDirPath, "src")
+
+	def stored(self, version, name):
+		return os.path.join(self.srcDir, "v%d" % version, name)
+
+	def blob(self, contents):
+		digest = utilities.hashlib.sha1(contents).hexdigest()
+		return os.path.join(utilities._blobDir(), digest[:2], digest[2:])
+
+	def testVersionsLinkToBlobs(self):
+		for version, name, contents in [(1, "a.txt", "same"), (1, "b.txt", "b1"), (2, "a.txt", "same"), (2, "b.txt", "b2")]:
+			self.assertTrue(os.path.samefile(self.stored(version, name), self.blob(contents)))
+			self.assertFalse(os.stat(self.stored(version, name)).st_mode & stat.S_IWUSR)
+		self.assertEqual(os.stat(self.blob("same")).st_nlink, 3)
+
+	def testSameContentsInAnotherFolder(self):
+		other = self.addVersionedFolder("other", {"copy.txt": "same"})
+		self.assertTrue(os.path.samefile(os.path.join(other, "src", "v1", "copy.txt"), self.blob("same")))
+
+	def testCheckoutIsWritable(self):
+		local = self.checkout(self.vDirPath, False)
+		path = os.path.join(local, "a.txt")
+		self.assertEqual(readFile(path), "same")
+		self.assertFalse(os.path.samefile(path, self.blob("same")))
+		self.assertTrue(os.access(path, os.W_OK))
+
+	def testBlobGarbage(self):
+		shutil.rmtree(os.path.join(self.srcDir, "v1"))
+		self.assertEqual(utilities.collectBlobGarbage(0), len("b1"))
+		self.assertFalse(os.path.exists(self.blob("b1")))
+		self.assertTrue(os.path.exists(self.blob("same")))
+		self.assertEqual(utilities.collectBlobGarbage(3600), 0)
+
+if __name__ == "__main__":
+	unittest.main()
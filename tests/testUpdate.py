@@ -0,0 +1,57 @@
+import os, unittest
+import utilities
+from tests import ProjectTestCase, writeFile, readFile
+
+class UpdateCheckoutTest(ProjectTestCase):
+	"""tester works on version 1 while someone else checks in version 2"""
+
+	def setUp(self):
+		ProjectTestCase.setUp(self)
+		self.vDirPath = self.addVersionedFolder("asset", {"a.txt": "a1", "b.txt": "b1", "c.txt": "c1"})
+		self.local = self.checkout(self.vDirPath, False)
+		otherDir = os.path.join(self.root, "other")
+		os.makedirs(otherDir)
+		self.configure("other", otherDir)
+		self.checkin(self.vDirPath, {"a.txt": "a2", "d.txt": "d2"}, removed=["c.txt"])
+		self.configure("tester")
+
+	def testUpdate(self):
+		self.assertTrue(utilities.canUpdate(self.local))
+		update = utilities.getCheckoutUpdate(self.local)
+		self.assertEqual((update["version"], update["latest"]), (1, 2))
+		self.assertEqual((update["added"], update["changed"], update["removed"]), (["d.txt"], ["a.txt"], ["c.txt"]))
+		self.assertEqual(update["conflicts"], [])
+		writeFile(os.path.join(self.local, "b.txt"), "mine")
+		changes = utilities.updateCheckout(self.local)
+		self.assertEqual(changes.paths(utilities.LOCAL_CHANGED), [self.local])
+		self.assertEqual(readFile(os.path.join(self.local, "a.txt")), "a2")
+		self.assertEqual(readFile(os.path.join(self.local, "b.txt")), "mine")
+		self.assertEqual(readFile(os.path.join(self.local, "d.txt")), "d2")
+		self.assertFalse(os.path.exists(os.path.join(self.local, "c.txt")))
+		self.assertFalse(utilities.canUpdate(self.local))
+		self.assertEqual(utilities.getCheckoutInfo(self.local).getint("Checkout", "version"), 2)
+
+	def testConflicts(self):
+		writeFile(os.path.join(self.local, "a.txt"), "mine")
+		writeFile(os.path.join(self.local, "c.txt"), "mine")
+		writeFile(os.path.join(self.local, "d.txt"), "mine")
+		self.assertEqual(utilities.getCheckoutUpdate(self.local)["conflicts"], ["a.txt", "c.txt", "d.txt"])
+		try:
+			utilities.updateCheckout(self.local)
+			self.fail("UpdateConflict not raised")
+		except utilities.UpdateConflict, e:
+			self.assertEqual(e.paths, ["a.txt", "c.txt", "d.txt"])
+		# Nothing was changed
+		self.assertEqual(readFile(os.path.join(self.local, "a.txt")), "mine")
+		self.assertEqual(utilities.getCheckoutInfo(self.local).getint("Checkout", "version"), 1)
+		self.assertEqual([n for n in os.listdir(self.local) if n.startswith(utilities.UPDATE_STAGING_PREFIX)], [])
+
+	def testSameChangeIsNoConflict(self):
+		writeFile(os.path.join(self.local, "a.txt"), "a2")
+		writeFile(os.path.join(self.local, "d.txt"), "d2")
+		self.assertEqual(utilities.getCheckoutUpdate(self.local)["conflicts"], [])
+		utilities.updateCheckout(self.local)
+		self.assertEqual(readFile(os.path.join(self.local, "a.txt")), "a2")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,176 @@
+"""
+Opt-in timing of asset manager operations. While tracing is enabled every
+call of an instrumented function is recorded as a span; spans on one thread
+nest. Spans can be written as a Chrome trace (open chrome://tracing or
+https://ui.perfetto.dev and load the file) and summarized as p50/p95
+latencies over the last SUMMARY_WINDOW calls of each operation.
+
+Enable it with the CHASM_TRACE environment variable, set to the file the
+trace is written to when the program exits (or to 1 for a file in the temp
+directory), or with [Trace] enabled = True in .projectInfo.
+When tracing is off an instrumented function costs one extra call.
+"""
+
+import os, sys, time, json, threading, collections, functools, tempfile, atexit
+
+ENV = "CHASM_TRACE"
+# Oldest spans are dropped beyond this many
+MAX_EVENTS = 200000
+SUMMARY_WINDOW = 1000
+
+_enabled = False
+_traceFile = None
+_events = collections.deque(maxlen=MAX_EVENTS)
+_durations = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+def isEnabled():
+	return _enabled
+
+def enable(traceFile=None):
+	"""
+	@precondition: traceFile is where the trace is written at exit, or None for
+		the one given before or a file in the temp directory
+	"""
+	global _enabled, _traceFile
+	_enabled = True
+	if traceFile is not None:
+		_traceFile = traceFile
+	elif _traceFile is None:
+		_traceFile = os.path.join(tempfile.gettempdir(), "chasmTrace-%d.json" % os.getpid())
+
+def disable():
+	global _enabled
+	_enabled = False
+
+def clear():
+	with _lock:
+		_events.clear()
+		_durations.clear()
+
+def _stack():
+	stack = getattr(_local, "stack", None)
+	if stack is None:
+		stack = _local.stack = []
+	return stack
+
+class Span:
+	"""Use span()"""
+	def __init__(self, name, **args):
+		self.name = name
+		self.args = args
+
+	def __enter__(self):
+		if _enabled:
+			_stack().append(self)
+			self._start = time.time()
+		return self
+
+	def __exit__(self, excType, exc, tb):
+		if not _enabled or not hasattr(self, "_start"):
+			return False
+		duration = time.time() - self._start
+		stack = _stack()
+		if stack and stack[-1] is self:
+			stack.pop()
+		if excType is not None:
+			self.args["error"] = excType.__name__
+		with _lock:
+			_events.append((self.name, self._start, duration, threading.current_thread().ident, self.args))
+			if self.name not in _durations:
+				_durations[self.name] = collections.deque(maxlen=SUMMARY_WINDOW)
+			_durations[self.name].append(duration)
+		return False
+
+def span(name, **args):
+	"""
+	Records the time spent in a with block as the span name, e.g.
+		with tracing.span("subprocess", command="mayapy"):
+	args end up in the Chrome trace.
+	"""
+	return Span(name, **args)
+
+def addCounts(**counts):
+	"""Adds counts, e.g. files=3, bytes=1024, to every open span of this thread"""
+	if not _enabled:
+		return
+	for s in _stack():
+		for key, value in counts.items():
+			s.args[key] = s.args.get(key, 0) + value
+
+def traced(func, name=None):
+	"""@returns: func, recorded as a span called name (func.__name__ by default) while tracing is enabled"""
+	name = name or func.__name__
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		if not _enabled:
+			return func(*args, **kwargs)
+		with span(name):
+			return func(*args, **kwargs)
+	wrapper._traced = True
+	return wrapper
+
+def instrument(namespace, include, prefix):
+	"""
+	Replaces the functions defined in the module whose globals() are
+	namespace, and whose names pass include(name), with traced() versions.
+	@precondition: prefix names the module in span names, e.g. "utilities."
+	"""
+	moduleName = namespace["__name__"]
+	for name, value in namespace.items():
+		if (callable(value) and getattr(value, "__module__", None) == moduleName and
+				hasattr(value, "func_code") and not getattr(value, "_traced", False) and include(name)):
+			namespace[name] = traced(value, prefix + name)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Results
+def _percentile(ordered, fraction):
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summary():
+	"""@returns: {span name: {"count", "p50", "p95", "max"}} in seconds, over the last SUMMARY_WINDOW spans"""
+	with _lock:
+		durations = [(name, sorted(d)) for name, d in _durations.items()]
+	result = {}
+	for name, ordered in durations:
+		result[name] = {"count": len(ordered), "p50": _percentile(ordered, 0.5),
+			"p95": _percentile(ordered, 0.95), "max": ordered[-1]}
+	return result
+
+def formatSummary():
+	lines = ["%-44s %7s %10s %10s %10s" % ("operation", "count", "p50 ms", "p95 ms", "max ms")]
+	stats = summary()
+	for name in sorted(stats, key=lambda n: -stats[n]["p95"]):
+		s = stats[name]
+		lines.append("%-44s %7d %10.3f %10.3f %10.3f" % (name, s["count"], s["p50"] * 1000,
+			s["p95"] * 1000, s["max"] * 1000))
+	return "\n".join(lines)
+
+def exportChromeTrace(path):
+	"""Writes the recorded spans in the Chrome trace event format"""
+	with _lock:
+		events = list(_events)
+	pid = os.getpid()
+	trace = [{"name": name, "ph": "X", "ts": int(start * 1e6), "dur": int(duration * 1e6),
+		"pid": pid, "tid": tid, "args": args} for name, start, duration, tid, args in events]
+	out = open(path, "w")
+	try:
+		json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, out)
+	finally:
+		out.close()
+
+def _exportAtExit():
+	if _traceFile is None or not _events:
+		return
+	try:
+		exportChromeTrace(_traceFile)
+		sys.stderr.write("Trace written to " + _traceFile + "\n" + formatSummary() + "\n")
+	except (IOError, OSError), e:
+		sys.stderr.write("Could not write trace: " + str(e) + "\n")
+
+if os.environ.get(ENV):
+	if os.environ[ENV] == "1":
+		enable()
+	else:
+		enable(os.path.abspath(os.environ[ENV]))
+atexit.register(_exportAtExit)
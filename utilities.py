@@ -3,9 +3,17 @@ This module contains functionality to manage the animation project.
 @author: Morgan Strong, Brian Kingery
 """
 
-import os, time, shutil, glob, project
-from ConfigParser import ConfigParser
-from subprocess import call
+import os, time, shutil, glob, stat, errno, fcntl, atexit, hashlib, tempfile, threading, Queue, collections, project, metadata, tracing, manifest
+from ConfigParser import ConfigParser, Error as ConfigParserError
+from subprocess import call, Popen
+try:
+	from os import scandir as _scandir
+except ImportError:
+	# python < 3.5 only has scandir as a separate package
+	try:
+		from scandir import scandir as _scandir
+	except ImportError:
+		_scandir = None
 
 # The project object is just a container to store persistent
 # project information.
@@ -36,15 +44,36 @@ def getNullReference():
 		nullRef.close()
 	return os.path.join(getProjectDir(), '.nullReference')
 
-def _writeConfigFile(filePath, configParser):
+def _writeConfigFile(filePath, configParser, compact=False):
 	"""
 	Will update the config file specified by filePath with the contents of configParser
 	@precondition: filePath is a valid path
 	@precondition: confgParser is an instance of ConfigParser()
+	@precondition: compact is True to write metadata.dumps(configParser) instead of an ini file
+	@postcondition: The file is replaced in one step, readers see either the old or the new contents
 	"""
-	configFile = open(filePath, 'wb')
-	configParser.write(configFile)
-def _configureProject(parms, file_name):
+	fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(filePath)))
+	try:
+		configFile = os.fdopen(fd, 'wb')
+		try:
+			if compact:
+				configFile.write(metadata.dumps(configParser))
+			else:
+				configParser.write(configFile)
+			configFile.flush()
+			os.fsync(configFile.fileno())
+		finally:
+			configFile.close()
+		os.chmod(tmp, 0666 & ~_UMASK)
+		os.rename(tmp, filePath)
+	except BaseException:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		raise
+# os.umask() can only be read by setting it, so do that once before any threads start
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+def _configureProject(parms, file_name, save=True):
 	project._name = parms[0]
 	project._project_dir = parms[1]
 	project._username = parms[2]
@@ -58,7 +87,14 @@ def _configureProject(parms, file_name):
 	cp.set("User", "Name", getUsername())
 	cp.set("User", "Directory", getUserDir())
 	
-	_writeConfigFile(file_name, cp)
+	if save:
+		_writeConfigFile(file_name, cp)
+	_resetIndex()
+	stopInstallScheduler()
+	_metadataCache.clear()
+	_metadataCache.setMaxSize(int(getProjectSetting("Cache", "metadataSize", METADATA_CACHE_SIZE)))
+	if getProjectSetting("Trace", "enabled", "False") == "True":
+		tracing.enable()
 def configureProject(file_name):
 	"""
 	Configures the Project based on the .config.ini file found in the
@@ -82,6 +118,1124 @@ def configureProject(file_name):
 	
 	_configureProject(parms, file_name)
 
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Project Settings
+PROJECT_SETTINGS = ".projectInfo"
+def getProjectSetting(section, option, default=None):
+	"""
+	Reads a setting shared by everyone working on the project from the
+	.projectInfo file in the project directory, e.g.
+		[Storage]
+		mode = dedup
+	@returns: The setting as a string, or default if it is not set
+	"""
+	try:
+		cp = _metadataCache.get(os.path.join(getProjectDir(), PROJECT_SETTINGS), _parseConfigFile)
+	except OSError:
+		return default
+	if cp.has_option(section, option):
+		return cp.get(section, option)
+	return default
+
+def setProjectSetting(section, option, value):
+	"""Changes one setting in the .projectInfo file of the project"""
+	path = os.path.join(getProjectDir(), PROJECT_SETTINGS)
+	cp = ConfigParser()
+	cp.read(path)
+	if not cp.has_section(section):
+		cp.add_section(section)
+	cp.set(section, option, str(value))
+	_writeConfigFile(path, cp)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Metadata Cache
+# Parsed .nodeInfo and .projectInfo files and inst/stable link targets are
+# kept in memory and reused while the file's (st_mtime, st_size, st_ino) is
+# unchanged, so asking again costs one stat. Python 2 has no st_mtime_ns; the
+# float st_mtime still has sub-second resolution, and metadata files are
+# replaced by rename, which changes st_ino.
+# The size can be set with [Cache] metadataSize in .projectInfo.
+METADATA_CACHE_SIZE = 4096
+
+class MetadataCache:
+	"""A thread safe LRU cache of values loaded from files, validated by stat"""
+	def __init__(self, maxSize=METADATA_CACHE_SIZE):
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+		self._max_size = maxSize
+		self.hits = 0
+		self.misses = 0
+	
+	def get(self, path, load, statFunc=os.stat):
+		"""
+		@returns: load(path), or what it returned the last time if path did not change
+		@raises OSError: if path can not be stat'ed
+		"""
+		st = statFunc(path)
+		key = (st.st_mtime, st.st_size, st.st_ino)
+		with self._lock:
+			entry = self._entries.pop(path, None)
+			if entry is not None and entry[0] == key:
+				self._entries[path] = entry
+				self.hits += 1
+				return entry[1]
+			self.misses += 1
+		value = load(path)
+		with self._lock:
+			self._entries[path] = (key, value)
+			while len(self._entries) > self._max_size:
+				self._entries.popitem(last=False)
+		return value
+	
+	def setMaxSize(self, maxSize):
+		with self._lock:
+			self._max_size = maxSize
+			while len(self._entries) > self._max_size:
+				self._entries.popitem(last=False)
+	
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.hits = 0
+			self.misses = 0
+	
+	def stats(self):
+		"""@returns: A dict with the hits, misses, size and maxSize of the cache"""
+		with self._lock:
+			return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxSize": self._max_size}
+
+_metadataCache = MetadataCache()
+
+def getMetadataCacheStats():
+	return _metadataCache.stats()
+
+def _parseConfigFile(path):
+	cp = ConfigParser()
+	cp.read(path)
+	return cp
+
+def _cachedNodeInfo(dirPath):
+	"""
+	@returns: The parsed .nodeInfo of dirPath, or None if it has none.
+		It is shared, do not change it; see _updateNodeInfo().
+	"""
+	try:
+		return _metadataCache.get(os.path.join(dirPath, ".nodeInfo"), metadata.read)
+	except OSError:
+		return None
+
+_readlink = tracing.traced(os.readlink, "os.readlink")
+
+def _cachedStableTarget(dirPath):
+	"""@returns: Where inst/stable of dirPath points, or "" if it is not a link"""
+	try:
+		return _metadataCache.get(os.path.join(dirPath, "inst", "stable"), _readlink, os.lstat)
+	except OSError:
+		return ""
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Change Descriptions
+# Operations that change the project or the user directory return Changes so
+# the GUI can update just the tree items involved instead of rescanning.
+PROJECT_ADDED = "project added"			# a new project or versioned folder
+PROJECT_REMOVED = "project removed"
+PROJECT_RENAMED = "project renamed"		# path is (old path, new path)
+PROJECT_CHANGED = "project changed"		# .nodeInfo or inst/stable of a versioned folder
+LOCAL_ADDED = "local added"				# a new folder in the user directory
+LOCAL_REMOVED = "local removed"
+LOCAL_CHANGED = "local changed"			# the files and .checkoutInfo of a local folder
+INSTALLED_FILE = "installed file"		# a file added to an inst folder
+
+class Changes(list):
+	"""
+	(kind, path) pairs, in the order they happened.
+	summary describes the operation in one line, e.g. for a status bar.
+	"""
+	def __init__(self, summary="", changes=()):
+		list.__init__(self, changes)
+		self.summary = summary
+	
+	def paths(self, kind):
+		"""@returns: The paths changed in the way kind describes"""
+		return [path for k, path in self if k == kind]
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Copy Engine
+# checkout, checkin and install copy files with copyTree()/copyFiles(). Files
+# are copied by several threads at once ([Copy] threads in .projectInfo) so
+# that network latency overlaps, using copy_file_range() where the kernel
+# offers it and large buffers ([Copy] bufferSize) otherwise.
+COPY_THREADS = 4
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+class CancelledError(Exception):
+	"""Raised by a progress callback to stop a long running operation"""
+
+class CopyStatus:
+	"""
+	Passed to progress callbacks. Callbacks may raise CancelledError to stop
+	the operation.
+	"""
+	def __init__(self, bytesTotal=0, filesTotal=0):
+		self.bytesDone = 0
+		self.bytesTotal = bytesTotal
+		self.filesDone = 0
+		self.filesTotal = filesTotal
+		self.started = time.time()
+	
+	def fraction(self):
+		"""@returns: How much is done, between 0.0 and 1.0"""
+		if self.bytesTotal > 0:
+			return min(1.0, float(self.bytesDone) / self.bytesTotal)
+		if self.filesTotal > 0:
+			return float(self.filesDone) / self.filesTotal
+		return 1.0
+	
+	def elapsed(self):
+		return time.time() - self.started
+	
+	def eta(self):
+		"""@returns: The estimated number of seconds left, or None if unknown"""
+		fraction = self.fraction()
+		if fraction <= 0.0:
+			return None
+		return self.elapsed() * (1.0 - fraction) / fraction
+
+# The copy a worker thread is doing, see _copyFileData()
+_copyContext = threading.local()
+_copyFileRange = None
+
+def _getCopyFileRange():
+	"""@returns: libc's copy_file_range() via ctypes, or False if there is none"""
+	global _copyFileRange
+	if _copyFileRange is None:
+		_copyFileRange = False
+		try:
+			import ctypes
+			libc = ctypes.CDLL(None, use_errno=True)
+			function = libc.copy_file_range
+			function.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint]
+			function.restype = ctypes.c_ssize_t
+			_copyFileRange = function
+		except (ImportError, OSError, AttributeError):
+			pass
+	return _copyFileRange
+
+def _copyFileData(src, dst):
+	"""
+	Copies the contents of src to dst, in the kernel with copy_file_range()
+	where possible, otherwise with large buffers. Inside copyFiles() every chunk
+	is reported so that progress and cancelling work within large files.
+	"""
+	onChunk = getattr(_copyContext, "onChunk", None)
+	bufferSize = getattr(_copyContext, "bufferSize", COPY_BUFFER_SIZE)
+	srcFd = os.open(src, os.O_RDONLY)
+	try:
+		dstFd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0666)
+		try:
+			copyFileRange = _getCopyFileRange()
+			while copyFileRange:
+				copied = copyFileRange(srcFd, None, dstFd, None, bufferSize, 0)
+				if copied < 0:
+					import ctypes
+					error = ctypes.get_errno()
+					if error in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+						# Not supported between these files, finish in user space.
+						# Both file offsets are where copy_file_range stopped.
+						break
+					raise OSError(error, os.strerror(error), src)
+				if copied == 0:
+					return
+				if onChunk is not None:
+					onChunk(copied)
+			while True:
+				data = os.read(srcFd, bufferSize)
+				if not data:
+					return
+				written = 0
+				while written < len(data):
+					written += os.write(dstFd, buffer(data, written))
+				if onChunk is not None:
+					onChunk(len(data))
+		finally:
+			os.close(dstFd)
+	finally:
+		os.close(srcFd)
+
+def _copyFile(src, dst):
+	"""Copies src to dst like shutil.copy2, using the copy engine"""
+	_copyFileData(src, dst)
+	shutil.copystat(src, dst)
+
+def _makeWritable(path):
+	mode = stat.S_IMODE(os.stat(path).st_mode)
+	if not mode & stat.S_IWUSR:
+		os.chmod(path, mode | stat.S_IWUSR)
+
+def _copyWritable(src, dst):
+	"""Copies src to dst like shutil.copy2 and makes sure the owner can write to dst"""
+	_copyFile(src, dst)
+	_makeWritable(dst)
+
+def _logicalSize(path):
+	"""
+	@returns: The size of path, or for a delta file the size of the file it stands for
+	"""
+	import delta
+	if path.endswith(DELTA_EXT):
+		return delta.targetSize(path)
+	if not os.path.lexists(path) and os.path.exists(path + DELTA_EXT):
+		# Replaced by a delta since it was listed
+		return delta.targetSize(path + DELTA_EXT)
+	return os.path.getsize(path)
+
+def copyFiles(pairs, progress=None, copyFile=_copyFile, threads=None):
+	"""
+	Copies every (srcFile, dstFile) in pairs with copyFile(srcFile, dstFile),
+	using threads threads at a time ([Copy] threads in .projectInfo by default).
+	If progress is given it is called with a CopyStatus a few times a second,
+	always from the calling thread, and may raise CancelledError to stop.
+	@precondition: the folders of all dstFiles exist
+	"""
+	if threads is None:
+		threads = int(getProjectSetting("Copy", "threads", COPY_THREADS))
+	bufferSize = int(getProjectSetting("Copy", "bufferSize", COPY_BUFFER_SIZE))
+	status = CopyStatus(sum([_logicalSize(s) for s, d in pairs]), len(pairs))
+	lock = threading.Lock()
+	stop = threading.Event()
+	errors = []
+	work = Queue.Queue()
+	for pair in pairs:
+		work.put(pair)
+	
+	def onChunk(size):
+		if stop.isSet():
+			raise CancelledError("Copy stopped")
+		with lock:
+			status.bytesDone += size
+	def worker():
+		_copyContext.bufferSize = bufferSize
+		try:
+			while not stop.isSet():
+				try:
+					src, dst = work.get_nowait()
+				except Queue.Empty:
+					return
+				reported = [0]
+				def count(size):
+					onChunk(size)
+					reported[0] += size
+				_copyContext.onChunk = count
+				copyFile(src, dst)
+				with lock:
+					# copyFile does not report chunks for links, deltas, ...
+					status.bytesDone += _logicalSize(src) - reported[0]
+					status.filesDone += 1
+		except BaseException, e:
+			if not stop.isSet():
+				errors.append(e)
+			stop.set()
+		finally:
+			_copyContext.onChunk = None
+	
+	workers = [threading.Thread(target=worker) for i in range(max(1, min(threads, len(pairs))))]
+	for w in workers:
+		w.daemon = True
+		w.start()
+	try:
+		while True:
+			alive = [w for w in workers if w.isAlive()]
+			if not alive:
+				break
+			alive[0].join(0.2)
+			if progress is not None:
+				progress(status)
+	except BaseException:
+		stop.set()
+		for w in workers:
+			w.join()
+		raise
+	if errors:
+		raise errors[0]
+	tracing.addCounts(files=status.filesDone, bytes=status.bytesDone)
+	if progress is not None:
+		progress(status)
+	return status
+
+def copyTree(src, dst, progress=None, copyFile=_copyFile, threads=None):
+	"""
+	Copies the directory src to dst like shutil.copytree using copyFiles().
+	Regular files are copied with copyFile(srcFile, dstFile); see copyFiles()
+	for progress and threads.
+	@precondition: dst does not exist
+	@postcondition: if the copy fails or is cancelled dst is removed again
+	@returns: The final CopyStatus
+	"""
+	dirs = []
+	links = []
+	files = []
+	for curDir, subDirs, names in os.walk(src):
+		dirs.append(curDir)
+		for name in subDirs + names:
+			path = os.path.join(curDir, name)
+			target = os.path.join(dst, os.path.relpath(path, src))
+			if os.path.islink(path):
+				links.append((path, target))
+			elif not os.path.isdir(path):
+				files.append((path, target))
+	# A file the garbage collection was replacing by a delta may be listed
+	# twice, only copy it once
+	listed = set([path for path, target in files])
+	files = [(path, target) for path, target in files
+		if not (path.endswith(DELTA_EXT) and path[:-len(DELTA_EXT)] in listed)]
+	
+	try:
+		for d in dirs:
+			os.makedirs(os.path.join(dst, os.path.relpath(d, src)))
+		for path, target in links:
+			os.symlink(os.readlink(path), target)
+		status = copyFiles(files, progress, copyFile, threads)
+		for d in reversed(dirs):
+			shutil.copystat(d, os.path.join(dst, os.path.relpath(d, src)))
+	except BaseException:
+		shutil.rmtree(dst, ignore_errors=True)
+		raise
+	return status
+
+def _callCancellable(args, progress=None):
+	"""
+	Runs args like subprocess.call. While the process runs progress is called
+	with a CopyStatus a few times a second; if it raises CancelledError the
+	process is killed.
+	@returns: The return code of the process
+	"""
+	with tracing.span("subprocess", command=os.path.basename(args[0])):
+		if progress is None:
+			return call(args)
+		status = CopyStatus(0, 1)
+		process = Popen(args)
+		try:
+			while process.poll() is None:
+				progress(status)
+				time.sleep(0.2)
+		except CancelledError:
+			process.kill()
+			process.wait()
+			raise
+		status.filesDone = 1
+		progress(status)
+		return process.returncode
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Deduplicated Storage
+# With [Storage] mode = dedup in .projectInfo, checkin stores file contents
+# once in a blob store named by their sha1, and every file in src/vN is a
+# read-only hardlink to its blob. Unchanged files cost no space and no copying.
+def _getStorageMode():
+	"""@returns: How checkin stores new versions: 'copy' (the default) or 'dedup'"""
+	return getProjectSetting("Storage", "mode", "copy")
+
+def _blobDir():
+	return os.path.join(getProjectDir(), ".blobs")
+
+def _hashFile(filePath):
+	"""@returns: The sha1 hex digest of the contents of filePath"""
+	sha = hashlib.sha1()
+	f = open(filePath, 'rb')
+	try:
+		for chunk in iter(lambda: f.read(1 << 20), ''):
+			sha.update(chunk)
+	finally:
+		f.close()
+	return sha.hexdigest()
+
+def _storeBlob(filePath):
+	"""
+	Adds the contents of filePath to the blob store.
+	@returns: The path of the read-only blob
+	"""
+	digest = _hashFile(filePath)
+	blobDir = os.path.join(_blobDir(), digest[:2])
+	blob = os.path.join(blobDir, digest[2:])
+	if not os.path.exists(blob):
+		try:
+			os.makedirs(blobDir)
+		except OSError, e:
+			if e.errno != errno.EEXIST:
+				raise
+		fd, tmp = tempfile.mkstemp(prefix=digest[2:] + ".tmp", dir=blobDir)
+		os.close(fd)
+		try:
+			_copyFile(filePath, tmp)
+			os.chmod(tmp, stat.S_IMODE(os.stat(tmp).st_mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+			os.rename(tmp, blob)
+		except BaseException:
+			os.remove(tmp)
+			raise
+	return blob
+
+def _link(src, dst):
+	"""@returns: True if dst was made a hardlink of src, False if the filesystem refused"""
+	try:
+		os.link(src, dst)
+	except OSError, e:
+		if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+			return False
+		raise
+	return True
+
+def _blobCopier(srcRoot, previousRoot):
+	"""
+	@returns: A copyFile function for copyTree() that links files into the blob store.
+		A file whose size and mtime match the same file below previousRoot is
+		linked to that file's blob without being read.
+	"""
+	def copyFile(src, dst):
+		relPath = os.path.relpath(src, srcRoot)
+		if relPath == ".checkoutInfo":
+			# Removed again before the version is taken, keep it out of the store
+			_copyFile(src, dst)
+			return
+		st = os.stat(src)
+		prev = os.path.join(previousRoot, relPath)
+		if os.path.isfile(prev) and not os.path.islink(prev):
+			prevSt = os.stat(prev)
+			if prevSt.st_nlink > 1 and prevSt.st_size == st.st_size and prevSt.st_mtime == st.st_mtime:
+				if _link(prev, dst):
+					return
+		if not _link(_storeBlob(src), dst):
+			_copyFile(src, dst)
+	return copyFile
+
+def collectBlobGarbage(minAge=3600):
+	"""
+	Removes blobs that no version links to any more, i.e. whose link count is 1.
+	Blobs touched in the last minAge seconds are kept, so a checkin that is
+	about to link one does not lose it.
+	@returns: The number of bytes freed
+	"""
+	freed = 0
+	if not os.path.isdir(_blobDir()):
+		return freed
+	now = time.time()
+	for curDir, dirs, names in os.walk(_blobDir()):
+		for name in names:
+			blob = os.path.join(curDir, name)
+			st = os.lstat(blob)
+			if ".tmp" in name or st.st_nlink > 1 or now - st.st_ctime < minAge:
+				continue
+			os.remove(blob)
+			freed += st.st_size
+	return freed
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Checkout Strategies
+# Checkout clones files copy-on-write where the filesystem supports it
+# (XFS, Btrfs, ...). With [Checkout] hardlinks = True in .projectInfo it
+# otherwise hardlinks them read-only, so an accidental write fails instead of
+# changing the checked in version; unshareFile() gives a file its own copy
+# before it is edited, unshareTree() every file of a checkout. A plain copy is
+# the last resort.
+CHECKOUT_STRATEGIES = ["reflink", "hardlink", "copy"]
+_FICLONE = 0x40049409
+
+def _reflink(src, dst):
+	"""@returns: True if dst was created as a copy-on-write clone of src"""
+	srcFile = open(src, 'rb')
+	try:
+		dstFile = open(dst, 'wb')
+		try:
+			fcntl.ioctl(dstFile.fileno(), _FICLONE, srcFile.fileno())
+		except (IOError, OSError):
+			dstFile.close()
+			os.remove(dst)
+			return False
+		dstFile.close()
+	finally:
+		srcFile.close()
+	shutil.copystat(src, dst)
+	return True
+
+def _hardlinkReadOnly(src, dst):
+	"""@returns: True if dst was created as a read-only hardlink of src"""
+	if not _link(src, dst):
+		return False
+	mode = stat.S_IMODE(os.stat(dst).st_mode)
+	try:
+		os.chmod(dst, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+	except OSError:
+		# Somebody else owns the file; we can not protect it
+		os.remove(dst)
+		return False
+	return True
+
+class _CheckoutCopier:
+	"""
+	A copyFile function for copyTree() that tries the checkout strategies in
+	order. A strategy that fails is not tried again for the rest of the tree.
+	"""
+	def __init__(self, allowHardlinks):
+		self._strategies = [s for s in CHECKOUT_STRATEGIES if allowHardlinks or s != "hardlink"]
+		self._used = set()
+		# copyFiles() calls this from several threads
+		self._lock = threading.Lock()
+	
+	def __call__(self, src, dst):
+		while True:
+			strategy = self._strategies[0]
+			if strategy == "reflink":
+				done = _reflink(src, dst)
+				if done:
+					_makeWritable(dst)
+			elif strategy == "hardlink":
+				done = _hardlinkReadOnly(src, dst)
+			else:
+				_copyWritable(src, dst)
+				done = True
+			with self._lock:
+				if done:
+					self._used.add(strategy)
+					return
+				# Another thread may have given up on it first
+				if self._strategies[0] == strategy:
+					self._strategies.pop(0)
+	
+	def strategy(self):
+		"""@returns: The strategies that were used, e.g. 'reflink' or 'hardlink+copy'"""
+		return "+".join([s for s in CHECKOUT_STRATEGIES if s in self._used]) or "copy"
+
+def unshareFile(filePath):
+	"""
+	Gives filePath its own writable copy of its data if it is a hardlink,
+	so that editing it can not change a checked in version.
+	@returns: True if a link was broken
+	"""
+	st = os.lstat(filePath)
+	if not stat.S_ISREG(st.st_mode) or st.st_nlink < 2:
+		return False
+	fd, tmp = tempfile.mkstemp(prefix=".unshare", dir=os.path.dirname(filePath))
+	os.close(fd)
+	try:
+		_copyFile(filePath, tmp)
+		_makeWritable(tmp)
+		os.rename(tmp, filePath)
+	except BaseException:
+		os.remove(tmp)
+		raise
+	return True
+
+def unshareTree(dirPath):
+	"""
+	Runs unshareFile() on every file below dirPath, for checkouts that are
+	edited by programs that do not call unshareFile() first.
+	@returns: The number of links that were broken
+	"""
+	broken = 0
+	for curDir, dirs, names in os.walk(dirPath):
+		for name in names:
+			if unshareFile(os.path.join(curDir, name)):
+				broken += 1
+	return broken
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Delta Storage
+# With [Storage] mode = delta in .projectInfo, the background garbage
+# collection pass after a checkin replaces every file of at least
+# deltaThreshold bytes in the older versions with a reverse delta (see
+# delta.py) against the same file in the next version, so checkin itself does
+# not wait for it. Only the newest version of a large file is kept whole;
+# older ones are rebuilt on demand. src/.deltas/vN records the versions done.
+DELTA_EXT = ".chasmdelta"
+DELTA_THRESHOLD = 64 * 1024 * 1024
+DELTA_MARKER_DIR = ".deltas"
+# Deltas are written to hidden folders with this prefix in src first
+DELTA_TMP_PREFIX = ".deltaTmp"
+
+def _splitVersionPath(filePath):
+	"""
+	@precondition: filePath is inside a .../src/vN folder
+	@returns: (path of the src folder, N, path of filePath relative to vN)
+	"""
+	head, rel = os.path.split(filePath)
+	while head and head != os.sep:
+		head, name = os.path.split(head)
+		if os.path.basename(head) == "src" and name.startswith("v") and name[1:].isdigit():
+			return head, int(name[1:]), rel
+		rel = os.path.join(name, rel)
+	raise Exception("Not inside a version folder: " + filePath)
+
+def _storeDeltas(oldVersionPath, newVersionPath):
+	"""
+	Replaces the large files in oldVersionPath that also exist in newVersionPath
+	with reverse deltas against them. Files that changed too much to make a delta
+	worthwhile are left whole.
+	@returns: False if the garbage collection was stopped before every file was done
+	"""
+	import delta
+	threshold = int(getProjectSetting("Storage", "deltaThreshold", DELTA_THRESHOLD))
+	blockSize = int(getProjectSetting("Storage", "deltaBlockSize", delta.DEFAULT_BLOCK_SIZE))
+	tmpDir = tempfile.mkdtemp(prefix=DELTA_TMP_PREFIX, dir=os.path.dirname(oldVersionPath))
+	try:
+		for curDir, dirs, names in os.walk(oldVersionPath):
+			for name in names:
+				if _gcStopped.isSet():
+					return False
+				old = os.path.join(curDir, name)
+				new = os.path.join(newVersionPath, os.path.relpath(old, oldVersionPath))
+				tmp = os.path.join(tmpDir, name + DELTA_EXT)
+				try:
+					if name.endswith(DELTA_EXT) or os.path.islink(old) or os.path.getsize(old) < threshold:
+						continue
+					if os.path.islink(new) or not os.path.isfile(new):
+						continue
+					try:
+						delta.computeDelta(new, old, tmp, blockSize, os.path.getsize(old) // 2)
+					except delta.DeltaTooLarge:
+						continue
+					# Keep the mode and times of the original so they survive a rebuild
+					shutil.copystat(old, tmp)
+					os.rename(tmp, old + DELTA_EXT)
+					os.remove(old)
+				except EnvironmentError, e:
+					# Another pass over the same folder got there first
+					if e.errno != errno.ENOENT:
+						raise
+	finally:
+		shutil.rmtree(tmpDir, ignore_errors=True)
+	return True
+
+def _storeVersionDeltas(vDirPath):
+	"""
+	Runs _storeDeltas() on every version of vDirPath that is followed by the
+	next version number and has not been done yet.
+	"""
+	srcDir = os.path.join(vDirPath, "src")
+	markerDir = os.path.join(srcDir, DELTA_MARKER_DIR)
+	versions = _versionNumbers(srcDir)
+	for v in versions:
+		marker = os.path.join(markerDir, "v%d" % v)
+		if v + 1 not in versions or os.path.exists(marker):
+			continue
+		if not _storeDeltas(os.path.join(srcDir, "v%d" % v), os.path.join(srcDir, "v%d" % (v + 1))):
+			return
+		if not os.path.isdir(markerDir):
+			try:
+				os.makedirs(markerDir)
+			except OSError, e:
+				if e.errno != errno.EEXIST:
+					raise
+		open(marker, "w").close()
+
+def _materializeFile(filePath, dest):
+	"""
+	Writes the contents of filePath, a file in a src/vN folder, to dest.
+	If filePath has been replaced by a delta it is rebuilt from the same file in
+	the next version, which may itself be a delta.
+	"""
+	import delta
+	if os.path.exists(filePath):
+		_copyFile(filePath, dest)
+		return
+	deltaPath = filePath + DELTA_EXT
+	if not os.path.exists(deltaPath):
+		raise Exception("File doesn't exist " + filePath)
+	srcDir, version, rel = _splitVersionPath(filePath)
+	base = os.path.join(srcDir, "v" + str(version + 1), rel)
+	if os.path.exists(base):
+		delta.applyDelta(base, deltaPath, dest)
+	else:
+		tmpDir = tempfile.mkdtemp(prefix=".materialize", dir=srcDir)
+		try:
+			tmpBase = os.path.join(tmpDir, os.path.basename(rel))
+			_materializeFile(base, tmpBase)
+			delta.applyDelta(tmpBase, deltaPath, dest)
+		finally:
+			shutil.rmtree(tmpDir)
+	shutil.copystat(deltaPath, dest)
+
+def _restoringCopier(copyFile):
+	"""
+	@returns: A copyFile function for copyTree() that rebuilds delta files into
+		the file they stand for and copies everything else with copyFile
+	"""
+	def restore(src, dst):
+		if not src.endswith(DELTA_EXT) and not os.path.lexists(src) and os.path.exists(src + DELTA_EXT):
+			# Replaced by a delta since it was listed
+			src += DELTA_EXT
+			dst += DELTA_EXT
+		if src.endswith(DELTA_EXT):
+			dst = dst[:-len(DELTA_EXT)]
+			# Copies of intermediate versions made while rebuilding are not
+			# part of the copy; copyFiles() counts the rebuilt size afterwards.
+			# Chunks are still passed on with no size so cancelling works.
+			onChunk = getattr(_copyContext, "onChunk", None)
+			if onChunk is not None:
+				_copyContext.onChunk = lambda size: onChunk(0)
+			try:
+				_materializeFile(src[:-len(DELTA_EXT)], dst)
+			finally:
+				_copyContext.onChunk = onChunk
+			_makeWritable(dst)
+		else:
+			copyFile(src, dst)
+	return restore
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Node Index
+# The node index is created the first time a question needs it that would
+# otherwise walk a whole subtree (hasInstalledChild()), unless [Index]
+# autoCreate is False. From then on every session keeps it up to date.
+_index = None
+def _resetIndex():
+	global _index
+	if _index is not None:
+		_index.close()
+	_index = None
+
+def _getIndex():
+	"""@returns: The NodeIndex of the project, or None if the project has no index"""
+	import nodeIndex
+	global _index
+	projectDir = getProjectDir()
+	if not nodeIndex.exists(projectDir):
+		return None
+	if _index is None or _index._project_dir != os.path.abspath(projectDir):
+		_index = nodeIndex.NodeIndex(projectDir)
+	return _index
+
+def _coveringIndex(path):
+	"""@returns: The NodeIndex if the project has one and path is inside the project, otherwise None"""
+	idx = _getIndex()
+	if idx is not None and idx.contains(path):
+		return idx
+	return None
+
+def _autoIndex(path):
+	"""
+	@returns: The NodeIndex covering path, created from the project if it has
+		none yet and [Index] autoCreate allows it, or None
+	"""
+	import sqlite3, nodeIndex
+	idx = _coveringIndex(path)
+	if idx is not None or getProjectSetting("Index", "autoCreate", "True") != "True":
+		return idx
+	projectDir = getProjectDir()
+	if not projectDir or not os.path.isdir(projectDir) or not nodeIndex.NodeIndex(projectDir).contains(path):
+		return None
+	try:
+		rebuildIndex(projectDir)
+	except (sqlite3.Error, OSError, IOError), e:
+		# e.g. a read-only project; walk the folders instead
+		print "Could not create the node index: " + str(e)
+		return None
+	return _coveringIndex(path)
+
+def _isInstalledTarget(target):
+	return bool(target) and os.path.exists(target) and not os.path.basename(target) == ".nullReference"
+
+def _nodeRecord(path):
+	"""
+	Reads the information the node index stores about path from the filesystem.
+	A folder whose .nodeInfo can not be read or is incomplete is described as
+	not versioned.
+	@returns: A dict keyed by the nodeIndex column names
+	"""
+	record = {"isdir": os.path.isdir(path), "versioned": False, "locked": False, "installed": False}
+	cp = _cachedNodeInfo(path)
+	if cp is None:
+		return record
+	try:
+		info = {
+			"versioned": True,
+			"type": cp.get("Node", "type"),
+			"latestversion": cp.getint("Versioning", "latestversion"),
+			"locked": cp.getboolean("Versioning", "locked"),
+			"lastcheckoutuser": cp.get("Versioning", "lastcheckoutuser"),
+			"lastcheckouttime": cp.get("Versioning", "lastcheckouttime"),
+			"lastcheckinuser": cp.get("Versioning", "lastcheckinuser"),
+			"lastcheckintime": cp.get("Versioning", "lastcheckintime")}
+	except (ConfigParserError, ValueError):
+		return record
+	target = _cachedStableTarget(path)
+	record.update(info)
+	record.update({"stable": target, "installed": _isInstalledTarget(target)})
+	return record
+
+def _updateIndex(path):
+	"""
+	Refreshes the index entry for path, if the project has an index, and its
+	search index entry. Parent folders that are not indexed yet, e.g. made
+	with mkdir, are added with it.
+	"""
+	idx = _coveringIndex(path)
+	searchIdx = _coveringSearchIndex(path)
+	if idx is None and searchIdx is None:
+		return
+	paths = [os.path.abspath(path)]
+	if idx is not None:
+		projectDir = os.path.abspath(getProjectDir())
+		parent = os.path.dirname(paths[0])
+		while parent != projectDir and idx.contains(parent) and idx.getNode(parent) is None:
+			paths.append(parent)
+			parent = os.path.dirname(parent)
+	for p in reversed(paths):
+		record = _nodeRecord(p)
+		if idx is not None:
+			idx.putNode(p, record)
+		if searchIdx is not None:
+			searchIdx.put(p, record)
+
+def _scanProject(projectDir):
+	"""@returns: (path, node record) pairs for everything in projectDir, without looking inside versioned folders"""
+	nodes = []
+	for curDir, dirs, files in os.walk(projectDir):
+		for name in files:
+			if not name.startswith("."):
+				nodes.append((os.path.join(curDir, name), {"isdir": False}))
+		unversioned = []
+		for name in dirs:
+			if name.startswith("."):
+				continue
+			record = _nodeRecord(os.path.join(curDir, name))
+			nodes.append((os.path.join(curDir, name), record))
+			if not record["versioned"]:
+				unversioned.append(name)
+		dirs[:] = unversioned
+	return nodes
+
+def rebuildIndexes():
+	"""
+	Rescans the project into its node index, if it has one, and into the search
+	index, for changes made outside utilities anywhere in the project
+	"""
+	if _getIndex() is not None:
+		rebuildIndex(getProjectDir())
+	getSearchIndex(True)
+
+def rebuildIndex(projectDir):
+	"""
+	Walks projectDir and replaces its node index with what is found on disk.
+	Creates the index if it does not exist yet.
+	@returns: The number of indexed entries
+	"""
+	import nodeIndex
+	nodes = _scanProject(projectDir)
+	idx = nodeIndex.NodeIndex(projectDir)
+	idx.replaceAll(nodes)
+	idx.close()
+	_resetIndex()
+	return len(nodes)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Search
+# The search index of the project is built the first time it is searched,
+# from the node index if the project has one, and kept in memory. Changes made
+# through utilities update it; refreshIndexes() picks up other changes.
+_searchIndex = None
+_searchLock = threading.Lock()
+
+def _coveringSearchIndex(path):
+	"""@returns: The search index if it has been built and path is inside its project, otherwise None"""
+	searchIdx = _searchIndex
+	if searchIdx is not None and searchIdx.contains(path):
+		return searchIdx
+	return None
+
+def getSearchIndex(rebuild=False):
+	"""@returns: The search.SearchIndex of the project, built on first use or if rebuild"""
+	import search
+	global _searchIndex
+	projectDir = os.path.abspath(getProjectDir())
+	with _searchLock:
+		if rebuild or _searchIndex is None or _searchIndex.projectDir != projectDir:
+			searchIdx = search.SearchIndex(projectDir)
+			idx = _getIndex()
+			if idx is not None:
+				searchIdx.replaceAll([(n["path"], n) for n in idx.getAll()])
+			else:
+				searchIdx.replaceAll(_scanProject(projectDir))
+			_searchIndex = searchIdx
+		return _searchIndex
+
+def searchProject(text, limit=None):
+	"""
+	@precondition: text is a query with optional filters, see search.py
+	@precondition: limit is None for search.SEARCH_LIMIT
+	@returns: The paths of the best matches in the project, best first
+	"""
+	import search
+	if limit is None:
+		limit = search.SEARCH_LIMIT
+	query, filters = search.parseQuery(text)
+	return getSearchIndex().search(query, limit=limit, **filters)
+
+def refreshIndexes(path):
+	"""
+	Updates the node index and search index entries of path and its direct
+	children from the filesystem, for changes made outside utilities
+	"""
+	indexes = []
+	idx = _coveringIndex(path)
+	if idx is not None:
+		indexes.append((idx.putNode, idx.removeTree, lambda p: [n["path"] for n in idx.getChildren(p)]))
+	searchIdx = _coveringSearchIndex(path)
+	if searchIdx is not None:
+		indexes.append((searchIdx.put, searchIdx.removeTree, searchIdx.getChildren))
+	if not indexes:
+		return
+	path = os.path.abspath(path)
+	isRoot = path == os.path.abspath(getProjectDir())
+	if not os.path.exists(path):
+		for put, removeTree, getChildren in indexes:
+			removeTree(path)
+		return
+	record = _nodeRecord(path)
+	children = []
+	if record["isdir"] and not record["versioned"]:
+		children = [c for c, isDir in _listProjectFolder(path)]
+	for put, removeTree, getChildren in indexes:
+		if not isRoot:
+			# The project root has no entry of its own
+			put(path, record)
+		if not record["isdir"] or record["versioned"]:
+			continue
+		indexed = set(getChildren(path))
+		for child in children:
+			if child not in indexed:
+				childRecord = _nodeRecord(child)
+				put(child, childRecord)
+				if childRecord["isdir"] and not childRecord["versioned"]:
+					for p, node in _scanProject(child):
+						put(p, node)
+		for child in indexed - set(children):
+			removeTree(child)
+
+def getProjectChildren(dirPath):
+	"""
+	Lists one level of the project folder dirPath on disk. Hidden entries are
+	skipped. If the node index lists other children, e.g. after a mkdir
+	outside utilities, its entries for dirPath are refreshed.
+	@returns: A list of (path, isDir) pairs for the files and folders directly inside dirPath
+	"""
+	children = _listProjectFolder(dirPath)
+	idx = _coveringIndex(dirPath)
+	if idx is not None:
+		indexed = set(os.path.basename(n["path"]) for n in idx.getChildren(dirPath))
+		if indexed != set(os.path.basename(c) for c, isDir in children):
+			refreshIndexes(dirPath)
+	return children
+
+def _listProjectFolder(dirPath):
+	"""Lists dirPath on disk like getProjectChildren()"""
+	if _scandir is not None:
+		return [(e.path, e.is_dir()) for e in _scandir(dirPath) if not e.name.startswith(".")]
+	children = [os.path.join(dirPath, n) for n in os.listdir(dirPath) if not n.startswith(".")]
+	return [(c, os.path.isdir(c)) for c in children]
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Node Info Updates
+# .nodeInfo is only changed through _updateNodeInfo(), which holds an flock on
+# .nodeInfo.lock for the read-change-write of the metadata only (never while
+# files are copied) and bumps [Versioning] generation on every write. Callers
+# that decided something from an earlier read pass that generation and get a
+# NodeInfoConflict instead of overwriting a change they have not seen.
+NODE_INFO_LOCK = ".nodeInfo.lock"
+# Seconds to wait for another artist's metadata update before giving up
+NODE_INFO_LOCK_TIMEOUT = 5.0
+# How many times checkout starts over after a conflict
+NODE_INFO_RETRIES = 3
+
+class NodeInfoConflict(Exception):
+	"""Raised when .nodeInfo was changed by someone else; the operation may be retried"""
+
+def _readNodeInfo(dirPath):
+	return metadata.read(os.path.join(dirPath, ".nodeInfo"))
+
+def getCheckoutInfo(dirPath):
+	"""@returns: A ConfigParser with the [Checkout] section of the checked out folder dirPath"""
+	return metadata.read(os.path.join(dirPath, ".checkoutInfo"))
+
+def _useCompactMetadata():
+	"""
+	@returns: True if new metadata is written in the compact format, see [Metadata] format.
+		Projects stay on ini files, which older asset managers can read, until they are migrated.
+	"""
+	return getProjectSetting("Metadata", "format", metadata.INI) == metadata.COMPACT
+
+def _writeMetadataFile(filePath, configParser):
+	_writeConfigFile(filePath, configParser, _useCompactMetadata())
+
+def getGeneration(nodeInfo):
+	"""@returns: The number of times nodeInfo has been updated"""
+	if nodeInfo.has_option("Versioning", "generation"):
+		return nodeInfo.getint("Versioning", "generation")
+	return 0
+
+def _lockNodeInfo(dirPath):
+	"""
+	@returns: An open file holding the metadata lock of dirPath; close it to unlock
+	@raises NodeInfoConflict: if the lock is not free within NODE_INFO_LOCK_TIMEOUT
+	"""
+	lockFile = open(os.path.join(dirPath, NODE_INFO_LOCK), 'a')
+	deadline = time.time() + NODE_INFO_LOCK_TIMEOUT
+	while True:
+		try:
+			fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+			return lockFile
+		except IOError, e:
+			if e.errno not in (errno.EAGAIN, errno.EACCES) or time.time() > deadline:
+				lockFile.close()
+				if e.errno in (errno.EAGAIN, errno.EACCES):
+					raise NodeInfoConflict(os.path.basename(dirPath) + " is busy, try again")
+				raise
+			time.sleep(0.05)
+
+def _updateNodeInfo(dirPath, update, generation=None, undo=None):
+	"""
+	Changes the .nodeInfo of dirPath atomically: under the metadata lock the
+	file is read, update(nodeInfo) is called, the generation is bumped and the
+	file is replaced. update() may raise to leave the file unchanged.
+	@precondition: generation is None, or the generation the caller last read
+	@precondition: undo is None, or a function reverting what update() did
+		outside the file; it is called under the lock if the file is not replaced
+	@raises NodeInfoConflict: if the generation is not the one the caller read
+	@returns: The new nodeInfo
+	"""
+	lockFile = _lockNodeInfo(dirPath)
+	try:
+		nodeInfo = _readNodeInfo(dirPath)
+		if generation is not None and getGeneration(nodeInfo) != generation:
+			raise NodeInfoConflict(os.path.basename(dirPath) + " was changed by someone else, try again")
+		try:
+			update(nodeInfo)
+			nodeInfo.set("Versioning", "generation", str(getGeneration(nodeInfo) + 1))
+			_writeMetadataFile(os.path.join(dirPath, ".nodeInfo"), nodeInfo)
+		except BaseException:
+			if undo is not None:
+				undo()
+			raise
+	finally:
+		lockFile.close()
+	_updateIndex(dirPath)
+	return nodeInfo
+
+def convertMetadata(dirPath, compact):
+	"""
+	Rewrites every .nodeInfo and .checkoutInfo below dirPath in the compact
+	format (compact is True) or as ini files. Nothing else in them changes.
+	@returns: The number of files converted
+	"""
+	wanted = metadata.COMPACT if compact else metadata.INI
+	converted = 0
+	for curDir, dirs, files in os.walk(dirPath):
+		dirs[:] = [d for d in dirs if not d.startswith(".")]
+		for name in metadata.METADATA_FILES:
+			if name not in files:
+				continue
+			path = os.path.join(curDir, name)
+			lockFile = _lockNodeInfo(curDir) if name == ".nodeInfo" else None
+			try:
+				if metadata.fileFormat(path) != wanted:
+					_writeConfigFile(path, metadata.read(path), compact)
+					converted += 1
+			finally:
+				if lockFile is not None:
+					lockFile.close()
+		if ".nodeInfo" in files:
+			# Versions and installs of a versioned folder have no metadata of their own
+			dirs[:] = []
+	return converted
+
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Folder Management
 def createNodeInfoFile(dirPath):
 	"""
@@ -92,7 +1246,7 @@ def createNodeInfoFile(dirPath):
 		"Type" must be set by concrete nodes.
 	"""
 	username = getUsername()
-	timestamp = time.strftime("%a, %d %b %Y %I:%M:%S %p", time.localtime())
+	timestamp = metadata.formatTime(time.time())
 	
 	nodeInfo = ConfigParser()
 	nodeInfo.add_section('Node')
@@ -105,8 +1259,9 @@ def createNodeInfoFile(dirPath):
 	nodeInfo.set('Versioning', 'LastCheckoutUser', username)
 	nodeInfo.set('Versioning', 'LastCheckinTime', timestamp)
 	nodeInfo.set('Versioning', 'LastCheckinUser', username)
+	nodeInfo.set('Versioning', 'Generation', '0')
 	
-	_writeConfigFile(os.path.join(dirPath, ".nodeInfo"), nodeInfo)
+	_writeMetadataFile(os.path.join(dirPath, ".nodeInfo"), nodeInfo)
 def addVersionedFolder(parent, name):
 	new_dir = os.path.join(parent, name)
 	os.makedirs(os.path.join(new_dir, "src", "v0"))
@@ -114,11 +1269,14 @@ def addVersionedFolder(parent, name):
 	#os.symlink(os.path.join(new_dir, 'inst', getNullReference()), os.path.join(new_dir, 'inst','stable'))
 	os.symlink(getNullReference(), os.path.join(new_dir, 'inst','stable'))
 	createNodeInfoFile(new_dir)
-	return new_dir
+	_writeManifest(new_dir, 0, {}, getUsername(), metadata.formatTime(time.time()))
+	_updateIndex(new_dir)
+	return Changes("Added " + name, [(PROJECT_ADDED, new_dir)])
 def addProjectFolder(parent, name):
 	newPath = os.path.join(parent, name)
 	os.makedirs(newPath)
-	return newPath
+	_updateIndex(newPath)
+	return Changes("Added " + name, [(PROJECT_ADDED, newPath)])
 
 def isEmptyFolder(dirPath):
 	return not bool(glob.glob(os.path.join(dirPath, '*')))
@@ -130,6 +1288,13 @@ def removeFolder(dirPath):
 	if not canRemove(dirPath):
 		raise Exception ("Can not Remove")
 	shutil.rmtree(dirPath)
+	idx = _coveringIndex(dirPath)
+	if idx is not None:
+		idx.removeTree(dirPath)
+	searchIdx = _coveringSearchIndex(dirPath)
+	if searchIdx is not None:
+		searchIdx.removeTree(dirPath)
+	return Changes("Removed " + os.path.basename(dirPath), [(PROJECT_REMOVED, dirPath)])
 
 def canRename(dirPath):
 	if not hasInstalledChild(dirPath) and not isCheckedOut(dirPath):
@@ -144,8 +1309,18 @@ def renameFolder(oldDir, newName):
 	if os.path.exists(dest):
 		raise Exception ("Folder already exists")
 	os.renames(oldDir, dest)
+	idx = _coveringIndex(oldDir)
+	if idx is not None:
+		idx.renameTree(oldDir, dest)
+	searchIdx = _coveringSearchIndex(oldDir)
+	if searchIdx is not None:
+		searchIdx.renameTree(oldDir, dest)
+	return Changes("Renamed " + tail + " to " + newName, [(PROJECT_RENAMED, (oldDir, dest))])
 
 def hasInstalledChild(dirPath):
+	idx = _autoIndex(dirPath)
+	if idx is not None:
+		return idx.hasInstalledOrCheckedOut(dirPath)
 	if isVersionedFolder(dirPath) and isInstalled(dirPath) or isCheckedOut(dirPath):
 		return True
 	
@@ -160,33 +1335,42 @@ def hasInstalledChild(dirPath):
 
 
 def isVersionedFolder(dirPath):
-	if os.path.exists(os.path.join(dirPath, ".nodeInfo")):
-		return True
-	else:
-		return False
+	idx = _coveringIndex(dirPath)
+	if idx is not None:
+		node = idx.getNode(dirPath)
+		return node is not None and node["versioned"]
+	return _cachedNodeInfo(dirPath) is not None
 
 def isInstalled(dirPath):
-	stable = os.path.join(dirPath, "inst", "stable")
-	#print os.path.basename(os.readlink(stable))
-	if os.path.exists(os.readlink(stable)) and not os.path.basename(os.readlink(stable)) == ".nullReference":
-		return True
-	else:
-		return False
+	idx = _coveringIndex(dirPath)
+	if idx is not None:
+		node = idx.getNode(dirPath)
+		return node is not None and node["installed"]
+	return _isInstalledTarget(_cachedStableTarget(dirPath))
+
+def getNode(path):
+	"""
+	@returns: A dict keyed by the nodeIndex column names describing path, from
+		the node index if the project has one. None if path is not indexed.
+	"""
+	idx = _coveringIndex(path)
+	if idx is not None:
+		return idx.getNode(path)
+	return _nodeRecord(path)
 
 def getVersionedFolderInfo(dirPath):
-	if not isVersionedFolder(dirPath):
+	node = getNode(dirPath)
+	if node is None or not node["versioned"]:
 		raise Exception("Not a versioned folder")
 	
 	nodeInfo = []
-	cp = ConfigParser()
-	cp.read(os.path.join(dirPath, ".nodeInfo"))
-	if cp.getboolean("Versioning", "locked"):
-		nodeInfo.append(cp.get("Versioning", "lastcheckoutuser"))
+	if node["locked"]:
+		nodeInfo.append(node["lastcheckoutuser"])
 	else:
 		nodeInfo.append("")
-	nodeInfo.append(cp.get("Versioning", "lastcheckinuser"))
-	nodeInfo.append(cp.get("Versioning", "lastcheckintime"))
-	if isInstalled(dirPath):
+	nodeInfo.append(node["lastcheckinuser"])
+	nodeInfo.append(node["lastcheckintime"])
+	if node["installed"]:
 		nodeInfo.append("Yes")
 		nodeInfo.append(os.path.join(dirPath, "inst", "stable"))
 	else:
@@ -195,7 +1379,7 @@ def getVersionedFolderInfo(dirPath):
 	return nodeInfo
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Checkout
-def _createCheckoutInfoFile(dirPath, coPath, version, timestamp, lock):
+def _createCheckoutInfoFile(dirPath, coPath, version, timestamp, lock, strategy="copy"):
 	"""
 	Creates a .checkoutInfo file in the directory specified by dirPath
 	@precondition: dirPath is a valid path
@@ -207,92 +1391,135 @@ def _createCheckoutInfoFile(dirPath, coPath, version, timestamp, lock):
 	chkoutInfo.set("Checkout", "checkouttime", timestamp)
 	chkoutInfo.set("Checkout", "version", version)
 	chkoutInfo.set("Checkout", "lockedbyme", str(lock))
+	chkoutInfo.set("Checkout", "strategy", strategy)
 	
-	_writeConfigFile(os.path.join(dirPath, ".checkoutInfo"), chkoutInfo)
+	_writeMetadataFile(os.path.join(dirPath, ".checkoutInfo"), chkoutInfo)
 
 def isCheckedOut(dirPath):
-	nodeInfo = os.path.join(dirPath, ".nodeInfo")
-	if not os.path.exists(nodeInfo):
+	idx = _coveringIndex(dirPath)
+	if idx is not None:
+		node = idx.getNode(dirPath)
+		return node is not None and node["locked"]
+	cp = _cachedNodeInfo(dirPath)
+	if cp is None:
 		return False
-	cp = ConfigParser()
-	cp.read(nodeInfo)
 	return cp.getboolean("Versioning", "locked")
 
 def getFilesCheckoutTime(filePath):
-	checkoutInfo = os.path.join(filePath, ".checkoutInfo")
-	#print checkoutInfo
-	if not os.path.exists(checkoutInfo):
+	try:
+		cp = _metadataCache.get(os.path.join(filePath, ".checkoutInfo"), metadata.read)
+	except OSError:
 		raise Exception("No checkout info available")
-	cp = ConfigParser()
-	cp.read(checkoutInfo)
 	return cp.get("Checkout", "checkouttime")
 
 def canCheckout(coPath):
-	result = True
-	if not os.path.exists(os.path.join(coPath, ".nodeInfo")):
-		result = False
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(coPath, ".nodeInfo"))
-	if nodeInfo.get("Versioning", "locked") == "True":
-		result = False
-	return result
+	idx = _coveringIndex(coPath)
+	if idx is not None:
+		node = idx.getNode(coPath)
+		return node is not None and node["versioned"] and not node["locked"]
+	nodeInfo = _cachedNodeInfo(coPath)
+	return nodeInfo is not None and nodeInfo.get("Versioning", "locked") != "True"
 
-def checkout(coPath, lock):
+def checkout(coPath, lock, progress=None, version=None):
 	"""
 	Copies the 'latest version' from the src folder into the local directory
 	@precondition: coPath is a path to a versioned folder
 	@precondition: lock is a boolean value
+	@precondition: progress is None or a callback as described in copyFiles()
+	@precondition: version is None for the 'latest version', or an older version number
 	
 	@postcondition: A copy of the 'latest version' will be placed in the local directory
 		with the name of the versioned folder
 	@postdondition: If lock == True coPath will be locked until it is released by checkin
+	@returns: Changes; the local copy is the LOCAL_ADDED path and the summary names
+		the checkout strategy used, see _CheckoutCopier.strategy(), or "archive" for an archived version
 	"""
 	#if not os.path.exists(os.path.join(coPath, ".nodeInfo")):
 	if not isVersionedFolder(coPath):
 		raise Exception("Not a versioned folder.")
 	
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(coPath, ".nodeInfo"))
-	if nodeInfo.get("Versioning", "locked") == "False":
-		version = nodeInfo.get("Versioning", "latestversion")
-		toCopy = os.path.join(coPath, "src", "v"+version)
-		dest = os.path.join(getUserDir(), os.path.basename(os.path.dirname(coPath))+"_"+os.path.basename(coPath)+"_"+version)
-		
-		if(os.path.exists(toCopy)):
-			try:
-				shutil.copytree(toCopy, dest) # Make the copy
-			except Exception:
-				raise Exception("Could not copy files.")
-			timestamp = time.strftime("%a, %d %b %Y %I:%M:%S %p", time.localtime())
-			nodeInfo.set("Versioning", "lastcheckoutuser", getUsername())
-			nodeInfo.set("Versioning", "lastcheckouttime", timestamp)
-			nodeInfo.set("Versioning", "locked", str(lock))
-			
-			_writeConfigFile(os.path.join(coPath, ".nodeInfo"), nodeInfo)
-			_createCheckoutInfoFile(dest, coPath, version, timestamp, lock)
-		else:
-			raise Exception("Version doesn't exist "+toCopy)
-	else:
+	nodeInfo = _readNodeInfo(coPath)
+	if nodeInfo.get("Versioning", "locked") != "False":
 		whoLocked = nodeInfo.get("Versioning", "lastcheckoutuser")
 		whenLocked = nodeInfo.get("Versioning", "lastcheckouttime")
 		raise Exception("Can not checkout. Folder is locked by "+whoLocked+" at "+whenLocked)
+	requested = version
+	if version is None:
+		version = nodeInfo.get("Versioning", "latestversion")
+	version = str(version)
+	toCopy = os.path.join(coPath, "src", "v"+version)
+	dest = os.path.join(getUserDir(), os.path.basename(os.path.dirname(coPath))+"_"+os.path.basename(coPath)+"_"+version)
+	
+	if os.path.exists(toCopy):
+		copier = _CheckoutCopier(getProjectSetting("Checkout", "hardlinks", "False") == "True")
+		try:
+			copyTree(toCopy, dest, progress, _restoringCopier(copier)) # Make the copy
+		except CancelledError:
+			raise
+		except Exception:
+			raise Exception("Could not copy files.")
+		strategy = copier.strategy()
+	elif int(version) in getArchivedVersions(coPath):
+		try:
+			_extractVersion(coPath, int(version), dest, progress)
+		except CancelledError:
+			raise
+		except Exception:
+			raise Exception("Could not extract archived version.")
+		strategy = "archive"
+	else:
+		raise Exception("Version doesn't exist "+toCopy)
+	
+	timestamp = metadata.formatTime(time.time())
+	changes = Changes("Checked out " + os.path.basename(dest) + " (" + strategy + ")", [(LOCAL_ADDED, dest)])
+	if lock:
+		# Only a locking checkout records who has the folder, and only if
+		# nobody checked in or locked it while the files were copied.
+		# Anyone else's lock is never touched by a checkout.
+		def update(nodeInfo):
+			if nodeInfo.get("Versioning", "locked") != "False":
+				raise Exception("Can not checkout. Folder was locked by " +
+					nodeInfo.get("Versioning", "lastcheckoutuser") + " while the files were copied")
+			if requested is None and nodeInfo.get("Versioning", "latestversion") != version:
+				raise Exception("Can not checkout. A newer version of " + os.path.basename(coPath) +
+					" was checked in while the files were copied")
+			nodeInfo.set("Versioning", "lastcheckoutuser", getUsername())
+			nodeInfo.set("Versioning", "lastcheckouttime", timestamp)
+			nodeInfo.set("Versioning", "locked", "True")
+		# The files are only copied once; a busy lock only retries the update
+		for attempt in range(NODE_INFO_RETRIES):
+			try:
+				_updateNodeInfo(coPath, update)
+				break
+			except NodeInfoConflict:
+				if attempt < NODE_INFO_RETRIES - 1:
+					continue
+				shutil.rmtree(dest)
+				raise
+			except BaseException:
+				shutil.rmtree(dest)
+				raise
+		changes.append((PROJECT_CHANGED, coPath))
+	_createCheckoutInfoFile(dest, coPath, version, timestamp, lock, strategy)
+	return changes
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Checkin
 def canCheckin(toCheckin):
 	"""
 	@returns: True if destination is not locked by another user
 		AND this checkin will not overwrite a newer version
+	@raises Exception: if destination is not a versioned folder any more
 	"""
-	chkoutInfo = ConfigParser()
-	chkoutInfo.read(os.path.join(toCheckin, ".checkoutInfo"))
+	chkoutInfo = getCheckoutInfo(toCheckin)
 	chkInDest = chkoutInfo.get("Checkout", "checkedoutfrom")
 	version = chkoutInfo.getint("Checkout", "version")
 	lockedbyme = chkoutInfo.getboolean("Checkout", "lockedbyme")
 	
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(chkInDest, ".nodeInfo"))
-	locked = nodeInfo.getboolean("Versioning", "locked")
-	latestVersion = nodeInfo.getint("Versioning", "latestversion")
+	node = getNode(chkInDest)
+	if node is None or not node["versioned"]:
+		raise Exception("Can not checkin. " + chkInDest + " is not a versioned folder")
+	locked = node["locked"]
+	latestVersion = node["latestversion"]
 	
 	#TODO raise different exceptions to give override options to the user
 	result = True
@@ -304,84 +1531,384 @@ def canCheckin(toCheckin):
 	
 	return result
 
-def purge(dirPath, upto):
+def purge(dirPath, upto, toArchive=None):
 	"""
 	purges all folders in dirPath with a version less than upto
+	and the blobs that only they used
+	@precondition: toArchive is True to keep the versions as compressed archives,
+		see archiveVersion(), or None for [Archive] enabled
 	"""
-	files = glob.glob(os.path.join(dirPath, '*'))
-	for f in files:
-		if int(os.path.basename(f).split('v')[1]) < upto:
-			shutil.rmtree(f)
+	if toArchive is None:
+		toArchive = _useArchive()
+	versions = [v for v in _versionNumbers(dirPath) if v < upto]
+	for v in versions:
+		if toArchive:
+			archiveVersion(os.path.dirname(dirPath), v)
+		# Another checkin may be purging the same versions
+		_trashVersion(dirPath, v)
+	_emptyTrash(dirPath, 0)
+	if versions:
+		collectBlobGarbage()
 
 def discard(toDiscard):
 	"""
 	Discards a local checked out folder without creating a new version.
+	@returns: Changes; the versioned folder toDiscard was checked out from is the PROJECT_CHANGED path
 	"""
-	chkoutInfo = ConfigParser()
-	chkoutInfo.read(os.path.join(toDiscard, ".checkoutInfo"))
+	chkoutInfo = getCheckoutInfo(toDiscard)
 	chkInDest = chkoutInfo.get("Checkout", "checkedoutfrom")
 
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(chkInDest, ".nodeInfo"))
-
-	nodeInfo.set("Versioning", "locked", "False")
-	_writeConfigFile(os.path.join(chkInDest, ".nodeInfo"), nodeInfo)
+	if chkoutInfo.getboolean("Checkout", "lockedbyme"):
+		_updateNodeInfo(chkInDest, lambda nodeInfo: nodeInfo.set("Versioning", "locked", "False"))
 
 	shutil.rmtree(toDiscard)
+	return Changes("Discarded " + os.path.basename(toDiscard), [(LOCAL_REMOVED, toDiscard), (PROJECT_CHANGED, chkInDest)])
 
-def checkin(toCheckin):
+def checkin(toCheckin, progress=None):
 	"""
 	Checks a folder back in as the newest version
 	@precondition: toCheckin is a valid path
 	@precondition: canCheckin() == True OR all conflicts have been resolved
+	@precondition: progress is None or a callback as described in copyFiles()
+	@returns: Changes; the versioned folder toCheckin was checked in to is the PROJECT_CHANGED path
 	"""
-	chkoutInfo = ConfigParser()
-	chkoutInfo.read(os.path.join(toCheckin, ".checkoutInfo"))
+	chkoutInfo = getCheckoutInfo(toCheckin)
 	chkInDest = chkoutInfo.get("Checkout", "checkedoutfrom")
 	lockedbyme = chkoutInfo.getboolean("Checkout", "lockedbyme")
-	
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(chkInDest, ".nodeInfo"))
-	locked = nodeInfo.getboolean("Versioning", "locked")
-	newVersion = nodeInfo.getint("Versioning", "latestversion") + 1
-	newVersionPath = os.path.join(chkInDest, "src", "v"+str(newVersion))
+	version = chkoutInfo.getint("Checkout", "version")
+	coVersionPath = os.path.join(chkInDest, "src", "v"+str(version))
 	
 	if not canCheckin(toCheckin):
 		raise Exception("Can not overwrite locked folder.")
 	
-	# Checkin
-	shutil.copytree(toCheckin, newVersionPath)
+	# Checkin: copy into a hidden folder first, the version number is only
+	# taken once the copy is complete so several artists can copy at once
+	incomingDir = tempfile.mkdtemp(prefix=".incoming", dir=os.path.join(chkInDest, "src"))
+	incoming = os.path.join(incomingDir, "v")
+	try:
+		if _getStorageMode() == "dedup":
+			copyTree(toCheckin, incoming, progress, _blobCopier(toCheckin, coVersionPath))
+		else:
+			copyTree(toCheckin, incoming, progress)
+		os.remove(os.path.join(incoming, ".checkoutInfo"))
+		files = manifest.build(incoming, _hashFile, _previousManifestFiles(chkInDest, version))
+		
+		timestamp = metadata.formatTime(time.time())
+		taken = []
+		def update(nodeInfo):
+			# canCheckin() again, now that nobody can change the metadata
+			if not lockedbyme:
+				if nodeInfo.getboolean("Versioning", "locked"):
+					raise Exception("Can not overwrite locked folder.")
+				if version < nodeInfo.getint("Versioning", "latestversion"):
+					raise NodeInfoConflict("A newer version of " + os.path.basename(chkInDest) + " was checked in")
+			newVersion = nodeInfo.getint("Versioning", "latestversion") + 1
+			taken.append(os.path.join(chkInDest, "src", "v"+str(newVersion)))
+			os.rename(incoming, taken[0])
+			nodeInfo.set("Versioning", "lastcheckintime", timestamp)
+			nodeInfo.set("Versioning", "lastcheckinuser", getUsername())
+			nodeInfo.set("Versioning", "latestversion", str(newVersion))
+			nodeInfo.set("Versioning", "locked", "False")
+		def undo():
+			# The version number was not taken after all, don't leave an orphan src/vN
+			if taken and os.path.isdir(taken[0]) and not os.path.exists(incoming):
+				os.rename(taken[0], incoming)
+		_updateNodeInfo(chkInDest, update, undo=undo)
+	finally:
+		shutil.rmtree(incomingDir, ignore_errors=True)
+	newVersionPath = taken[0]
+	newVersion = int(os.path.basename(newVersionPath)[1:])
+	_writeManifest(chkInDest, newVersion, files, getUsername(), timestamp)
 	
-	timestamp = time.strftime("%a, %d %b %Y %I:%M:%S %p", time.localtime())
-	nodeInfo.set("Versioning", "lastcheckintime", timestamp)
-	nodeInfo.set("Versioning", "lastcheckinuser", getUsername())
-	nodeInfo.set("Versioning", "latestversion", str(newVersion))
-	nodeInfo.set("Versioning", "locked", "False")
-	_writeConfigFile(os.path.join(chkInDest, ".nodeInfo"), nodeInfo)
+	# Clean up
+	shutil.rmtree(toCheckin)
 	
 	#print glob.glob(os.path.join(chkInDest, "src", "*"))
-	purge(os.path.join(chkInDest, "src"), newVersion - 5)
+	scheduleGarbageCollection(chkInDest)
+	return Changes("Checked in " + os.path.basename(chkInDest) + " as version " + str(newVersion),
+		[(LOCAL_REMOVED, toCheckin), (PROJECT_CHANGED, chkInDest)])
 
-	# Clean up
-	shutil.rmtree(toCheckin)
-	os.remove(os.path.join(newVersionPath, ".checkoutInfo"))
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Manifests
+# checkin() writes src/.manifests/vN.json for every version, see manifest.py.
+# Manifests are kept when their version is removed, so the history still
+# lists it. A version checked in before manifests existed gets one the first
+# time it is asked for.
+MANIFEST_DIR = ".manifests"
+
+def _manifestPath(vDirPath, version):
+	return os.path.join(vDirPath, "src", MANIFEST_DIR, "v%d.json" % int(version))
+
+def _writeManifest(vDirPath, version, files, user, timestamp):
+	path = _manifestPath(vDirPath, version)
+	try:
+		os.mkdir(os.path.dirname(path))
+	except OSError, e:
+		if e.errno != errno.EEXIST:
+			raise
+	m = {"format": manifest.FORMAT, "version": int(version), "user": user, "time": timestamp, "files": files}
+	manifest.write(path, m)
+	return m
+
+def _previousManifestFiles(vDirPath, version):
+	"""@returns: The files of the manifest of version if it has one, else None"""
+	try:
+		return _metadataCache.get(_manifestPath(vDirPath, version), manifest.read)["files"]
+	except (OSError, IOError):
+		return None
+
+def _buildManifestFiles(versionPath):
+	"""@returns: The files of a manifest of src/vN, with delta files rebuilt"""
+	if not _hasDeltas(versionPath):
+		return manifest.build(versionPath, _hashFile)
+	tmpDir = tempfile.mkdtemp(prefix=".materialize", dir=os.path.dirname(versionPath))
+	try:
+		copyTree(versionPath, os.path.join(tmpDir, "v"), None, _restoringCopier(_copyFile))
+		return manifest.build(os.path.join(tmpDir, "v"), _hashFile)
+	finally:
+		shutil.rmtree(tmpDir, ignore_errors=True)
+
+def getManifest(vDirPath, version):
+	"""
+	@returns: The manifest of version of vDirPath, see manifest.py
+	@postcondition: the manifest is written if the version had none
+	"""
+	try:
+		return _metadataCache.get(_manifestPath(vDirPath, version), manifest.read)
+	except (OSError, IOError):
+		pass
+	versionPath = os.path.join(vDirPath, "src", "v" + str(version))
+	if os.path.isdir(versionPath):
+		files = _buildManifestFiles(versionPath)
+	elif int(version) in getArchivedVersions(vDirPath):
+		files = manifest.fromArchiveIndex(getArchiveIndex(vDirPath, version))
+	else:
+		raise Exception("Version doesn't exist " + versionPath)
+	user = timestamp = None
+	nodeInfo = _cachedNodeInfo(vDirPath)
+	if nodeInfo is not None and nodeInfo.getint("Versioning", "latestversion") == int(version):
+		user = nodeInfo.get("Versioning", "lastcheckinuser")
+		timestamp = nodeInfo.get("Versioning", "lastcheckintime")
+	return _writeManifest(vDirPath, version, files, user, timestamp)
+
+_manifestJobs = set()
+_manifestJobsLock = threading.Lock()
+
+def _buildManifestLater(vDirPath, version):
+	"""Writes the manifest of a version that has none on a background thread"""
+	key = (os.path.abspath(vDirPath), int(version))
+	with _manifestJobsLock:
+		if key in _manifestJobs:
+			return
+		_manifestJobs.add(key)
+	def build():
+		try:
+			getManifest(vDirPath, version)
+		except Exception, e:
+			print "Manifest of " + vDirPath + " version " + str(version) + ": " + str(e)
+		finally:
+			with _manifestJobsLock:
+				_manifestJobs.discard(key)
+	thread = threading.Thread(target=build)
+	thread.daemon = True
+	thread.start()
+
+def _manifestVersions(vDirPath):
+	manifestDir = os.path.join(vDirPath, "src", MANIFEST_DIR)
+	if not os.path.isdir(manifestDir):
+		return []
+	names = [n[1:-len(".json")] for n in os.listdir(manifestDir) if n.startswith("v") and n.endswith(".json")]
+	return [int(n) for n in names if n.isdigit()]
+
+def getVersionHistory(vDirPath):
+	"""
+	@returns: A dict per version of vDirPath, oldest first: version, user, time,
+		files (how many), bytes, and state, one of "available", "archived" or "removed"
+	"""
+	if not isVersionedFolder(vDirPath):
+		raise Exception("Not a versioned folder.")
+	available = set(_versionNumbers(os.path.join(vDirPath, "src")))
+	archived = set(getArchivedVersions(vDirPath))
+	history = []
+	for v in sorted(available | archived | set(_manifestVersions(vDirPath))):
+		try:
+			m = getManifest(vDirPath, v)
+		except Exception:
+			# Removed meanwhile, without a manifest
+			continue
+		state = "available" if v in available else "archived" if v in archived else "removed"
+		history.append({"version": v, "user": m["user"], "time": m["time"], "files": len(m["files"]),
+			"bytes": manifest.totalSize(m["files"]), "state": state})
+	return history
+
+def diffVersions(vDirPath, old, new):
+	"""
+	Compares two versions of vDirPath by their manifests, without reading their files.
+	@returns: {"added", "removed", "changed"}: sorted paths relative to the version folders
+	"""
+	return manifest.diff(getManifest(vDirPath, old)["files"], getManifest(vDirPath, new)["files"])
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Update
+# updateCheckout() brings a checkout up to the latest version in place. The
+# manifests of the checked out and the latest version say which files
+# differ; only those are looked at in the checkout and copied. New files are
+# copied into a hidden folder in the checkout first and then renamed over the
+# old ones, so a cancelled copy leaves the checkout as it was and a read-only
+# hardlink into an older version is replaced instead of written through.
+UPDATE_STAGING_PREFIX = ".update"
+
+class UpdateConflict(Exception):
+	"""Raised when files an update would change were also changed in the checkout, which paths lists"""
+	def __init__(self, message, paths):
+		Exception.__init__(self, message)
+		self.paths = paths
+
+def _matchesEntry(path, entry):
+	"""@returns: True if the file path is what the manifest entry describes"""
+	try:
+		st = os.lstat(path)
+	except OSError:
+		return False
+	if "link" in entry:
+		return stat.S_ISLNK(st.st_mode) and os.readlink(path) == entry["link"]
+	if not stat.S_ISREG(st.st_mode) or st.st_size != entry["size"]:
+		return False
+	if manifest.sameMtime(st.st_mtime, entry["mtime"]):
+		return True
+	return "hash" in entry and _hashFile(path) == entry["hash"]
+
+def canUpdate(toUpdate):
+	"""@returns: True if a newer version of the folder toUpdate was checked out from has been checked in"""
+	chkoutInfo = getCheckoutInfo(toUpdate)
+	node = getNode(chkoutInfo.get("Checkout", "checkedoutfrom"))
+	return node is not None and node["versioned"] and chkoutInfo.getint("Checkout", "version") < node["latestversion"]
+
+def getCheckoutUpdate(toUpdate):
+	"""
+	Works out what updateCheckout() would do.
+	@returns: A dict: from (the versioned folder), version (the checked out one),
+		latest, added, changed and removed (sorted paths relative to toUpdate, see
+		manifest.diff()), and conflicts: those of them that were also changed,
+		added or removed in toUpdate
+	"""
+	chkoutInfo = getCheckoutInfo(toUpdate)
+	coPath = chkoutInfo.get("Checkout", "checkedoutfrom")
+	version = chkoutInfo.getint("Checkout", "version")
+	node = getNode(coPath)
+	if node is None or not node["versioned"]:
+		raise Exception("Not a versioned folder: " + coPath)
+	update = {"from": coPath, "version": version, "latest": node["latestversion"],
+		"added": [], "changed": [], "removed": [], "conflicts": []}
+	if version >= update["latest"]:
+		return update
+	old = getManifest(coPath, version)["files"]
+	new = getManifest(coPath, update["latest"])["files"]
+	update.update(manifest.diff(old, new))
+	conflicts = []
+	for relPath in update["added"]:
+		path = os.path.join(toUpdate, relPath)
+		if os.path.lexists(path) and not _matchesEntry(path, new[relPath]):
+			conflicts.append(relPath)
+	for relPath in update["changed"]:
+		path = os.path.join(toUpdate, relPath)
+		if not _matchesEntry(path, old[relPath]) and not _matchesEntry(path, new[relPath]):
+			conflicts.append(relPath)
+	for relPath in update["removed"]:
+		path = os.path.join(toUpdate, relPath)
+		if os.path.lexists(path) and not _matchesEntry(path, old[relPath]):
+			conflicts.append(relPath)
+	update["conflicts"] = sorted(conflicts)
+	return update
+
+def _removeEmptyDirs(dirPath, root):
+	while dirPath != root and dirPath.startswith(root + os.sep) and os.path.isdir(dirPath) and not os.listdir(dirPath):
+		os.rmdir(dirPath)
+		dirPath = os.path.dirname(dirPath)
+
+def updateCheckout(toUpdate, progress=None):
+	"""
+	Brings the checked out folder toUpdate up to the latest version: copies the
+	files that were added or changed since the checked out version and removes
+	the ones that were removed. Other files in toUpdate are left alone.
+	@precondition: progress is None or a callback as described in copyFiles()
+	@postcondition: .checkoutInfo names the latest version and the time of the update
+	@returns: Changes; toUpdate is the LOCAL_CHANGED path
+	@raises UpdateConflict: if the checkout has changes to any of those files;
+		nothing is changed then
+	"""
+	toUpdate = os.path.abspath(toUpdate)
+	name = os.path.basename(toUpdate)
+	update = getCheckoutUpdate(toUpdate)
+	if update["version"] >= update["latest"]:
+		return Changes(name + " is up to date")
+	if update["conflicts"]:
+		raise UpdateConflict("Can not update, changed in " + name + ": " + ", ".join(update["conflicts"]),
+			update["conflicts"])
+	coPath = update["from"]
+	latestPath = os.path.join(coPath, "src", "v" + str(update["latest"]))
+	if not os.path.isdir(latestPath):
+		raise Exception("Version doesn't exist " + latestPath)
+	new = getManifest(coPath, update["latest"])["files"]
+	toCopy = update["added"] + update["changed"]
+	
+	staging = tempfile.mkdtemp(prefix=UPDATE_STAGING_PREFIX, dir=toUpdate)
+	try:
+		pairs = []
+		for relPath in toCopy:
+			staged = os.path.join(staging, relPath)
+			if not os.path.isdir(os.path.dirname(staged)):
+				os.makedirs(os.path.dirname(staged))
+			if "link" in new[relPath]:
+				os.symlink(new[relPath]["link"], staged)
+			else:
+				pairs.append((os.path.join(latestPath, relPath), staged))
+		# The latest version is always whole, it never has deltas
+		copyFiles(pairs, progress, _CheckoutCopier(getProjectSetting("Checkout", "hardlinks", "False") == "True"))
+		for relPath in toCopy:
+			target = os.path.join(toUpdate, relPath)
+			if not os.path.isdir(os.path.dirname(target)):
+				os.makedirs(os.path.dirname(target))
+			os.rename(os.path.join(staging, relPath), target)
+		for relPath in update["removed"]:
+			target = os.path.join(toUpdate, relPath)
+			if os.path.lexists(target):
+				os.remove(target)
+			_removeEmptyDirs(os.path.dirname(target), toUpdate)
+	finally:
+		shutil.rmtree(staging, ignore_errors=True)
+	
+	chkoutInfo = getCheckoutInfo(toUpdate)
+	strategy = chkoutInfo.get("Checkout", "strategy") if chkoutInfo.has_option("Checkout", "strategy") else "copy"
+	_createCheckoutInfoFile(toUpdate, coPath, str(update["latest"]), metadata.formatTime(time.time()),
+		chkoutInfo.getboolean("Checkout", "lockedbyme"), strategy)
+	return Changes("Updated %s from version %d to %d: %d added, %d changed, %d removed" % (name,
+		update["version"], update["latest"], len(update["added"]), len(update["changed"]), len(update["removed"])),
+		[(LOCAL_CHANGED, toUpdate)])
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Install
-def getAvailableInstallFiles(vDirPath):
+def getAvailableInstallFiles(vDirPath, version=None):
 	"""
+	Files stored as deltas are listed under their own name; install() rebuilds them.
+	@precondition: version is None for the latest version, or an older version number
 	@returns: a list of all file paths in this directory
 	"""
 	#if not os.path.exists(os.path.join(vDirPath, ".nodeInfo")):
 	if not isVersionedFolder(vDirPath):
 		raise Exception("Not a versioned folder.")
 	
-	nodeInfo = ConfigParser()
-	nodeInfo.read(os.path.join(vDirPath, ".nodeInfo"))
-	version = nodeInfo.get("Versioning", "latestversion")
-	latest = os.path.join(vDirPath, "src", "v"+version)
+	if version is None:
+		version = _cachedNodeInfo(vDirPath).get("Versioning", "latestversion")
+	latest = os.path.join(vDirPath, "src", "v"+str(version))
 	
-	files = glob.glob(os.path.join(latest,'*'))
-	return files
+	try:
+		files = _metadataCache.get(_manifestPath(vDirPath, version), manifest.read)["files"]
+	except (OSError, IOError):
+		# Hashing the version would keep the caller waiting
+		_buildManifestLater(vDirPath, version)
+		files = glob.glob(os.path.join(latest,'*'))
+		return sorted([f[:-len(DELTA_EXT)] if f.endswith(DELTA_EXT) else f for f in files])
+	# The files and folders at the top of the version
+	names = set([f.split(os.sep)[0] for f in files])
+	return [os.path.join(latest, n) for n in sorted(names) if not n.startswith(".")]
 
 def _isHoudiniFile(filename):
 	"""
@@ -398,28 +1925,696 @@ def _isMayaFile(filename):
 	mayaExts = ['.ma', '.mb']
 	name, ext = os.path.splitext(filename)
 	return ext in mayaExts
-	
-def install(vDirPath, srcFilePath, setStable):
+
+def _installCommand(filePath):
+	"""@returns: The install script command for a maya or houdini file, or None for other files"""
+	if _isHoudiniFile(filePath):
+		return [getHoudiniPython(), "installHoudiniFile.py"]
+	elif _isMayaFile(filePath):
+		return [getMayapy(), "installMayaFile.py"]
+	return None
+
+def _usePersistentWorkers():
+	return getProjectSetting("Install", "persistentWorkers", "False") == "True"
+
+def _workerPool(command):
 	"""
-	Installs a file for production use and flattens maya/houdini dependencies.
-	Use getAvailableInstallFiles(dirPath) to get a list of files.
-	@precondition: vDirPath and srcFilePath are valid paths
-	@postcondition: if setStable == True then stable symlink will point to filename
+	@returns: The pool of long-lived worker processes for command (see installWorker.py),
+		which are restarted after [Install] workerMaxJobs installs.
+		[Install] workers sets how many worker processes each DCC may have.
+	"""
+	import installWorker
+	return installWorker.getPool(command + ["--serve"],
+		int(getProjectSetting("Install", "workers", "1")),
+		int(getProjectSetting("Install", "workerMaxJobs", str(installWorker.DEFAULT_MAX_JOBS))),
+		_workerTimeout())
+
+def _workerTimeout():
+	"""@returns: [Install] workerTimeout, the seconds after which a worker that has not finished an install is killed"""
+	import installWorker
+	return float(getProjectSetting("Install", "workerTimeout", installWorker.DEFAULT_TIMEOUT))
+
+def _installFile(vDirPath, srcFilePath, setStable, installer):
+	"""
+	Picks the name of the new installed file, rebuilds srcFilePath if it is
+	stored as a delta and calls installer(srcFilePath, newInstFilePath).
+	@returns: The path of the installed file
 	"""
 	instDir = os.path.join(vDirPath, "inst")
 	numFiles = len(glob.glob(os.path.join(instDir, '*')))
 	instName, instExt = os.path.splitext(os.path.basename(srcFilePath))
 	newInstFilePath = os.path.join(instDir, instName + '_' + str(numFiles) + instExt)
 	
-	if _isHoudiniFile(newInstFilePath):
-		call([getHoudiniPython(), "installHoudiniFile.py", srcFilePath, newInstFilePath])
-	elif _isMayaFile(newInstFilePath):
-		call([getMayapy(), "installMayaFile.py", srcFilePath, newInstFilePath])
-	else:
-		#Just copy the file
-		shutil.copy(srcFilePath, newInstFilePath)
+	versionFilePath = srcFilePath
+	materialized = None
+	if not os.path.exists(srcFilePath) and os.path.exists(srcFilePath + DELTA_EXT):
+		materialized = tempfile.mkdtemp(prefix=".materialize", dir=os.path.join(vDirPath, "src"))
+		_materializeFile(srcFilePath, os.path.join(materialized, os.path.basename(srcFilePath)))
+		srcFilePath = os.path.join(materialized, os.path.basename(srcFilePath))
+	try:
+		with tracing.span("installer", file=os.path.basename(srcFilePath)):
+			installer(srcFilePath, newInstFilePath)
+	except CancelledError:
+		if os.path.exists(newInstFilePath):
+			os.remove(newInstFilePath)
+		raise
+	finally:
+		if materialized is not None:
+			shutil.rmtree(materialized)
+	_recordInstalledVersion(vDirPath, versionFilePath)
 	
 	if setStable:
 		#TODO os.symlink() doesn't work in windows
 		os.unlink(os.path.join(instDir, 'stable'))
 		os.symlink(newInstFilePath, os.path.join(instDir, 'stable'))
+		_updateIndex(vDirPath)
+	return newInstFilePath
+
+def install(vDirPath, srcFilePath, setStable, progress=None, priority=None):
+	"""
+	Installs a file for production use and flattens maya/houdini dependencies.
+	Use getAvailableInstallFiles(dirPath) to get a list of files.
+	If [Install] persistentWorkers is True in .projectInfo maya/houdini files are
+	handed to a long-lived worker process instead of starting the DCC for each install.
+	If [InstallQueue] enabled is True the install is added to the project's install
+	queue and this waits until a scheduler has run it, see enqueueInstall().
+	@precondition: vDirPath and srcFilePath are valid paths
+	@precondition: progress is None or a callback as described in copyFiles()
+	@precondition: priority is None or a queue priority, see installQueue.py
+	@postcondition: if setStable == True then stable symlink will point to filename
+	@returns: Changes; the installed file is the INSTALLED_FILE path
+	"""
+	if _useInstallQueue():
+		newInstFilePath = waitForInstall(enqueueInstall(vDirPath, srcFilePath, setStable, priority), progress)
+	else:
+		newInstFilePath = _installNow(vDirPath, srcFilePath, setStable, progress)
+	return Changes("Installed " + os.path.basename(newInstFilePath),
+		[(INSTALLED_FILE, newInstFilePath), (PROJECT_CHANGED, vDirPath)])
+
+def _installNow(vDirPath, srcFilePath, setStable, progress=None):
+	"""
+	Does the work of install() in this process.
+	@returns: The path of the installed file
+	"""
+	command = _installCommand(srcFilePath)
+	status = CopyStatus(0, 1)
+	def installer(src, dst):
+		if command is None:
+			#Just copy the file
+			copyFiles([(src, dst)], progress)
+		elif _usePersistentWorkers():
+			_workerPool(command).install(src, dst, progress and (lambda: progress(status)))
+		else:
+			_callCancellable(command + [src, dst], progress)
+	return _installFile(vDirPath, srcFilePath, setStable, installer)
+
+def batchInstall(entries, progress=None):
+	"""
+	Installs many files, starting each DCC once: all maya files are installed in
+	sequence by one installMayaFile.py process and all houdini files by one
+	installHoudiniFile.py process (or by the persistent workers, see install()).
+	With [InstallQueue] enabled the entries are queued instead, one kind after
+	the other, so the project's limits apply to them; see enqueueInstall().
+	A failed entry does not stop the others.
+	@precondition: entries is a list of (vDirPath, srcFilePath, setStable)
+	@precondition: progress is None or a callback as described in copyFiles()
+	@returns: A list with one (vDirPath, srcFilePath, newInstFilePath, error) per entry,
+		in the order of entries. newInstFilePath is None and error the message if it failed.
+	"""
+	import installWorker
+	status = CopyStatus(0, len(entries))
+	tick = progress and (lambda: progress(status))
+	groups = {}
+	for i, entry in enumerate(entries):
+		command = _installCommand(entry[1])
+		groups.setdefault(command and tuple(command), []).append(i)
+	
+	if _useInstallQueue():
+		return _batchInstallQueued(entries, [i for indices in groups.values() for i in indices], status, progress)
+	report = [None] * len(entries)
+	for command, indices in groups.items():
+		worker = None
+		if command is None:
+			installer = lambda src, dst: copyFiles([(src, dst)])
+		else:
+			if _usePersistentWorkers():
+				worker = _workerPool(list(command))
+			else:
+				worker = installWorker.InstallWorker(list(command) + ["--serve"], len(indices), _workerTimeout())
+			installer = lambda src, dst: worker.install(src, dst, tick)
+		try:
+			for i in indices:
+				vDirPath, srcFilePath, setStable = entries[i]
+				try:
+					newInstFilePath = _installFile(vDirPath, srcFilePath, setStable, installer)
+					report[i] = (vDirPath, srcFilePath, newInstFilePath, None)
+				except CancelledError:
+					raise
+				except Exception, e:
+					report[i] = (vDirPath, srcFilePath, None, str(e))
+				status.filesDone += 1
+				if progress is not None:
+					progress(status)
+		finally:
+			if isinstance(worker, installWorker.InstallWorker):
+				worker.stop()
+	return report
+
+def _batchInstallQueued(entries, order, status, progress):
+	"""
+	batchInstall() through the install queue: adds the entries in order and
+	waits for them. If progress raises CancelledError the entries that have
+	not started yet are taken out of the queue.
+	"""
+	jobIds = {}
+	for i in order:
+		vDirPath, srcFilePath, setStable = entries[i]
+		jobIds[i] = enqueueInstall(vDirPath, srcFilePath, setStable)
+	report = [None] * len(entries)
+	tick = progress and (lambda s: progress(status))
+	try:
+		for i in order:
+			vDirPath, srcFilePath, setStable = entries[i]
+			try:
+				report[i] = (vDirPath, srcFilePath, waitForInstall(jobIds[i], tick), None)
+			except CancelledError:
+				raise
+			except Exception, e:
+				report[i] = (vDirPath, srcFilePath, None, str(e))
+			status.filesDone += 1
+			if progress is not None:
+				progress(status)
+	except CancelledError:
+		queue = getInstallQueue()
+		for i in order:
+			if report[i] is None:
+				queue.remove(jobIds[i])
+		raise
+	return report
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Install Queue
+# With [InstallQueue] enabled = True in .projectInfo installs go through a queue
+# in the project directory that every session shares, see installQueue.py.
+# [InstallQueue] maya, houdini and copy cap how many installs of each kind run
+# at once in the whole project.
+_scheduler = None
+_schedulerLock = threading.Lock()
+
+def _useInstallQueue():
+	return getProjectSetting("InstallQueue", "enabled", "False") == "True"
+
+def _dccName(filePath):
+	if _isHoudiniFile(filePath):
+		return "houdini"
+	elif _isMayaFile(filePath):
+		return "maya"
+	return "copy"
+
+def getInstallQueue():
+	import installQueue
+	return installQueue.InstallQueue(getProjectDir())
+
+def startInstallScheduler():
+	"""
+	Starts running queued installs in this process if it does not already.
+	@returns: The scheduler thread
+	"""
+	import installQueue
+	global _scheduler
+	with _schedulerLock:
+		if _scheduler is None:
+			limits = dict((dcc, int(getProjectSetting("InstallQueue", dcc, str(limit))))
+				for dcc, limit in installQueue.DEFAULT_LIMITS.items())
+			_scheduler = installQueue.InstallScheduler(getInstallQueue(), _installNow, limits)
+			_scheduler.start()
+		return _scheduler
+
+def stopInstallScheduler():
+	"""Stops taking new jobs from the queue; installs already running finish"""
+	global _scheduler
+	with _schedulerLock:
+		if _scheduler is not None:
+			_scheduler.stop()
+			_scheduler.join(5)
+			_scheduler = None
+
+atexit.register(stopInstallScheduler)
+
+def enqueueInstall(vDirPath, srcFilePath, setStable, priority=None):
+	"""
+	Adds an install to the project's install queue, and makes sure this
+	process runs queued installs.
+	@precondition: priority is None for installQueue.DEFAULT_PRIORITY, or between 0 and
+		installQueue.MAX_PRIORITY. Higher priorities run first.
+	@returns: The id of the queued job, see waitForInstall()
+	"""
+	import installQueue
+	if priority is None:
+		priority = installQueue.DEFAULT_PRIORITY
+	jobId = getInstallQueue().add(vDirPath, srcFilePath, setStable, _dccName(srcFilePath), priority,
+		addedBy=getUsername())
+	startInstallScheduler()
+	return jobId
+
+def waitForInstall(jobId, progress=None):
+	"""
+	Waits until a queued install has run. If progress raises CancelledError
+	the job is taken out of the queue. A job that has already started can not
+	be stopped from here, so then the cancel is refused and this keeps waiting.
+	@returns: The path of the installed file
+	@raises Exception: if the install failed on its last attempt
+	"""
+	import installQueue
+	queue = getInstallQueue()
+	status = CopyStatus(0, 1)
+	while True:
+		job = queue.getJob(jobId)
+		if job is None:
+			raise Exception("Install job " + jobId + " is no longer in the queue")
+		if job["state"] == installQueue.DONE:
+			return job["result"]
+		if job["state"] == installQueue.FAILED:
+			raise Exception(job["error"])
+		try:
+			if progress is not None:
+				progress(status)
+		except CancelledError:
+			if queue.remove(jobId):
+				raise
+		time.sleep(0.5)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Retention
+# Old versions are removed by a garbage collection pass that runs on a
+# background thread after each checkin (scheduleGarbageCollection()), or for
+# the whole project with collectGarbage(), e.g. from "chasm.py gc".
+# A version is kept if it is one of the last keepLast versions, is younger
+# than keepDays days by the checkin time in its manifest (0 turns the rule
+# off), is pinned, or, with keepInstalled, was ever installed from. The
+# project defaults are [Retention] keepLast, keepDays and keepInstalled in
+# .projectInfo; a versioned folder can override them in the [Retention]
+# section of its .nodeInfo, see setRetentionPolicy().
+# With delta storage a kept version also keeps the newer ones it is rebuilt from.
+# Expired versions are renamed to hidden .trash folders first, so they are
+# gone at once, and then deleted at no more than [Retention] gcRate bytes a
+# second (0 for no limit). When the program exits the background pass is
+# stopped between two files instead of finished; trash, delta and archive
+# temporary folders left behind by a session that stopped or crashed are
+# deleted by the next pass over that versioned folder.
+RETENTION_KEEP_LAST = 6		# the latest and the 5 before it, as checkin always did
+RETENTION_KEEP_DAYS = 0
+GC_RATE = 100 * 1024 * 1024
+TRASH_PREFIX = ".trash"
+# Leftovers younger than this may still be in use by another session
+LEFTOVER_AGE = 3600
+
+def _versionList(text):
+	return set([int(v) for v in text.split(",") if v.strip()])
+
+def getRetentionPolicy(vDirPath):
+	"""
+	@returns: A dict with keepLast, keepDays and keepInstalled, plus the sets
+		pinned and installed of version numbers
+	"""
+	nodeInfo = _cachedNodeInfo(vDirPath)
+	if nodeInfo is None:
+		raise Exception("Not a versioned folder.")
+	def option(name, default):
+		if nodeInfo.has_option("Retention", name.lower()):
+			return nodeInfo.get("Retention", name.lower())
+		return getProjectSetting("Retention", name, default)
+	policy = {"keepLast": max(1, int(option("keepLast", RETENTION_KEEP_LAST))),
+		"keepDays": float(option("keepDays", RETENTION_KEEP_DAYS)),
+		"keepInstalled": str(option("keepInstalled", True)) == "True",
+		"pinned": set(), "installed": set()}
+	for name in ["pinned", "installed"]:
+		if nodeInfo.has_option("Retention", name):
+			policy[name] = _versionList(nodeInfo.get("Retention", name))
+	return policy
+
+def _setRetentionOption(nodeInfo, option, value):
+	if not nodeInfo.has_section("Retention"):
+		nodeInfo.add_section("Retention")
+	nodeInfo.set("Retention", option, value)
+
+def setRetentionPolicy(vDirPath, keepLast=None, keepDays=None, keepInstalled=None):
+	"""Overrides the project's retention settings for one versioned folder; None leaves a setting as it is"""
+	def update(nodeInfo):
+		for option, value in [("keeplast", keepLast), ("keepdays", keepDays), ("keepinstalled", keepInstalled)]:
+			if value is not None:
+				_setRetentionOption(nodeInfo, option, str(value))
+	_updateNodeInfo(vDirPath, update)
+
+def _changeVersionList(vDirPath, option, version, add):
+	def update(nodeInfo):
+		versions = set()
+		if nodeInfo.has_option("Retention", option):
+			versions = _versionList(nodeInfo.get("Retention", option))
+		if add:
+			versions.add(int(version))
+		else:
+			versions.discard(int(version))
+		_setRetentionOption(nodeInfo, option, ",".join([str(v) for v in sorted(versions)]))
+	_updateNodeInfo(vDirPath, update)
+
+def pinVersion(vDirPath, version, pinned=True):
+	"""Keeps version of vDirPath (or stops keeping it if pinned is False) whatever the retention policy"""
+	_changeVersionList(vDirPath, "pinned", version, pinned)
+
+def _recordInstalledVersion(vDirPath, srcFilePath):
+	"""Remembers which version srcFilePath is from, for keepInstalled"""
+	try:
+		srcDir, version, rel = _splitVersionPath(srcFilePath)
+	except Exception:
+		return
+	if os.path.dirname(srcDir) == os.path.abspath(vDirPath) and version not in getRetentionPolicy(vDirPath)["installed"]:
+		_changeVersionList(vDirPath, "installed", version, True)
+
+def _versionNumbers(srcDir):
+	names = [n for n in os.listdir(srcDir) if n.startswith("v") and n[1:].isdigit()]
+	return sorted([int(n[1:]) for n in names])
+
+def _hasDeltas(versionPath):
+	for curDir, dirs, names in os.walk(versionPath):
+		for name in names:
+			if name.endswith(DELTA_EXT):
+				return True
+	return False
+
+def _checkinTime(vDirPath, version):
+	"""
+	The time recorded in the manifest, because vN itself is changed later,
+	e.g. when it is stored as deltas.
+	@returns: When version was checked in, in seconds since the epoch, or None
+		if it has no manifest with a time (it was checked in before manifests)
+	"""
+	try:
+		timestamp = _metadataCache.get(_manifestPath(vDirPath, version), manifest.read)["time"]
+	except (OSError, IOError, ValueError, KeyError):
+		return None
+	if not timestamp:
+		return None
+	return metadata.parseTime(timestamp)
+
+def expiredVersions(vDirPath):
+	"""@returns: The version numbers of vDirPath that the retention policy no longer keeps, oldest first"""
+	policy = getRetentionPolicy(vDirPath)
+	srcDir = os.path.join(vDirPath, "src")
+	latest = int(_cachedNodeInfo(vDirPath).get("Versioning", "latestversion"))
+	now = time.time()
+	keep = set()
+	for v in _versionNumbers(srcDir):
+		if v > latest - policy["keepLast"] or v in policy["pinned"]:
+			keep.add(v)
+		elif policy["keepInstalled"] and v in policy["installed"]:
+			keep.add(v)
+		elif policy["keepDays"] > 0 and now - (_checkinTime(vDirPath, v) or 0) < policy["keepDays"] * 86400:
+			keep.add(v)
+		elif v - 1 in keep and _hasDeltas(os.path.join(srcDir, "v" + str(v - 1))):
+			keep.add(v)
+	return [v for v in _versionNumbers(srcDir) if v not in keep and v < latest]
+
+def _trashVersion(srcDir, version):
+	trash = tempfile.mkdtemp(prefix=TRASH_PREFIX, dir=srcDir)
+	try:
+		os.rename(os.path.join(srcDir, "v" + str(version)), os.path.join(trash, "v"))
+	except OSError:
+		# Collected by someone else meanwhile
+		pass
+
+# Set to stop the background pass early, see _stopGarbageCollection()
+_gcStopped = threading.Event()
+
+def _emptyTrash(srcDir, rate):
+	"""
+	Deletes the trash folders in srcDir, at most rate bytes a second if rate > 0.
+	What is left when the garbage collection is stopped is deleted by the next pass.
+	@returns: The number of bytes freed
+	"""
+	freed = 0
+	start = time.time()
+	for name in os.listdir(srcDir):
+		if not name.startswith(TRASH_PREFIX):
+			continue
+		for curDir, dirs, names in os.walk(os.path.join(srcDir, name), topdown=False):
+			for n in names:
+				if _gcStopped.isSet():
+					return freed
+				path = os.path.join(curDir, n)
+				try:
+					st = os.lstat(path)
+					os.remove(path)
+				except OSError:
+					# Another pass is deleting the same trash
+					continue
+				if st.st_nlink == 1:
+					freed += st.st_size
+				if rate > 0:
+					ahead = freed / float(rate) - (time.time() - start)
+					if ahead > 0:
+						_gcStopped.wait(ahead)
+			try:
+				os.rmdir(curDir)
+			except OSError:
+				pass
+	return freed
+
+def collectVersions(vDirPath, rate=None):
+	"""
+	Removes the expired versions of vDirPath and empties its trash. With delta
+	storage the versions that are kept are then stored as deltas.
+	@precondition: rate is None for [Retention] gcRate, or bytes a second (0 for no limit)
+	@returns: The number of bytes freed
+	"""
+	if rate is None:
+		rate = int(getProjectSetting("Retention", "gcRate", GC_RATE))
+	srcDir = os.path.join(vDirPath, "src")
+	expired = expiredVersions(vDirPath)
+	toArchive = _useArchive()
+	for v in expired:
+		if _gcStopped.isSet():
+			break
+		if toArchive:
+			archiveVersion(vDirPath, v)
+		_trashVersion(srcDir, v)
+	_removeLeftovers(os.path.join(srcDir, ARCHIVE_DIR))
+	_removeLeftovers(srcDir, DELTA_TMP_PREFIX)
+	freed = _emptyTrash(srcDir, rate)
+	if expired and _getStorageMode() == "dedup" and not _gcStopped.isSet():
+		freed += collectBlobGarbage()
+	if _getStorageMode() == "delta" and not _gcStopped.isSet():
+		_storeVersionDeltas(vDirPath)
+	return freed
+
+def collectGarbage(projectDir, rate=None):
+	"""
+	Runs collectVersions() on every versioned folder of projectDir.
+	@returns: The number of bytes freed
+	"""
+	freed = 0
+	for curDir, dirs, files in os.walk(projectDir):
+		dirs[:] = [d for d in dirs if not d.startswith(".")]
+		if ".nodeInfo" in files:
+			dirs[:] = []
+			freed += collectVersions(curDir, rate)
+	return freed
+
+class _GarbageCollector(threading.Thread):
+	"""Runs collectVersions() on the versioned folders handed to schedule(), one at a time"""
+	def __init__(self):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self._pending = Queue.Queue()
+	
+	def schedule(self, vDirPath):
+		self._pending.put(vDirPath)
+	
+	def drain(self, timeout):
+		"""
+		Waits until every scheduled collection is done, at most timeout seconds
+		@returns: True if they are done
+		"""
+		deadline = time.time() + timeout
+		with self._pending.all_tasks_done:
+			while self._pending.unfinished_tasks:
+				left = deadline - time.time()
+				if left <= 0:
+					return False
+				self._pending.all_tasks_done.wait(left)
+		return True
+	
+	def run(self):
+		while True:
+			vDirPath = self._pending.get()
+			try:
+				if not _gcStopped.isSet():
+					collectVersions(vDirPath)
+			except Exception, e:
+				print "Garbage collection of " + vDirPath + ": " + str(e)
+			finally:
+				self._pending.task_done()
+
+_collector = None
+_collectorLock = threading.Lock()
+
+def scheduleGarbageCollection(vDirPath):
+	"""Removes the expired versions of vDirPath on a background thread"""
+	global _collector
+	with _collectorLock:
+		if _collector is None:
+			_collector = _GarbageCollector()
+			_collector.start()
+	_collector.schedule(vDirPath)
+
+def _stopGarbageCollection():
+	"""
+	Stops the background pass between two files and skips the scheduled ones,
+	so exiting does not wait for them. The next pass does what is left.
+	"""
+	_gcStopped.set()
+	with _collectorLock:
+		collector = _collector
+	if collector is not None:
+		# The file being deleted, or a .nodeInfo update
+		collector.drain(NODE_INFO_LOCK_TIMEOUT)
+
+atexit.register(_stopGarbageCollection)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Archive
+# With [Archive] enabled = True purge() and the garbage collection keep the
+# versions they remove as compressed tar archives in src/.archive, written by
+# archive.py: vN.tar.xz (or .tar.zst, .tar.gz, see [Archive] compression) and
+# its index vN.index, which lists the files. Files stored as deltas are
+# archived rebuilt, so an archive never needs another version.
+# checkout() of an archived version extracts it straight into the local copy.
+ARCHIVE_DIR = ".archive"
+ARCHIVE_COMPRESSION = "xz"
+
+def _useArchive():
+	return getProjectSetting("Archive", "enabled", "False") == "True"
+
+def _archiveCompression():
+	"""@returns: [Archive] compression, or gz if its command is not installed"""
+	import archive
+	compression = getProjectSetting("Archive", "compression", ARCHIVE_COMPRESSION)
+	if not archive.isAvailable(compression):
+		return "gz"
+	return compression
+
+def _archiveIndexPath(vDirPath, version):
+	return os.path.join(vDirPath, "src", ARCHIVE_DIR, "v%d.index" % int(version))
+
+def getArchivedVersions(vDirPath):
+	"""@returns: The version numbers of vDirPath that are archived, oldest first"""
+	archiveDir = os.path.join(vDirPath, "src", ARCHIVE_DIR)
+	if not os.path.isdir(archiveDir):
+		return []
+	names = [n[1:-len(".index")] for n in os.listdir(archiveDir) if n.startswith("v") and n.endswith(".index")]
+	return sorted([int(n) for n in names if n.isdigit()])
+
+def getArchiveIndex(vDirPath, version):
+	"""@returns: The index of an archived version, see archive.writeArchive()"""
+	import archive
+	try:
+		return archive.readIndex(_archiveIndexPath(vDirPath, version))
+	except IOError:
+		raise Exception("Version isn't archived " + str(version))
+
+def _archiveEntries(versionPath, tmpDir):
+	"""Yields the entries of versionPath for archive.writeArchive(), rebuilding deltas in tmpDir"""
+	import archive
+	for curDir, dirs, names in os.walk(versionPath):
+		dirs.sort()
+		for name in sorted(dirs + names):
+			path = os.path.join(curDir, name)
+			relPath = os.path.relpath(path, versionPath)
+			st = os.lstat(path)
+			if stat.S_ISLNK(st.st_mode):
+				yield relPath, st, os.readlink(path)
+			elif stat.S_ISDIR(st.st_mode):
+				yield relPath, st, None
+			elif name.endswith(DELTA_EXT):
+				rebuilt = os.path.join(tmpDir, "rebuilt")
+				_materializeFile(path[:-len(DELTA_EXT)], rebuilt)
+				yield relPath[:-len(DELTA_EXT)], st, rebuilt
+				os.remove(rebuilt)
+			else:
+				yield relPath, st, path
+
+def archiveVersion(vDirPath, version):
+	"""
+	Writes src/vN of vDirPath to a compressed archive, unless it is archived already.
+	@postcondition: src/vN is left for the caller to remove
+	@returns: The index of the archive
+	"""
+	import archive
+	indexPath = _archiveIndexPath(vDirPath, version)
+	if os.path.exists(indexPath):
+		return archive.readIndex(indexPath)
+	versionPath = os.path.join(vDirPath, "src", "v" + str(version))
+	if not os.path.isdir(versionPath):
+		raise Exception("Version doesn't exist " + versionPath)
+	# The history keeps the hashes of its files
+	getManifest(vDirPath, version)
+	archiveDir = os.path.dirname(indexPath)
+	try:
+		os.mkdir(archiveDir)
+	except OSError, e:
+		if e.errno != errno.EEXIST:
+			raise
+	compression = _archiveCompression()
+	archivePath = os.path.join(archiveDir, "v%d%s" % (int(version), archive.extension(compression)))
+	tmpDir = tempfile.mkdtemp(prefix=".", dir=archiveDir)
+	try:
+		with tracing.span("archive", version=int(version), compression=compression):
+			index = archive.writeArchive(_archiveEntries(versionPath, tmpDir),
+				os.path.join(tmpDir, "archive"), compression)
+		os.rename(os.path.join(tmpDir, "archive"), archivePath)
+	finally:
+		shutil.rmtree(tmpDir, ignore_errors=True)
+	index["archive"] = os.path.basename(archivePath)
+	# The version counts as archived once its index exists
+	archive.writeIndex(indexPath, index)
+	return index
+
+def _removeLeftovers(dirPath, prefix="."):
+	"""
+	Deletes the temporary folders starting with prefix in dirPath that calls which
+	did not finish left behind, e.g. of archiveVersion() in src/.archive
+	"""
+	if not os.path.isdir(dirPath):
+		return
+	for name in os.listdir(dirPath):
+		path = os.path.join(dirPath, name)
+		try:
+			if name.startswith(prefix) and os.path.isdir(path) and time.time() - os.stat(path).st_mtime > LEFTOVER_AGE:
+				shutil.rmtree(path, ignore_errors=True)
+		except OSError:
+			# Removed by another pass
+			pass
+
+def _extractVersion(vDirPath, version, dest, progress):
+	"""Writes an archived version to dest, see checkout()"""
+	import archive
+	index = getArchiveIndex(vDirPath, version)
+	status = CopyStatus(index["bytes"], len([f for f in index["files"] if f["type"] == "file"]))
+	reported = [0.0]
+	def onChunk(size):
+		status.bytesDone += size
+		if progress is not None and time.time() - reported[0] > 0.1:
+			reported[0] = time.time()
+			progress(status)
+	archivePath = os.path.join(os.path.dirname(_archiveIndexPath(vDirPath, version)), index["archive"])
+	try:
+		archive.extractArchive(archivePath, index["compression"], dest, onChunk, writable=True)
+	except BaseException:
+		shutil.rmtree(dest, ignore_errors=True)
+		raise
+	status.filesDone = status.filesTotal
+	if progress is not None:
+		progress(status)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Tracing
+# Every public function is timed while tracing is enabled, see tracing.py.
+# The project getters are left out, they are called too often to be worth a span.
+tracing.instrument(globals(), lambda name: not name.startswith("_") and name not in
+	["getProjectName", "getProjectDir", "getUsername", "getUserDir"], "utilities.")
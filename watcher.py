@@ -0,0 +1,215 @@
+"""
+Watches folders for changes so the asset manager can update just the tree
+items that changed instead of rescanning the project.
+InotifyWatcher uses inotify on Linux. PollingWatcher compares listings of
+the watched folders; it is used where inotify is not available and on
+network filesystems, where inotify does not see changes made on other machines.
+
+Both watchers report events as (dirPath, name) pairs: the entry name in the
+watched folder dirPath was created, removed, renamed or written. (None, None)
+means events were lost and everything should be rescanned.
+Watches are not recursive.
+"""
+
+import os, struct, errno, ctypes, ctypes.util
+
+# inotify constants from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+	IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")
+
+NETWORK_FILESYSTEMS = ["nfs", "nfs4", "cifs", "smbfs", "afs", "fuse.sshfs", "glusterfs", "lustre"]
+
+_libc = None
+def _getLibc():
+	"""@returns: libc if it has inotify, else False"""
+	global _libc
+	if _libc is None:
+		_libc = False
+		try:
+			libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+			if hasattr(libc, "inotify_init1"):
+				_libc = libc
+		except OSError:
+			pass
+	return _libc
+
+def hasInotify():
+	return bool(_getLibc())
+
+def isNetworkFilesystem(path):
+	"""@returns: True if path is on a filesystem listed in NETWORK_FILESYSTEMS"""
+	path = os.path.realpath(path)
+	best, fsType = "", None
+	try:
+		mounts = open("/proc/mounts")
+	except IOError:
+		return False
+	try:
+		for line in mounts:
+			fields = line.split()
+			if len(fields) < 3:
+				continue
+			mountPoint = fields[1].replace("\\040", " ")
+			if (path == mountPoint or path.startswith(mountPoint.rstrip("/") + "/")) and len(mountPoint) >= len(best):
+				best, fsType = mountPoint, fields[2]
+	finally:
+		mounts.close()
+	return fsType in NETWORK_FILESYSTEMS
+
+class InotifyWatcher:
+	"""
+	fileno() becomes readable when there are events; readEvents() then
+	returns them without blocking.
+	"""
+
+	def __init__(self):
+		libc = _getLibc()
+		if not libc:
+			raise OSError(errno.ENOSYS, "inotify is not available")
+		self._libc = libc
+		self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self._fd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e))
+		self._paths = {}
+		self._wds = {}
+
+	def fileno(self):
+		return self._fd
+
+	def watch(self, dirPath):
+		if dirPath in self._wds:
+			return
+		wd = self._libc.inotify_add_watch(self._fd, dirPath, _MASK)
+		if wd < 0:
+			e = ctypes.get_errno()
+			if e in (errno.ENOENT, errno.ENOTDIR):
+				return
+			raise OSError(e, os.strerror(e), dirPath)
+		self._paths[wd] = dirPath
+		self._wds[dirPath] = wd
+
+	def unwatch(self, dirPath):
+		wd = self._wds.pop(dirPath, None)
+		if wd is not None:
+			del self._paths[wd]
+			self._libc.inotify_rm_watch(self._fd, wd)
+
+	def isWatched(self, dirPath):
+		return dirPath in self._wds
+
+	def readEvents(self):
+		events = []
+		while True:
+			try:
+				data = os.read(self._fd, 64 * 1024)
+			except OSError, e:
+				if e.errno == errno.EAGAIN:
+					break
+				raise
+			offset = 0
+			while offset + _EVENT.size <= len(data):
+				wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+				name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip("\0")
+				offset += _EVENT.size + length
+				if mask & IN_Q_OVERFLOW:
+					events.append((None, None))
+					continue
+				dirPath = self._paths.get(wd)
+				if dirPath is None:
+					continue
+				if mask & IN_IGNORED:
+					# The folder was removed or unwatched
+					del self._paths[wd]
+					self._wds.pop(dirPath, None)
+				elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+					events.append(os.path.split(dirPath))
+				elif name:
+					events.append((dirPath, name))
+		return events
+
+	def close(self):
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+class PollingWatcher:
+	"""readEvents() compares each watched folder with its last listing"""
+
+	def __init__(self):
+		self._snapshots = {}
+
+	def fileno(self):
+		return None
+
+	def _snapshot(self, dirPath):
+		snapshot = {}
+		try:
+			names = os.listdir(dirPath)
+		except OSError:
+			return None
+		for name in names:
+			try:
+				st = os.lstat(os.path.join(dirPath, name))
+			except OSError:
+				continue
+			snapshot[name] = (st.st_mtime, st.st_ino, st.st_size)
+		return snapshot
+
+	def watch(self, dirPath):
+		if dirPath not in self._snapshots:
+			snapshot = self._snapshot(dirPath)
+			if snapshot is not None:
+				self._snapshots[dirPath] = snapshot
+
+	def unwatch(self, dirPath):
+		self._snapshots.pop(dirPath, None)
+
+	def isWatched(self, dirPath):
+		return dirPath in self._snapshots
+
+	def readEvents(self):
+		events = []
+		for dirPath, old in self._snapshots.items():
+			new = self._snapshot(dirPath)
+			if new is None:
+				del self._snapshots[dirPath]
+				events.append(os.path.split(dirPath))
+				continue
+			for name in set(old) | set(new):
+				if old.get(name) != new.get(name):
+					events.append((dirPath, name))
+			self._snapshots[dirPath] = new
+		return events
+
+	def close(self):
+		self._snapshots.clear()
+
+def createWatcher(paths, mode="auto"):
+	"""
+	@precondition: mode is "inotify", "poll" or "auto"; auto polls if any of
+		paths is on a network filesystem or inotify is not available
+	@returns: An InotifyWatcher or a PollingWatcher
+	"""
+	if mode == "auto":
+		if hasInotify() and not [p for p in paths if isNetworkFilesystem(p)]:
+			mode = "inotify"
+		else:
+			mode = "poll"
+	if mode == "inotify":
+		return InotifyWatcher()
+	return PollingWatcher()